@@ -1,31 +1,75 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, make_response
-from tinydb import TinyDB, Query
+from flask import Flask, render_template, request, jsonify, redirect, url_for, Response, stream_with_context, g
+import click
 import os
 from datetime import datetime
-import requests
+import time
 import json
-import smtplib
-import ssl
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import base64
+from urllib.parse import urlencode
+import atexit
+import threading
+import zlib
+import math
+from contextlib import contextmanager
+from tally import TallyStore, VersionedCache, tally_columns
+from votestore import STORED_VOTE_CODES
+from notifier import VoteNotifier
+from steam_media import SteamClient, SteamMediaCache
+from storage import open_storage, migrate_tinydb
+from backup import export_json, export_ndjson, buffered, gzipped, read_backup
+from live import ResultsBroadcaster
+from httpcache import build_tag, accepts_gzip, compress_response, VersionedBody
+from metrics import REGISTRY, REQUEST_SECONDS, span, timed, instrument, begin_request, end_request, summarize_spans
+from profiling import RequestProfiler
+from scoring import ENGINES, EngineCache, describe_engines
+from history import ResultsHistory, parse_as_of
+from catalog import CatalogIndex, SORTS, build_games
+from enrichment import EnrichmentPipeline, steam_app_id_from_url
 
 app = Flask(__name__)
 
 # --- Database Setup ---
-# Keep DB persistent across restarts; do not clear on startup
-# Allow overriding DB path via environment variable for persistent disks in production
-DB_PATH = os.environ.get('DB_PATH', 'db.json')
-try:
-    db_dir = os.path.dirname(DB_PATH)
-    if db_dir:
-        os.makedirs(db_dir, exist_ok=True)
-except Exception:
-    # If we cannot create the directory, TinyDB will likely fail later; but avoid crashing on import
-    pass
-db = TinyDB(DB_PATH)
-votes_table = db.table('votes')
-users_table = db.table('users')  # Track users and their submissions
-submitted_games_table = db.table('submitted_games')
+# Keep DB persistent across restarts; do not clear on startup.
+# STORAGE_BACKEND picks 'sqlite' (default) or 'tinydb'; DB_PATH / SQLITE_PATH point at persistent disks in production.
+storage = open_storage()
+
+# --- Instrumentation ---
+# Storage, tally, template, SMTP and Steam calls are timed as spans; /metrics exposes them
+# with per-route request histograms. Requests slower than SLOW_REQUEST_SECONDS are logged
+# with their span breakdown. See profiling.py for opt-in cProfile dumps.
+instrument(storage, 'storage', ('snapshot', 'columnar_snapshot', 'generation', 'record_ballot',
+                                'insert_submitted_games', 'bulk_import', 'vote_history', 'all_users', 'all_votes',
+                                'all_submitted_games'))
+profiler = RequestProfiler.from_env()
+METRICS_DIR = os.environ.get('METRICS_DIR')
+SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS', '1'))
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    begin_request()
+    if METRICS_DIR:
+        REGISTRY.start_flusher(METRICS_DIR)
+    g.profile = profiler.start(request.path)
+
+@app.after_request
+def record_request_metrics(response):
+    # Registered first, so it runs after every other after_request hook (compression included)
+    elapsed = time.perf_counter() - g.request_started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    REQUEST_SECONDS.observe(elapsed, request.method, route, str(response.status_code))
+    spans = end_request()
+    if g.profile is not None:
+        path = profiler.finish(g.profile, request.endpoint, elapsed)
+        print(f"Profiled {request.method} {request.path} ({elapsed * 1000:.1f}ms): {path}", flush=True)
+    if elapsed >= SLOW_REQUEST_SECONDS:
+        print(f"Slow request: {request.method} {request.path} {response.status_code} in {elapsed * 1000:.1f}ms "
+              f"[{summarize_spans(spans)}]", flush=True)
+    return response
+
+def render_page(template, **context):
+    with span(f'render.{template}'):
+        return render_template(template, **context)
 
 # --- Game Data ---
 games = [
@@ -80,226 +124,329 @@ games = [
     {'id': 48, 'title': 'X-MODE', 'url': 'https://store.steampowered.com/app/2265640/XMODE/', 'price': 'FREE', 'max_players': 'N/A', 'steam_app_id': '2265640', 'youtube_id': '5XgB5XgB5Xg'}
 ]
 
+# Submitted games are numbered after the hardcoded list; their ids are pinned when stored
+FIRST_SUBMITTED_ID = max(game['id'] for game in games) + 1
+
 # Merge hardcoded games with user-submitted games
-def get_all_games():
-    all_games = games.copy()
-    submitted = submitted_games_table.all()
-    next_id = len(all_games) + 1
-    for sg in submitted:
-        sg['id'] = next_id
-        all_games.append(sg)
-        next_id += 1
-    return all_games
+def get_all_games(submitted=None):
+    if submitted is None:
+        submitted = storage.all_submitted_games()
+    return build_games(games, submitted)
+
+# Rebuilt from storage by reload_from_storage() below
+all_games = []
+
+# --- HTTP caching ---
+# Pages carry weak ETags derived from data versions (plus BUILD_TAG, so a redeploy with new
+# templates/assets invalidates them); a matching If-None-Match is answered with 304 before
+# anything is rendered. Text responses are gzipped when the client accepts it.
+BUILD_TAG = build_tag(os.path.join(app.root_path, 'templates'), os.path.join(app.root_path, 'static'))
+index_body = VersionedBody()
+results_body = VersionedBody()
+
+def conditional(etag, build):
+    """Return 304 if the client already has `etag`, otherwise `build()`, tagged with it."""
+    if request.if_none_match.contains_weak(etag):
+        resp = Response(status=304)
+    else:
+        resp = app.make_response(build())
+    resp.set_etag(etag, weak=True)
+    # Clients may keep the page but must revalidate it on every use
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
 
-all_games = get_all_games()
+def body_response(raw, gzipped, mimetype):
+    """Serve a pre-rendered body, picking the pre-compressed copy when the client accepts gzip."""
+    if accepts_gzip(request):
+        resp = Response(gzipped, mimetype=mimetype)
+        resp.headers['Content-Encoding'] = 'gzip'
+    else:
+        resp = Response(raw, mimetype=mimetype)
+    resp.vary.add('Accept-Encoding')
+    return resp
+
+@app.after_request
+def compress(response):
+    return compress_response(request, response)
+
+# The index page renders the first page of the catalog; the rest is searched and loaded
+# page by page through /api/games
+CATALOG_PAGE_SIZE = int(os.environ.get('CATALOG_PAGE_SIZE', '60'))
+CATALOG_MAX_PAGE_SIZE = 200
 
 @app.route('/')
 def index():
-    return render_template('index.html', games=all_games)
-
+    # The page only depends on the game list, so it is rendered once per game list version
+    with _state_lock:
+        games_tag, catalog = _games_tag, all_games
+    def build():
+        raw, gzipped = index_body.get(games_tag, lambda: render_page(
+            'index.html', games=catalog[:CATALOG_PAGE_SIZE], total_games=len(catalog), page_size=CATALOG_PAGE_SIZE))
+        return body_response(raw, gzipped, 'text/html')
+    return conditional(f'i-{games_tag}-{BUILD_TAG}', build)
+
+@app.route('/api/games')
+def api_games():
+    """Search and filter the catalog, one page at a time.
+    Query args: q (title search), free=1, max_price, players (games for at least this many),
+    sort (relevance, title, price, players), offset, limit.
+    """
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', CATALOG_PAGE_SIZE)), 1), CATALOG_MAX_PAGE_SIZE)
+        max_price = float(request.args['max_price']) if request.args.get('max_price') else None
+        players = int(request.args['players']) if request.args.get('players') else None
+        if max_price is not None and not math.isfinite(max_price):
+            raise ValueError('max_price must be finite')
+    except ValueError:
+        return jsonify({'success': False, 'error': 'offset, limit, max_price and players must be numbers'}), 400
+    sort = request.args.get('sort') or 'relevance'
+    if sort not in SORTS:
+        return jsonify({'success': False, 'error': f'sort must be one of: {", ".join(SORTS)}'}), 400
+    free = request.args.get('free', '').lower() in ('1', 'true', 'yes', 'on')
+    with _state_lock:
+        games_tag, index = _games_tag, catalog_index
+    def build():
+        matches = index.search(request.args.get('q', ''), free=free, max_price=max_price, players=players, sort=sort)
+        end = offset + limit
+        return jsonify({'success': True, 'total': len(matches), 'catalog_size': len(index),
+                        'items': [index.item(i) for i in matches[offset:end]],
+                        'next_offset': end if end < len(matches) else None})
+    return conditional(f'g-{games_tag}-{BUILD_TAG}', build)
+
+@app.route('/games/cards')
+def game_cards():
+    """Rendered vote cards for ?ids=1,2,3 (the index page adds them as they are searched or loaded)."""
+    wanted = [game_id for game_id in request.args.get('ids', '').split(',') if game_id][:CATALOG_MAX_PAGE_SIZE]
+    with _state_lock:
+        games_tag, catalog = _games_tag, all_games
+    def build():
+        by_id = {str(game['id']): game for game in catalog}
+        return render_page('game_cards.html', games=[by_id[game_id] for game_id in wanted if game_id in by_id])
+    return conditional(f'c-{games_tag}-{BUILD_TAG}', build)
+
+@timed('tally.full_scan')
 def compute_formatted_results():
-    """Compute the formatted results used by /api/results and email summaries.
-    Uses only the most recent submission per user.
+    """Full-scan computation of the formatted results.
+    Uses only the most recent submission per user, tallied over the columnar vote history.
+    Request handlers read from the incremental `tally` store instead; this is kept as the
+    reference implementation for seeding checks and TALLY_VERIFY consistency checks.
     """
-    results = {}
-
-    # Get all votes
-    all_votes = votes_table.all()
-
-    # Get all users and their latest submission numbers (fallback to deriving from votes)
-    users_raw = users_table.all()
-    users = {user['id']: user['name'] for user in users_raw}
-    latest_submission_by_user = {}
-    # Prefer users table 'submission' field if present
-    for u in users_raw:
-        if 'submission' in u:
-            latest_submission_by_user[u['id']] = u.get('submission', 1)
-    # Fallback: if missing, infer from vote rows for that user
-    for v in all_votes:
-        uid = v.get('player_id')
-        sub = v.get('submission', 1)
-        if uid is not None:
-            latest_submission_by_user[uid] = max(latest_submission_by_user.get(uid, 1), sub)
-
-    # Initialize results structure
-    for game in all_games:
-        game_id = str(game['id'])
-        results[game_id] = {
-            'title': game['title'],
-            'interested': [],
-            'not_interested': [],
-            'maybe': []
-        }
-
-    # Populate results using only the most recent submission per user
-    for vote in all_votes:
-        uid = vote.get('player_id')
-        # Only include if this vote belongs to the user's latest submission
-        if uid is None:
-            continue
-        if vote.get('submission', 1) != latest_submission_by_user.get(uid, 1):
-            continue
-        user_name = users.get(uid, 'Unknown')
-        game_id = str(vote['game_id'])
-        if game_id in results:
-            vote_type = vote['vote']
-            if vote_type in results[game_id]:
-                results[game_id][vote_type].append(user_name)
-
-    # Format the response
-    formatted_results = {
-        'games': [],
-        'top_interested': [],
-        'top_maybe': [],
-        'top_engagement': [],
-        'total_voters': len(users_table.all())  # Include total number of voters
-    }
-
-    # Calculate top games
-    interested_counts = []
-    maybe_counts = []
-    engagement_counts = []
-
-    for game in all_games:
-        game_id = str(game['id'])
-        if game_id in results:
-            game_data = results[game_id]
-            interested_count = len(game_data['interested'])
-            maybe_count = len(game_data['maybe'])
-            engagement_count = interested_count + maybe_count
-
-            formatted_results['games'].append({
-                'id': game_id,
-                'title': game['title'],
-                'interested': game_data['interested'],
-                'not_interested': game_data['not_interested'],
-                'maybe': game_data['maybe'],
-                'interested_count': interested_count,
-                'maybe_count': maybe_count,
-                'engagement_count': engagement_count
-            })
-
-            interested_counts.append((game['title'], interested_count))
-            maybe_counts.append((game['title'], maybe_count))
-            engagement_counts.append((game['title'], engagement_count, interested_count, maybe_count))
-
-    # Sort and get top 10
-    interested_counts.sort(key=lambda x: x[1], reverse=True)
-    maybe_counts.sort(key=lambda x: x[1], reverse=True)
-    # For engagement, break ties by interested then maybe
-    engagement_counts.sort(key=lambda x: (x[1], x[2], x[3]), reverse=True)
-
-    formatted_results['top_interested'] = [{'title': title, 'count': count} for title, count in interested_counts[:10]]
-    formatted_results['top_maybe'] = [{'title': title, 'count': count} for title, count in maybe_counts[:10]]
-    formatted_results['top_engagement'] = [
-        {'title': title, 'count': engagement}
-        for (title, engagement, _ic, _mc) in engagement_counts[:10]
-    ]
-
-    return formatted_results
-
-def send_vote_email(user_name: str, results_summary: dict) -> None:
-    """Send an email notification about a new vote with the current results summary.
-    Requires SMTP_* environment variables. Silently skips if not configured.
+    # Get all votes and users from one consistent snapshot
+    snap = storage.columnar_snapshot()
+    return tally_columns(snap['users'], snap['votes'], all_games)
+
+# --- Incremental tally ---
+# Seeded once at startup; /vote, /add_game and /admin/import keep it current with deltas.
+tally = TallyStore()
+instrument(tally, 'tally', ('seed', 'apply_ballot', 'set_games', 'results'))
+
+# --- Live results (Server-Sent Events) ---
+# One broadcaster per worker; it polls storage while clients are connected so votes
+# handled by other workers are pushed too. Each open stream holds a server thread, so
+# LIVE_MAX_STREAMS caps them below the gthread pool size; the rest get 503 and poll.
+live_results = ResultsBroadcaster(poll_fn=lambda: refresh_if_stale(),
+                                  poll_interval=float(os.environ.get('LIVE_POLL_SECONDS', '1')),
+                                  max_subscribers=int(os.environ.get('LIVE_MAX_STREAMS', '16')))
+LIVE_STREAM_SECONDS = float(os.environ.get('LIVE_STREAM_SECONDS', '300'))
+
+# --- Multi-process coherence ---
+# Every storage write bumps a generation counter. Each worker remembers the generation its
+# in-memory state (all_games, tally) reflects and rebuilds only when the counter moved
+# because of another process; its own writes are applied as deltas.
+_state_lock = threading.RLock()
+_seen_generation = None
+# Content hash of all_games; identical across workers, used for the index page ETag
+_games_tag = None
+_tagged_games = None
+# Search indexes over all_games (catalog.py), rebuilt with _games_tag
+catalog_index = CatalogIndex([])
+
+@timed('state.reload')
+def reload_from_storage():
+    """Rebuild all_games and derived caches from a consistent storage snapshot."""
+    global all_games, _seen_generation
+    with _state_lock:
+        snap = storage.columnar_snapshot()
+        new_games = get_all_games(snap['submitted_games'])
+        if new_games != all_games:
+            all_games = new_games
+        tally.seed(snap['users'], snap['votes'], all_games)
+        _seen_generation = snap['generation']
+        state_changed()
+
+def state_changed():
+    # Called with _state_lock held whenever _seen_generation moves
+    global _games_tag, _tagged_games, catalog_index
+    if all_games is not _tagged_games:
+        _tagged_games = all_games
+        _games_tag = format(zlib.crc32(json.dumps(all_games, sort_keys=True).encode('utf-8')), '08x')
+        catalog_index = CatalogIndex(all_games)
+    live_results.publish(_seen_generation, tally.results)
+    _generation_advanced.notify_all()
+
+# Ballots committed together (see ballotlog.py) get consecutive generations but may reach
+# apply_local_write out of order; a write that is ahead waits this long for the earlier ones.
+LOCAL_WRITE_WAIT_SECONDS = 0.05
+# Requests that find storage ahead while this process's own writes are being applied wait
+# up to this long for their deltas instead of reloading everything
+LOCAL_WRITE_SETTLE_SECONDS = 1.0
+_generation_advanced = threading.Condition(_state_lock)
+_local_writes = 0  # storage writes by this process whose deltas aren't applied yet
+
+@contextmanager
+def local_write():
+    """Wrap a storage write and its apply_local_write() so other threads of this process
+    wait for the delta rather than treating the new generation as another process's write."""
+    global _local_writes
+    with _state_lock:
+        _local_writes += 1
+    try:
+        yield
+    finally:
+        with _state_lock:
+            _local_writes -= 1
+            _generation_advanced.notify_all()
+
+def apply_local_write(generation, apply_delta):
+    """Apply the in-memory delta for a write this process just made at `generation`.
+    If another process wrote in between, reload everything instead.
     """
-    smtp_server = os.environ.get('SMTP_SERVER')
-    smtp_port = int(os.environ.get('SMTP_PORT', '587'))
-    smtp_username = os.environ.get('SMTP_USERNAME')
-    smtp_password = os.environ.get('SMTP_PASSWORD')
-    smtp_from = os.environ.get('SMTP_FROM', smtp_username or '')
-    smtp_to = os.environ.get('SMTP_TO')
-
-    if not smtp_server or not smtp_username or not smtp_password:
-        # Not configured; skip
-        print('SMTP not configured; skipping vote email.', flush=True)
+    global _seen_generation
+    with _state_lock:
+        if _seen_generation is not None and generation > _seen_generation + 1:
+            _generation_advanced.wait_for(lambda: _seen_generation is None or _seen_generation >= generation - 1,
+                                          LOCAL_WRITE_WAIT_SECONDS)
+        if _seen_generation is not None and generation <= _seen_generation:
+            return  # a reload since the write already picked it up
+        if _seen_generation is not None and generation == _seen_generation + 1:
+            apply_delta()
+            _seen_generation = generation
+            state_changed()
+        else:
+            reload_from_storage()
+
+def refresh_if_stale():
+    """Reload if another process changed storage since we last looked."""
+    generation = storage.generation()
+    if generation == _seen_generation:
         return
+    with _state_lock:
+        if _local_writes:
+            _generation_advanced.wait_for(
+                lambda: not _local_writes or (_seen_generation is not None and _seen_generation >= generation),
+                LOCAL_WRITE_SETTLE_SECONDS)
+            if _local_writes and _seen_generation is not None and _seen_generation >= generation:
+                return  # caught up; newer generations are local writes still being applied
+        if storage.generation() != _seen_generation:
+            reload_from_storage()
+
+@app.before_request
+def sync_with_storage():
+    if request.endpoint == 'static':
+        return
+    refresh_if_stale()
+
+def _append_submitted_games(new_games):
+    global all_games
+    all_games = all_games + new_games
+    tally.set_games(all_games)
 
-    subject = f"LAN Game Vote: {user_name} submitted a vote ({datetime.utcnow().isoformat()} UTC)"
-
-    # Build a simple HTML summary
-    top_int = results_summary.get('top_interested', [])
-    lines_int = ''.join([f"<li>{item['title']}: {item['count']}</li>" for item in top_int])
-    total_voters = results_summary.get('total_voters', 0)
-
-    html = f"""
-    <html>
-      <body>
-        <p><strong>{user_name}</strong> just submitted votes.</p>
-        <p>Total voters: <strong>{total_voters}</strong></p>
-        <h3>Top Interested</h3>
-        <ol>
-          {lines_int}
-        </ol>
-        <p>Full JSON summary attached below:</p>
-        <pre style=\"white-space: pre-wrap; font-family: monospace;\">{json.dumps(results_summary, indent=2)}</pre>
-      </body>
-    </html>
+reload_from_storage()
+
+# Set TALLY_VERIFY=1 to compare every /api/results response with the full scan (debugging aid)
+TALLY_VERIFY = os.environ.get('TALLY_VERIFY', '').lower() in ('1', 'true', 'yes')
+
+def check_tally_consistency():
+    """Compare the incremental tally with the full-scan results.
+    On mismatch, log it and reseed the tally from storage. Returns True if they matched.
     """
+    expected = compute_formatted_results()
+    if tally.results() == expected:
+        return True
+    print('Tally mismatch against full scan; reseeding incremental tally.', flush=True)
+    reload_from_storage()
+    return False
+
+# --- Vote notifications ---
+# Emails are sent from a background worker over a reused SMTP connection; votes arriving
+# within SMTP_COALESCE_SECONDS are folded into one digest with the latest summary.
+notifier = VoteNotifier.from_env(summary_fn=tally.results)
+atexit.register(notifier.close)
+
+# --- Steam media proxy cache ---
+steam_client = SteamClient.from_env()
+steam_cache = SteamMediaCache.from_env(steam_client.fetch_media)
+# Price-only lookups can be batched (several appids per upstream call), so they get their own cache
+steam_price_cache = SteamMediaCache.from_env(steam_client.fetch_price)
+STEAM_BATCH_MAX_IDS = 100
+
+def steam_app_ids():
+    """All distinct Steam app ids in the catalog (hardcoded and submitted games)."""
+    return list(dict.fromkeys(str(g['steam_app_id']) for g in all_games if g.get('steam_app_id')))
+
+def warm_steam_cache():
+    """Prefetch media for every catalog game so the first visitor doesn't pay for cold lookups."""
+    ids = steam_app_ids()
+    results = steam_cache.get_many(ids)
+    ok = sum(1 for _payload, status in results.values() if status == 200)
+    print(f"Steam cache warmed: {ok}/{len(ids)} apps", flush=True)
+    return results
+
+# Set STEAM_PREFETCH=1 to warm the media cache in the background at startup (per worker process)
+if os.environ.get('STEAM_PREFETCH', '').lower() in ('1', 'true', 'yes'):
+    threading.Thread(target=warm_steam_cache, name='steam-prefetch', daemon=True).start()
+
+# --- Submitted game pipeline ---
+# /add_game only queues the game. Background workers drop duplicates (same Steam app id or
+# normalized title), fill in the Steam price through the shared price cache and store games
+# in batches. Progress is at /admin/enrichment.
+def current_catalog():
+    refresh_if_stale()
+    return all_games
 
-    msg = MIMEMultipart('alternative')
-    msg['Subject'] = subject
-    msg['From'] = smtp_from
-    msg['To'] = smtp_to
-    part_html = MIMEText(html, 'html')
-    msg.attach(part_html)
+def store_submitted_games(batch):
+    """Store enriched games in one write; returns their catalog ids."""
+    with local_write():
+        ids, generation = storage.insert_submitted_games(batch, first_id=FIRST_SUBMITTED_ID)
+        apply_local_write(generation, lambda: _append_submitted_games(
+            [dict(game, id=game_id) for game, game_id in zip(batch, ids)]))
+    return ids
 
-    context = ssl.create_default_context()
-    with smtplib.SMTP(smtp_server, smtp_port) as server:
-        server.starttls(context=context)
-        server.login(smtp_username, smtp_password)
-        server.sendmail(smtp_from, [smtp_to], msg.as_string())
+enrichment = EnrichmentPipeline.from_env(current_catalog, steam_price_cache.get, store_submitted_games)
+atexit.register(enrichment.drain)
+
+# Vote values /vote accepts, including the voting page's 'not-interested' spelling
+BALLOT_VOTES = tuple(STORED_VOTE_CODES)
 
 @app.route('/vote', methods=['POST'])
 def vote():
-    data = request.get_json()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('user_name', ''), str) \
+            or not isinstance(data.get('votes', {}), dict):
+        return jsonify({'success': False, 'message': 'Invalid ballot'}), 400
     user_name = data.get('user_name', '').strip()
     
     if not user_name:
         return jsonify({'success': False, 'message': 'Name is required'}), 400
     
-    # Upsert user and record a new submission, preserving previous votes (history)
-    UserQuery = Query()
-    existing_user = users_table.get(UserQuery.name == user_name)
+    # Only record games where a selection was made
+    ballot = [(game_id, vote_status) for game_id, vote_status in data.get('votes', {}).items() if vote_status]
+    for game_id, vote_status in ballot:
+        if vote_status not in BALLOT_VOTES:
+            return jsonify({'success': False, 'message': f'Invalid vote for game {game_id}'}), 400
+
+    # Upsert user and record a new submission, preserving previous votes (history).
+    # The whole ballot is written in one storage transaction.
     result_message = 'Vote recorded successfully!'
     now_iso = datetime.utcnow().isoformat()
-    if existing_user:
-        user_id = existing_user['id']
-        # Determine and increment this user's submission counter.
-        # Derive from both users table and any existing vote rows (legacy rows may miss 'submission').
-        try:
-            VoteQuery = Query()
-            prior_votes = votes_table.search(VoteQuery.player_id == user_id)
-            max_sub_from_votes = 0
-            if prior_votes:
-                # Treat legacy votes with missing 'submission' as submission 1
-                max_sub_from_votes = max(v.get('submission', 1) for v in prior_votes)
-        except Exception:
-            max_sub_from_votes = 0
-        current_submission = max(existing_user.get('submission', 0), max_sub_from_votes) + 1
-        users_table.update({'voted_at': now_iso, 'submission': current_submission}, UserQuery.id == user_id)
-    else:
-        # Create a new user starting at submission 1
-        user_id = len(users_table) + 1
-        current_submission = 1
-        users_table.insert({'id': user_id, 'name': user_name, 'voted_at': now_iso, 'submission': current_submission})
-    
-    # Process the votes
-    for game_id, vote_status in data.get('votes', {}).items():
-        if vote_status:  # Only record if a selection was made
-            votes_table.insert({
-                'player_id': user_id,
-                'game_id': game_id,
-                'vote': vote_status,
-                'voted_at': now_iso,
-                'submission': current_submission
-            })
+    with local_write():
+        user_id, current_submission, new_user, generation = storage.record_ballot(user_name, ballot, now_iso)
+        apply_local_write(generation, lambda: tally.apply_ballot(user_id, user_name, current_submission, ballot,
+                                                               new_user=new_user, voted_at=now_iso))
     
-    # Send notification email (best-effort)
-    try:
-        summary = compute_formatted_results()
-        send_vote_email(user_name, summary)
-    except Exception as e:
-        print(f"Email notification failed: {e}", flush=True)
+    # Queue notification email (best-effort, delivered in the background)
+    notifier.notify(user_name)
 
     return jsonify({'success': True, 'message': result_message})
 
@@ -317,82 +464,286 @@ def add_game():
     if len(title) > 100 or len(url) > 500:
         return redirect(url_for('index') + '?error=Invalid input lengths')
 
-    # Optional: extract steam_app_id if URL is Steam
-    steam_app_id = None
-    if 'store.steampowered.com/app/' in url:
-        try:
-            steam_app_id = url.split('/app/')[1].split('/')[0]
-        except:
-            pass
-
-    submitted_games_table.insert({
+    game = {
         'title': title,
         'url': url,
         'price': price or 'N/A',
         'max_players': max_players or 'N/A',
-        'steam_app_id': steam_app_id,
+        'steam_app_id': steam_app_id_from_url(url),
         'youtube_id': youtube_id or None,
         'submitted_at': datetime.utcnow().isoformat()
-    })
-
-    # Refresh all_games
-    global all_games
-    all_games = get_all_games()
-
-    return redirect(url_for('index') + '?success=Game added successfully!')
+    }
+    duplicate = enrichment.find_duplicate(game)
+    if duplicate is not None:
+        existing = duplicate.get('title') or title
+        message = f'{existing} is already on the list' if 'id' in duplicate else f'{existing} is already being added'
+        return redirect(url_for('index') + '?' + urlencode({'error': message}))
+    # Enriched and stored in the background, where duplicates are checked again
+    ticket = enrichment.submit(game)
+    if ticket is None:
+        return redirect(url_for('index') + '?error=Too many games are being added right now, please try again shortly')
+
+    return redirect(url_for('index') + '?' + urlencode({
+        'success': f'Thanks! {title} will show up shortly, unless someone added it at the same time '
+                   f'(reference {ticket}).'}))
 
 @app.route('/results')
 def results_page():
-    return render_template('results.html')
+    return render_page('results.html')
 
 @app.route('/api/results')
 def api_results():
-    formatted_results = compute_formatted_results()
-    return jsonify(formatted_results)
+    if TALLY_VERIFY:
+        check_tally_consistency()
+    try:
+        as_of = parse_as_of(request.args['as_of']) if request.args.get('as_of') else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'as_of must be an ISO date/time or a Unix timestamp'}), 400
+    if request.args.get('engine'):
+        return engine_results(request.args['engine'], as_of)
+    if as_of:
+        return historical_results(as_of)
+    with _state_lock:
+        generation = _seen_generation
+        results = tally.results()
+    def build():
+        raw, gzipped = results_body.get(generation, lambda: json.dumps(results, separators=(',', ':')))
+        return body_response(raw, gzipped, 'application/json')
+    return conditional(f'r-{generation}-{BUILD_TAG}', build)
+
+HISTORY_PAGE_SIZE = 100
+HISTORY_MAX_PAGE_SIZE = 500
+
+def encode_history_cursor(key):
+    if key is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip('=')
+
+def decode_history_cursor(token):
+    if not token:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(key, list) or len(key) != 4:
+        raise ValueError('Invalid cursor')
+    return key
+
+def history_filters(args):
+    """Read vote history filters from query args; empty values mean 'no filter'."""
+    until = args.get('until') or None
+    if until and len(until) == 10:
+        # A bare date (YYYY-MM-DD) includes the whole day
+        until += 'T23:59:59.999999'
+    return {
+        'user': args.get('user') or None,
+        'game_id': args.get('game') or None,
+        'vote': args.get('vote') or None,
+        'since': args.get('since') or None,
+        'until': until,
+    }
+
+def history_page(args, default_limit=HISTORY_PAGE_SIZE):
+    """Fetch one page of history for the given query args. Returns (items, next_cursor)."""
+    try:
+        limit = min(max(int(args.get('limit', default_limit)), 1), HISTORY_MAX_PAGE_SIZE)
+    except ValueError:
+        limit = default_limit
+    cursor = decode_history_cursor(args.get('cursor'))
+    rows, next_key = storage.vote_history(limit, cursor=cursor, **history_filters(args))
+    game_lookup = {str(g['id']): g['title'] for g in all_games}
+    for row in rows:
+        row['game_title'] = game_lookup.get(str(row['game_id']), str(row['game_id']))
+    return rows, encode_history_cursor(next_key)
+
+@app.route('/api/votehistory')
+def api_vote_history():
+    """Paginated vote history, newest first.
+    Query args: limit, cursor (from next_cursor), user, game (id), vote, since, until.
+    """
+    try:
+        items, next_cursor = history_page(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': True, 'items': items, 'next_cursor': next_cursor})
+
+# Rankings from the scoring engines (scoring.py), cached per data version
+engine_cache = EngineCache()
+
+def engine_results(name, as_of=None):
+    """/api/results?engine=<name>[&limit=N&as_of=T&<engine params>]: one ranking over the
+    current ballots (or the ballots counted at `as_of`)."""
+    engine = ENGINES.get(name)
+    if engine is None:
+        return jsonify({'success': False, 'error': f'Unknown engine: {name}', 'engines': list(ENGINES)}), 400
+    try:
+        params = engine.parse_params(request.args)
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+        if limit is not None and limit < 0:
+            raise ValueError('limit: must be at least 0')
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    with _state_lock:
+        generation = _seen_generation
+        vote_set = tally.vote_set() if as_of is None else None
+    def build():
+        def compute():
+            ranked_set = vote_set if as_of is None else history_vote_set(as_of)
+            with span(f'scoring.{name}'):
+                return ranked_set.total_voters, engine.rank(ranked_set, **params)
+        params_key = dict(params, as_of=as_of) if as_of else params
+        total_voters, ranking = engine_cache.get(generation, engine, params_key, compute)
+        payload = {'engine': name, 'params': params, 'version': generation,
+                   'total_voters': total_voters, 'ranking': ranking[:limit]}
+        if as_of:
+            payload['as_of'] = as_of
+        return jsonify(payload)
+    return conditional(f'r-{generation}-{BUILD_TAG}', build)
+
+# --- Historical results ---
+# Results as of any moment and per-game trends, from the vote history's time-ordered event
+# log with periodic checkpoints (history.py). Answers are cached per data version.
+results_history = ResultsHistory(checkpoint_every=int(os.environ.get('HISTORY_CHECKPOINT_EVERY', '2000')))
+history_cache = VersionedCache()
+TIMELINE_DEFAULT_POINTS = 60
+TIMELINE_MAX_POINTS = 500
+
+def sync_history():
+    """Bring results_history up to date with the tally; returns (games, labels)."""
+    columns, rows, games, labels = tally.history_view()
+    with span('history.sync'):
+        results_history.sync(columns, rows)
+    return games, labels
+
+def history_vote_set(as_of):
+    games, _labels = sync_history()
+    return results_history.vote_set_as_of(as_of, games)
+
+def historical_results(as_of):
+    """/api/results?as_of=T: the results payload as it stood at T."""
+    with _state_lock:
+        generation = _seen_generation
+    def build():
+        def compute():
+            games, labels = sync_history()
+            with span('history.as_of'):
+                results = results_history.results_as_of(as_of, games, labels)
+            results['as_of'] = as_of
+            return json.dumps(results, separators=(',', ':'))
+        return Response(history_cache.get(generation, ('as_of', as_of), compute), mimetype='application/json')
+    return conditional(f'r-{generation}-{BUILD_TAG}', build)
+
+@app.route('/api/results/timeline')
+def api_results_timeline():
+    """Per-game vote counts over time for charting.
+    Query args: points (max buckets, default 60), games (comma-separated ids), top (default 10:
+    the games with the most interested + maybe votes now; ignored when games is given).
+    """
+    try:
+        points = min(max(int(request.args.get('points', TIMELINE_DEFAULT_POINTS)), 2), TIMELINE_MAX_POINTS)
+        top = max(int(request.args.get('top', 10)), 1)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'points and top must be integers'}), 400
+    wanted = [game_id for game_id in request.args.get('games', '').split(',') if game_id]
+    with _state_lock:
+        generation = _seen_generation
+        results = tally.results()
+    if wanted:
+        picked = set(wanted)
+    else:
+        ranked = sorted(results['games'], key=lambda game: (-game['engagement_count'], -game['interested_count']))
+        picked = {game['id'] for game in ranked[:top]}
+    def build():
+        def compute():
+            games, _labels = sync_history()
+            with span('history.timeline'):
+                timeline = results_history.timeline([game for game in games if str(game['id']) in picked], points)
+            return json.dumps(timeline, separators=(',', ':'))
+        key = ('timeline', points, tuple(sorted(picked)))
+        return Response(history_cache.get(generation, key, compute), mimetype='application/json')
+    return conditional(f't-{generation}-{BUILD_TAG}', build)
+
+@app.route('/api/results/engines')
+def api_result_engines():
+    return jsonify(describe_engines())
+
+@app.route('/api/results/stream')
+def api_results_stream():
+    """Live results: a 'snapshot' event, then compact 'diff' events whenever votes land.
+    Reconnecting clients resume via Last-Event-ID (or ?version=) and get only the diffs
+    they missed when this worker still has them. When LIVE_MAX_STREAMS streams are already
+    open on this worker the answer is 503 and the page falls back to polling /api/results.
+    """
+    if not live_results.reserve():
+        resp = jsonify({'success': False, 'message': 'Too many live result streams, poll /api/results'})
+        resp.status_code = 503
+        resp.headers['Retry-After'] = '30'
+        return resp
+    last_version = request.headers.get('Last-Event-ID') or request.args.get('version')
+    try:
+        last_version = int(last_version) if last_version else None
+    except ValueError:
+        last_version = None
+    body = live_results.stream(last_version, results_fn=tally.results, max_duration=LIVE_STREAM_SECONDS)
+    resp = Response(stream_with_context(body), mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no'
+    # Runs even if the client goes away before the body starts
+    resp.call_on_close(live_results.release)
+    return resp
 
 @app.route('/votehistory')
 def vote_history_page():
-    # Build a full history list of all votes, newest first
-    user_lookup = {u['id']: u['name'] for u in users_table.all()}
-    game_lookup = {str(g['id']): g['title'] for g in all_games}
-    history = []
-    for v in votes_table.all():
-        history.append({
-            'voted_at': v.get('voted_at'),
-            'user': user_lookup.get(v.get('player_id'), 'Unknown'),
-            'game_title': game_lookup.get(str(v.get('game_id')), str(v.get('game_id'))),
-            'vote': v.get('vote'),
-            'submission': v.get('submission', 1),
-        })
-    # Sort by time desc, then by submission, then by user
+    # One page of history, newest first; older pages via ?cursor=
+    # ETags are per URL, so the data generation covers every filter/cursor combination
+    return conditional(f'h-{_seen_generation}-{BUILD_TAG}', render_vote_history)
+
+def render_vote_history():
     try:
-        history.sort(key=lambda x: (x['voted_at'] or '', x['submission'], x['user']), reverse=True)
-    except Exception:
-        pass
+        history, next_cursor = history_page(request.args)
+    except ValueError:
+        return redirect(url_for('vote_history_page') + '?error=Invalid cursor')
+    filters = {k: request.args.get(k, '') for k in ('user', 'game', 'vote', 'since', 'until', 'limit')}
+    active = {k: v for k, v in filters.items() if v}
+    first_url = url_for('vote_history_page', **active)
+    next_url = url_for('vote_history_page', cursor=next_cursor, **active) if next_cursor else None
     # Surface flash-like messages via query params
     success = request.args.get('success')
     error = request.args.get('error')
-    return render_template('votehistory.html', history=history, success=success, error=error)
+    return render_page('votehistory.html', history=history, success=success, error=error,
+                       games=all_games, filters=filters, first_url=first_url, next_url=next_url,
+                       is_first_page=not request.args.get('cursor'))
 
 @app.route('/admin/export', methods=['GET'])
 def export_backup():
+    """Stream a backup. ?format=json (default, the classic document), ndjson, or ndjson.gz."""
     token = request.args.get('token', '')
     admin_token = os.environ.get('ADMIN_TOKEN')
     if admin_token and token != admin_token:
         return "Forbidden", 403
-    backup = {
-        'users': users_table.all(),
-        'votes': votes_table.all(),
-        'submitted_games': submitted_games_table.all(),
-        'exported_at': datetime.utcnow().isoformat()
-    }
-    resp = make_response(json.dumps(backup, indent=2))
-    resp.headers['Content-Type'] = 'application/json'
-    resp.headers['Content-Disposition'] = f"attachment; filename=lan-game-vote-backup-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.json"
+    fmt = request.args.get('format', 'json')
+    if fmt not in ('json', 'ndjson', 'ndjson.gz'):
+        return "Unknown format", 400
+    now = datetime.utcnow()
+    if fmt == 'json':
+        body = buffered(export_json(storage, now.isoformat()))
+        mimetype = 'application/json'
+    else:
+        body = buffered(export_ndjson(storage, now.isoformat()))
+        mimetype = 'application/x-ndjson'
+        if fmt == 'ndjson.gz':
+            body = gzipped(body)
+            mimetype = 'application/gzip'
+    resp = Response(stream_with_context(body), mimetype=mimetype)
+    resp.headers['Content-Disposition'] = f"attachment; filename=lan-game-vote-backup-{now.strftime('%Y%m%d-%H%M%S')}.{fmt}"
     return resp
 
 @app.route('/admin/import', methods=['POST'])
 def import_backup():
+    """Bulk import a backup (json or ndjson, optionally gzipped; format is auto-detected).
+    Each table is committed in one write; replace mode swaps all data atomically.
+    """
     token = request.form.get('token', '')
     admin_token = os.environ.get('ADMIN_TOKEN')
     if admin_token and token != admin_token:
@@ -400,73 +751,154 @@ def import_backup():
     file = request.files.get('backup_file')
     if not file:
         return redirect(url_for('vote_history_page') + '?error=No file uploaded')
-    try:
-        backup = json.load(file.stream)
-    except Exception:
-        return redirect(url_for('vote_history_page') + '?error=Invalid JSON')
 
     mode = request.form.get('mode', 'replace')
-    users = backup.get('users', [])
-    votes = backup.get('votes', [])
-    submitted_games = backup.get('submitted_games', [])
-
-    if mode == 'replace':
-        users_table.truncate()
-        votes_table.truncate()
-        submitted_games_table.truncate()
+    started = time.perf_counter()
+    try:
+        counts, _generation = storage.bulk_import(read_backup(file.stream), replace=(mode == 'replace'))
+    except (ValueError, UnicodeDecodeError, OSError, EOFError, zlib.error) as e:
+        # EOFError / zlib.error: truncated or corrupt gzip upload
+        return redirect(url_for('vote_history_page') + '?' + urlencode({'error': f'Invalid backup: {e}'}))
+    elapsed = time.perf_counter() - started
+
+    # Refresh games and tallies (imports can touch everything)
+    reload_from_storage()
+
+    total = sum(counts.values())
+    rate = total / elapsed if elapsed > 0 else total
+    message = f"Backup imported successfully: {total} rows in {elapsed:.2f}s ({rate:,.0f} rows/s)"
+    print(f"Import ({mode}): {counts} in {elapsed:.3f}s", flush=True)
+    return redirect(url_for('vote_history_page') + '?' + urlencode({'success': message}))
+
+@app.route('/admin/notifier', methods=['GET'])
+def notifier_status():
+    token = request.args.get('token', '')
+    admin_token = os.environ.get('ADMIN_TOKEN')
+    if admin_token and token != admin_token:
+        return "Forbidden", 403
+    return jsonify(notifier.stats())
 
-    for u in users:
-        try:
-            users_table.insert(u)
-        except Exception:
-            pass
-    for v in votes:
-        try:
-            votes_table.insert(v)
-        except Exception:
-            pass
-    for g in submitted_games:
-        try:
-            submitted_games_table.insert(g)
-        except Exception:
-            pass
+@app.route('/admin/ballot_log', methods=['GET'])
+def ballot_log_status():
+    """Group commit and compaction counters of the write-ahead ballot log."""
+    token = request.args.get('token', '')
+    admin_token = os.environ.get('ADMIN_TOKEN')
+    if admin_token and token != admin_token:
+        return "Forbidden", 403
+    if not hasattr(storage, 'stats'):
+        return jsonify({'enabled': False})
+    return jsonify(dict(storage.stats(), enabled=True))
 
-    # Refresh games (in case submitted games changed)
-    global all_games
-    all_games = get_all_games()
+@app.route('/admin/enrichment', methods=['GET'])
+def enrichment_status():
+    """Submitted game pipeline counters and recent submissions; ?ticket= for one submission."""
+    token = request.args.get('token', '')
+    admin_token = os.environ.get('ADMIN_TOKEN')
+    if admin_token and token != admin_token:
+        return "Forbidden", 403
+    if request.args.get('ticket'):
+        status = enrichment.status(request.args['ticket'])
+        if status is None:
+            return jsonify({'success': False, 'error': 'Unknown ticket'}), 404
+        return jsonify(status)
+    return jsonify(enrichment.stats())
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus text exposition: request histograms per route and span histograms."""
+    token = request.args.get('token', '')
+    admin_token = os.environ.get('ADMIN_TOKEN')
+    if admin_token and token != admin_token:
+        return "Forbidden", 403
+    body = REGISTRY.render_directory(METRICS_DIR) if METRICS_DIR else REGISTRY.render()
+    return Response(body, mimetype='text/plain; version=0.0.4')
 
-    return redirect(url_for('vote_history_page') + '?success=Backup imported successfully')
+@app.route('/admin/profile', methods=['GET'])
+def profile_status():
+    """Profiler status; ?requests=N (optional &every=K&path=/prefix) arms it in every worker."""
+    token = request.args.get('token', '')
+    admin_token = os.environ.get('ADMIN_TOKEN')
+    if admin_token and token != admin_token:
+        return "Forbidden", 403
+    if request.args.get('requests'):
+        try:
+            count = int(request.args['requests'])
+            every = int(request.args.get('every', '1'))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'requests and every must be integers'}), 400
+        profiler.arm(count, every=every, path_prefix=request.args.get('path', ''))
+    return jsonify(profiler.status())
 
 @app.route('/api/steam_media/<app_id>')
 def steam_media(app_id):
-    """Server-side proxy to fetch Steam media to avoid browser CORS issues."""
+    """Server-side proxy to fetch Steam media to avoid browser CORS issues.
+    Responses are cached per app id (see steam_media.SteamMediaCache).
+    """
+    if not app_id.isdigit():
+        return jsonify({'success': False, 'error': 'Invalid app id'}), 400
     try:
-        params = {
-            'appids': app_id,
-            'filters': 'movies,screenshots,price_overview',
-        }
-        resp = requests.get(
-            'https://store.steampowered.com/api/appdetails',
-            params=params,
-            timeout=8,
-        )
-        resp.raise_for_status()
-        raw = resp.json()
-        # Steam API returns keyed by app id (string)
-        item = raw.get(app_id) or raw.get(str(app_id))
-        if not item or not item.get('success'):
-            return jsonify({'success': False, 'error': 'Steam API returned no data'}), 404
-        data = item.get('data', {})
-        price_overview = data.get('price_overview', {})
-        return jsonify({
-            'success': True,
-            'movies': data.get('movies', []),
-            'screenshots': data.get('screenshots', []),
-            'price_overview': price_overview
-        })
+        payload, status = steam_cache.get(app_id)
+        return jsonify(payload), status
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/steam_media')
+def steam_media_batch():
+    """Batch variant of the Steam proxy: /api/steam_media?ids=10,730[&fields=price].
+    Returns {'success': True, 'items': {app_id: payload}} where each payload matches the
+    single-app endpoint. With fields=price only price_overview is returned, which lets
+    the upstream lookups be batched several apps per call.
+    """
+    raw_ids = request.args.get('ids', '')
+    ids = [i.strip() for i in raw_ids.split(',') if i.strip()]
+    if not ids or not all(i.isdigit() for i in ids):
+        return jsonify({'success': False, 'error': 'ids must be a comma-separated list of app ids'}), 400
+    if len(ids) > STEAM_BATCH_MAX_IDS:
+        return jsonify({'success': False, 'error': f'At most {STEAM_BATCH_MAX_IDS} ids per request'}), 400
+
+    if request.args.get('fields') == 'price':
+        items = {}
+        uncached = []
+        for app_id in dict.fromkeys(ids):
+            # Reuse full media entries when we already have them
+            cached = steam_cache.peek(app_id)
+            if cached and cached[1] == 200:
+                items[app_id] = {'success': True, 'price_overview': cached[0].get('price_overview', {})}
+            else:
+                uncached.append(app_id)
+        for app_id, (payload, _status) in steam_price_cache.get_many(uncached, fetch_many=steam_client.fetch_prices).items():
+            items[app_id] = payload
+    else:
+        items = {app_id: payload for app_id, (payload, _status) in steam_cache.get_many(ids).items()}
+    return jsonify({'success': True, 'items': items})
+
+@app.cli.command('warm-steam')
+@click.option('--base-url', default=lambda: f"http://127.0.0.1:{os.environ.get('PORT', '5000')}",
+              show_default='http://127.0.0.1:$PORT (5000)', help='The running server whose cache to warm.')
+def warm_steam_command(base_url):
+    """Prefetch Steam media for every game in the catalog on a running server.
+    The cache lives in the server's worker processes, so warming this CLI process would be useless."""
+    ids = steam_app_ids()
+    for i in range(0, len(ids), STEAM_BATCH_MAX_IDS):
+        chunk = ids[i:i + STEAM_BATCH_MAX_IDS]
+        resp = steam_client.session.get(f"{base_url.rstrip('/')}/api/steam_media", params={'ids': ','.join(chunk)}, timeout=120)
+        resp.raise_for_status()
+        items = resp.json().get('items', {})
+        ok = sum(1 for item in items.values() if item.get('success'))
+        print(f"Warmed {ok}/{len(chunk)} apps on {base_url}")
+
+@app.cli.command('migrate-tinydb')
+@click.argument('source', required=False)
+def migrate_tinydb_command(source):
+    """Copy a TinyDB JSON file (default: DB_PATH) into the current SQLite storage."""
+    source = source or os.environ.get('DB_PATH', 'db.json')
+    if not hasattr(storage, 'import_if_empty'):
+        raise click.ClickException('Set STORAGE_BACKEND=sqlite to migrate into SQLite.')
+    counts = migrate_tinydb(source, storage, only_if_empty=True)
+    if counts is None:
+        raise click.ClickException('Target database already has data; refusing to migrate twice.')
+    print(f"Migrated {source}: {counts}")
+
 
 if __name__ == '__main__':
     app.run(debug=True)
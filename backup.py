@@ -0,0 +1,111 @@
+"""Streaming backup export/import.
+
+Formats:
+- json:   the original backup document {"users": [...], "votes": [...], "submitted_games": [...], "exported_at": ...}
+- ndjson: one JSON object per line; a header line, then {"table": ..., "row": {...}} per row
+Either may be gzip-compressed; imports detect gzip and the format automatically.
+"""
+import gzip
+import io
+import json
+import zlib
+
+from storage import TABLES
+
+NDJSON_FORMAT = 'lan-game-vote-ndjson'
+CHUNK_SIZE = 64 * 1024
+
+
+def export_json(storage, exported_at):
+    """Yield the classic JSON backup document in chunks without building it in memory."""
+    rows = storage.iter_snapshot()
+    pending = next(rows, None)
+    yield '{'
+    # iter_snapshot() yields tables in TABLES order; empty tables still get their key
+    for table in TABLES:
+        yield f'\n  {json.dumps(table)}: ['
+        first = True
+        while pending is not None and pending[0] == table:
+            yield ('\n    ' if first else ',\n    ') + json.dumps(pending[1])
+            first = False
+            pending = next(rows, None)
+        yield '],' if first else '\n  ],'
+    yield f'\n  "exported_at": {json.dumps(exported_at)}\n}}\n'
+
+
+def export_ndjson(storage, exported_at):
+    """Yield NDJSON lines: a header followed by one line per row."""
+    yield json.dumps({'type': 'header', 'format': NDJSON_FORMAT, 'version': 1, 'exported_at': exported_at}) + '\n'
+    for table, row in storage.iter_snapshot():
+        yield json.dumps({'table': table, 'row': row}) + '\n'
+
+
+def buffered(chunks, size=CHUNK_SIZE):
+    """Group many small string chunks into ~`size` byte UTF-8 blocks."""
+    buf = []
+    length = 0
+    for chunk in chunks:
+        data = chunk.encode('utf-8')
+        buf.append(data)
+        length += len(data)
+        if length >= size:
+            yield b''.join(buf)
+            buf = []
+            length = 0
+    if buf:
+        yield b''.join(buf)
+
+
+def gzipped(blocks, level=6):
+    """Compress a stream of byte blocks into a gzip stream."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for block in blocks:
+        out = compressor.compress(block)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def read_backup(fileobj):
+    """Return an iterator of (table, row) from an uploaded backup (json or ndjson, optionally gzipped).
+    NDJSON is parsed line by line; the classic JSON document has to be parsed whole.
+    Raises ValueError if the content is not a backup.
+    """
+    raw = fileobj
+    magic = raw.read(2)
+    raw.seek(0)
+    if magic == b'\x1f\x8b':
+        raw = gzip.GzipFile(fileobj=raw)
+    text = io.TextIOWrapper(raw, encoding='utf-8')
+
+    first = text.readline()
+    try:
+        head = json.loads(first) if first.strip() else None
+    except json.JSONDecodeError:
+        head = None
+    if isinstance(head, dict) and (head.get('type') == 'header' or 'table' in head):
+        return _iter_ndjson(head, text)
+
+    # Classic JSON backup (possibly pretty-printed across many lines)
+    if head is None:
+        try:
+            head = json.loads(first + text.read())
+        except json.JSONDecodeError as e:
+            raise ValueError(f'Invalid JSON: {e}')
+    if not isinstance(head, dict):
+        raise ValueError('Backup must be a JSON object')
+    return ((table, row) for table in TABLES for row in head.get(table, []) or [])
+
+
+def _iter_ndjson(head, lines):
+    if head.get('type') != 'header':
+        yield head.get('table'), head.get('row')
+    for lineno, line in enumerate(lines, start=2):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f'Invalid NDJSON on line {lineno}: {e}')
+        if isinstance(item, dict):
+            yield item.get('table'), item.get('row')
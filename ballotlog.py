@@ -0,0 +1,540 @@
+"""Write-ahead ballot log in front of a storage backend.
+
+With TinyDB every ballot rewrites the whole JSON file, so a room full of people pressing
+"submit" at once queues up behind full-file rewrites. BallotLogStorage records ballots in
+an append-only log instead:
+
+- Group commit: concurrent record_ballot() calls are gathered for up to a few
+  milliseconds and written as one append with one fsync; every caller returns once the
+  batch is durable.
+- Each log entry carries the resolved user id, submission and generation, assigned under
+  the log's file lock from an in-memory index of users (kept current by reading entries
+  other processes appended), so results are the same as writing to storage directly.
+- A background thread compacts the log into the wrapped storage (one write for all
+  entries) and starts a fresh log. Compacted entries are recorded by seq in the storage,
+  so replaying a log that was already partly compacted doesn't duplicate votes.
+- On startup the log is replayed (compacted) before anything is read.
+
+Reads never wait for a compaction: they merge the uncompacted entries (those past the
+storage's recorded seq) into what the wrapped storage returns. Every other write goes
+straight to the wrapped storage.
+The generation counter lives next to the log and moves once per ballot or write.
+
+The log is JSON lines: a header {"ballot_log": 1, "id": ...} followed by one entry per ballot.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+
+from metrics import span
+from storage import TABLES, Storage, _history_key, file_lock, read_generation, write_generation
+from votestore import _as_int
+
+LOG_FORMAT = 1
+# vote_history row ids for logged votes (not stored yet): LOG_ROW_ID + seq * LOG_ROW_STRIDE + index
+LOG_ROW_ID = 1 << 52
+LOG_ROW_STRIDE = 1 << 12
+
+
+class _Pending:
+    __slots__ = ('user_name', 'votes', 'now_iso', 'result', 'error')
+
+    def __init__(self, user_name, votes, now_iso):
+        self.user_name = user_name
+        self.votes = votes
+        self.now_iso = now_iso
+        self.result = None
+        self.error = None
+
+
+class BallotLogStorage(Storage):
+    """Storage wrapper that writes ballots through a group-committed append-only log."""
+
+    def __init__(self, inner, path, commit_window=0.002, max_batch=256, compact_seconds=5.0,
+                 compact_entries=1000):
+        self.inner = inner
+        self.path = path
+        self.lock_path = path + '.lock'
+        self.generation_path = path + '.gen'
+        self.commit_window = commit_window
+        self.max_batch = max_batch
+        self.compact_seconds = compact_seconds
+        self.compact_entries = compact_entries
+        self._lock = threading.RLock()
+        # Group commit: callers queue here; one of them at a time writes a batch
+        self._commit = threading.Condition()
+        self._queue = []
+        self._committing = False
+        # In-memory index of the log and users, valid for log file `_log_id` up to `_offset`
+        self._log_id = None
+        self._offset = 0
+        self._entries = 0
+        self._seq = 0
+        self._users = {}  # name -> [user_id, latest submission]
+        self._user_count = 0
+        self._max_user_id = 0
+        self._position = (None, 0)  # (storage generation, its ballot_log_position() then)
+        self._compactor_pid = None
+        self._wake = threading.Event()
+        self._stats = {'ballots': 0, 'batches': 0, 'largest_batch': 0, 'fsync_seconds': 0.0,
+                       'compactions': 0, 'compacted_entries': 0, 'last_compaction_seconds': None,
+                       'last_error': None}
+        with self._locked(exclusive=True):
+            if not os.path.exists(self.path):
+                self._start_log()
+            if not os.path.exists(self.generation_path):
+                write_generation(self.generation_path, inner.generation())
+            # Recovery: whatever the log holds goes into storage before anything is read
+            replayed = self._compact_locked()
+        if replayed:
+            print(f"Ballot log: replayed {replayed} ballots from {self.path}", flush=True)
+
+    @classmethod
+    def from_env(cls, inner, path):
+        return cls(
+            inner, path,
+            commit_window=float(os.environ.get('BALLOT_COMMIT_MS', '2')) / 1000.0,
+            max_batch=int(os.environ.get('BALLOT_COMMIT_MAX', '256')),
+            compact_seconds=float(os.environ.get('BALLOT_COMPACT_SECONDS', '5')),
+            compact_entries=int(os.environ.get('BALLOT_COMPACT_ENTRIES', '1000')),
+        )
+
+    # --- Locking and files ---
+
+    def _locked(self, exclusive=False):
+        return file_lock(self.lock_path, self._lock, exclusive)
+
+    def _start_log(self):
+        # Caller holds the exclusive lock. A fresh log is swapped in atomically.
+        log_id = uuid.uuid4().hex
+        header = (json.dumps({'ballot_log': LOG_FORMAT, 'id': log_id}) + '\n').encode('utf-8')
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(header)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        _fsync_dir(self.path)
+        return log_id, len(header)
+
+    def _read_log(self, start=0):
+        """(log id, entries from byte `start`, end offset of the last complete line)."""
+        with open(self.path, 'rb') as f:
+            header_line = f.readline()
+            header = json.loads(header_line)
+            f.seek(max(start, len(header_line)))
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        entries = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+        return header['id'], entries, max(start, len(header_line)) + end
+
+    def _pending_entries(self):
+        """Log entries not in the wrapped storage yet (caller holds the lock). Entries at or
+        below the storage's seq were applied by a compaction that crashed before it could
+        start a fresh log."""
+        _log_id, entries, _end = self._read_log()
+        if entries:
+            position = self._log_position()
+            entries = [entry for entry in entries if entry['seq'] > position]
+        return entries
+
+    def _log_position(self):
+        """The storage's ballot_log_position(), read again only once its generation moved:
+        TinyDB parses all of db.json for it. Every write there, including a compaction's,
+        bumps that generation."""
+        generation = self.inner.generation()
+        cached_generation, position = self._position
+        if generation != cached_generation:
+            position = self.inner.ballot_log_position()
+            self._position = (generation, position)
+        return position
+
+    def _bump_generation(self):
+        return write_generation(self.generation_path, read_generation(self.generation_path) + 1)
+
+    # --- Keeping the index current ---
+
+    def _sync(self):
+        """Catch up with entries other processes appended (caller holds the exclusive lock)."""
+        log_id, entries, end = self._read_log(self._offset if self._log_id else 0)
+        if log_id != self._log_id:
+            # A new log: everything before it is in storage now
+            self._rebuild_index()
+            log_id, entries, end = self._read_log()
+            self._log_id, self._entries = log_id, 0
+        for entry in entries:
+            self._index(entry)
+        self._entries += len(entries)
+        self._offset = end
+        if os.path.getsize(self.path) > end:
+            # A torn write from a crashed process; it was never acknowledged
+            os.truncate(self.path, end)
+
+    def _rebuild_index(self):
+        snap = self.inner.snapshot()
+        latest_vote = {}
+        for vote in snap['votes']:
+            # Legacy rows may miss 'submission' (counts as 1) or hold it as a string
+            submission = _as_int(vote.get('submission', 1))
+            player_id = vote.get('player_id')
+            if submission > latest_vote.get(player_id, 0):
+                latest_vote[player_id] = submission
+        self._users = {}
+        for user in snap['users']:
+            submission = max(_as_int(user.get('submission'), 0), latest_vote.get(user.get('id'), 0))
+            self._users.setdefault(user.get('name'), [user.get('id'), submission])
+        self._user_count = len(snap['users'])
+        self._max_user_id = max([0] + [_as_int(user.get('id'), 0) for user in snap['users']])
+        self._seq = max(self._seq, self._log_position())
+
+    def _index(self, entry):
+        self._users[entry['name']] = [entry['user_id'], entry['submission']]
+        if entry['new_user']:
+            self._user_count += 1
+            self._max_user_id = max(self._max_user_id, entry['user_id'])
+        self._seq = max(self._seq, entry['seq'])
+
+    # --- Ballots ---
+
+    def record_ballot(self, user_name, votes, now_iso):
+        self._ensure_compactor()
+        pending = _Pending(user_name, votes, now_iso)
+        with self._commit:
+            self._queue.append(pending)
+            self._commit.notify_all()
+            while pending.result is None and pending.error is None:
+                if self._committing:
+                    self._commit.wait()
+                    continue
+                # Lead the next batch: give concurrent submissions a moment to join
+                self._committing = True
+                self._commit.wait_for(lambda: len(self._queue) >= self.max_batch, self.commit_window)
+                batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+                self._commit.release()
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    for item in batch:
+                        item.error = e
+                finally:
+                    self._commit.acquire()
+                    self._committing = False
+                    self._commit.notify_all()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _write_batch(self, batch):
+        with self._locked(exclusive=True):
+            try:
+                self._append(batch)
+            except Exception:
+                # The index may hold entries that never made it to disk; rebuild it next time
+                self._log_id = None
+                raise
+        if self._entries >= self.compact_entries:
+            self._wake.set()
+
+    def _append(self, batch):
+        # Caller holds the exclusive lock
+        self._sync()
+        generation = read_generation(self.generation_path)
+        lines = []
+        for pending in batch:
+            user = self._users.get(pending.user_name)
+            if user is not None:
+                user_id, submission, new_user = user[0], user[1] + 1, False
+            else:
+                user_id, submission, new_user = max(self._user_count, self._max_user_id) + 1, 1, True
+            generation += 1
+            entry = {'seq': self._seq + 1, 'generation': generation, 'user_id': user_id,
+                     'name': pending.user_name, 'new_user': new_user, 'submission': submission,
+                     'voted_at': pending.now_iso, 'votes': [[game_id, vote] for game_id, vote in pending.votes]}
+            self._index(entry)
+            lines.append(json.dumps(entry, separators=(',', ':')))
+            pending.result = (user_id, submission, new_user, generation)
+        data = ('\n'.join(lines) + '\n').encode('utf-8')
+        started = time.perf_counter()
+        with span('ballotlog.append'):
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+            try:
+                os.write(fd, data)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        self._offset += len(data)
+        self._entries += len(batch)
+        write_generation(self.generation_path, generation)
+        self._stats['ballots'] += len(batch)
+        self._stats['batches'] += 1
+        self._stats['largest_batch'] = max(self._stats['largest_batch'], len(batch))
+        self._stats['fsync_seconds'] += time.perf_counter() - started
+
+    # --- Compaction ---
+
+    def compact(self):
+        """Move logged ballots into the wrapped storage and start a fresh log.
+        Returns the number of ballots written."""
+        with self._locked(exclusive=True):
+            return self._compact_locked()
+
+    def _compact_locked(self):
+        self._sync()
+        _log_id, entries, _end = self._read_log()
+        if not entries:
+            return 0
+        started = time.perf_counter()
+        position = self._log_position()
+        entries = [entry for entry in entries if entry['seq'] > position]
+        if entries:
+            with span('ballotlog.compact'):
+                self.inner.apply_logged_ballots(entries)
+        # Generations in the log may be ahead of a generation file lost in a crash
+        write_generation(self.generation_path,
+                         max([read_generation(self.generation_path)] + [entry['generation'] for entry in entries]))
+        # The index already covers every entry, so it stays valid for the fresh log
+        self._log_id, self._offset = self._start_log()
+        self._entries = 0
+        with self._lock:
+            self._stats['compactions'] += 1
+            self._stats['compacted_entries'] += len(entries)
+            self._stats['last_compaction_seconds'] = round(time.perf_counter() - started, 4)
+        return len(entries)
+
+    def _ensure_compactor(self):
+        # Start lazily so each gunicorn worker (post-fork) gets its own thread
+        if self._compactor_pid == os.getpid():
+            return
+        with self._lock:
+            if self._compactor_pid == os.getpid():
+                return
+            self._compactor_pid = os.getpid()
+            threading.Thread(target=self._compact_loop, name='ballot-compactor', daemon=True).start()
+
+    def _compact_loop(self):
+        while True:
+            self._wake.wait(self.compact_seconds)
+            self._wake.clear()
+            try:
+                if os.path.getsize(self.path) > self._header_size():
+                    self.compact()
+            except Exception as e:
+                with self._lock:
+                    self._stats['last_error'] = f'{type(e).__name__}: {e}'
+                print(f"Ballot log compaction failed: {e}", flush=True)
+
+    def _header_size(self):
+        with open(self.path, 'rb') as f:
+            return len(f.readline())
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['fsync_seconds'] = round(stats['fsync_seconds'], 4)
+        stats['log_bytes'] = os.path.getsize(self.path)
+        stats['uncompacted_entries'] = self._entries
+        return stats
+
+    # --- Reads ---
+
+    def generation(self):
+        return read_generation(self.generation_path)
+
+    def _read_merged(self, read):
+        # The storage read and the log it is merged with are taken under one shared lock,
+        # so a concurrent compaction can't make an entry show up twice or not at all
+        with self._locked():
+            return read(), self._pending_entries()
+
+    def snapshot(self):
+        def read():
+            snap = self.inner.snapshot()
+            snap['generation'] = read_generation(self.generation_path)
+            return snap
+        snap, entries = self._read_merged(read)
+        _merge_users(snap['users'], entries)
+        snap['votes'].extend(_vote_rows(entries))
+        return snap
+
+    def columnar_snapshot(self):
+        def read():
+            snap = self.inner.columnar_snapshot()
+            snap['generation'] = read_generation(self.generation_path)
+            return snap
+        snap, entries = self._read_merged(read)
+        _merge_users(snap['users'], entries)
+        snap['votes'].extend((entry['user_id'], game_id, vote, entry['submission'], entry['voted_at'])
+                             for entry in entries for game_id, vote in entry['votes'])
+        return snap
+
+    def all_users(self):
+        users, entries = self._read_merged(self.inner.all_users)
+        _merge_users(users, entries)
+        return users
+
+    def all_votes(self):
+        votes, entries = self._read_merged(self.inner.all_votes)
+        votes.extend(_vote_rows(entries))
+        return votes
+
+    def all_submitted_games(self):
+        return self.inner.all_submitted_games()
+
+    def count_users(self):
+        count, entries = self._read_merged(self.inner.count_users)
+        return count + sum(1 for entry in entries if entry['new_user'])
+
+    def iter_snapshot(self):
+        def read():
+            # Pulling the first row starts the storage's read snapshot while the lock is held
+            rows = self.inner.iter_snapshot()
+            first = next(rows, None)
+            return first, rows
+        (first, rows), entries = self._read_merged(read)
+        if not entries:
+            return _chain_first(first, rows)
+        return _merge_rows(_chain_first(first, rows), entries)
+
+    def vote_history(self, limit, cursor=None, user=None, game_id=None, vote=None, since=None, until=None):
+        filters = {'user': user, 'game_id': game_id, 'vote': vote, 'since': since, 'until': until}
+        (rows, next_cursor), entries = self._read_merged(
+            lambda: self.inner.vote_history(limit, cursor=cursor, **filters))
+        logged = _history_rows(entries, cursor, **filters)
+        if not logged:
+            return rows, next_cursor
+        # Merge newest first. A ballot is either in storage or in the log, so rows from the two
+        # never tie on (voted_at, submission, player_id) and storage rows need no row id here.
+        page = []
+        i = j = 0
+        while len(page) < limit and (i < len(rows) or j < len(logged)):
+            if j == len(logged) or (i < len(rows) and _history_key(rows[i], 0)[:3] > logged[j][0][:3]):
+                page.append(rows[i])
+                i += 1
+            else:
+                page.append(logged[j][1])
+                j += 1
+        if i == len(rows) and j == len(logged) and next_cursor is None:
+            return page, None
+        if not i or page[-1] is not rows[i - 1]:
+            return page, list(logged[j - 1][0])
+        if i < len(rows):
+            # Only storage knows its rows' ids: ask it where its i-th row sits
+            _rows, resume = self.inner.vote_history(i, cursor=cursor, **filters)
+            return page, resume
+        # Storage's page ended on this row; without a next page nothing else shares its key prefix
+        return page, next_cursor or list(_history_key(rows[i - 1], 0))
+
+    def is_empty(self):
+        empty, entries = self._read_merged(self.inner.is_empty)
+        return empty and not entries
+
+    # --- Other writes ---
+
+    def insert_submitted_games(self, games, first_id=1):
+        with self._locked(exclusive=True):
+            ids, _generation = self.inner.insert_submitted_games(games, first_id)
+            return ids, self._bump_generation()
+
+    def bulk_import(self, rows, replace=False):
+        with self._locked(exclusive=True):
+            self._compact_locked()
+            counts, _generation = self.inner.bulk_import(rows, replace=replace)
+            self._start_log()
+            # Imported users change the index: rebuild it from storage
+            self._log_id = None
+            self._sync()
+            return counts, self._bump_generation()
+
+    def apply_logged_ballots(self, entries):
+        return self.inner.apply_logged_ballots(entries)
+
+    def ballot_log_position(self):
+        return self.inner.ballot_log_position()
+
+    def close(self):
+        self.inner.close()
+
+
+def _vote_rows(entries):
+    return [{'player_id': entry['user_id'], 'game_id': game_id, 'vote': vote,
+             'voted_at': entry['voted_at'], 'submission': entry['submission']}
+            for entry in entries for game_id, vote in entry['votes']]
+
+
+def _chain_first(first, rows):
+    if first is not None:
+        yield first
+        yield from rows
+
+
+def _merge_rows(rows, entries):
+    """Storage rows (table by table, in TABLES order) with the logged ballots merged in."""
+    new_users = []
+    _merge_users(new_users, entries)
+    latest = {entry['user_id']: entry for entry in entries}
+    extra = {'users': new_users, 'votes': _vote_rows(entries)}
+    done = 0
+    for table, row in rows:
+        position = TABLES.index(table) if table in TABLES else done
+        for finished in TABLES[done:position]:
+            yield from ((finished, extra_row) for extra_row in extra.get(finished, ()))
+        done = max(done, position)
+        if table == 'users' and row.get('id') in latest:
+            entry = latest[row['id']]
+            row = dict(row, voted_at=entry['voted_at'], submission=entry['submission'])
+        yield table, row
+    for finished in TABLES[done:]:
+        yield from ((finished, extra_row) for extra_row in extra.get(finished, ()))
+
+
+def _history_rows(entries, cursor=None, user=None, game_id=None, vote=None, since=None, until=None):
+    """(sort key, vote_history row) for the logged votes matching the filters, newest first.
+    Their row ids are placeholders above any real one, in ballot order."""
+    found = []
+    for entry in entries:
+        for index, (entry_game_id, entry_vote) in enumerate(entry['votes']):
+            row = {'voted_at': entry['voted_at'], 'user': entry['name'], 'player_id': entry['user_id'],
+                   'game_id': str(entry_game_id), 'vote': entry_vote, 'submission': entry['submission']}
+            key = _history_key(row, LOG_ROW_ID + entry['seq'] * LOG_ROW_STRIDE + index)
+            if ((cursor is None or key < tuple(cursor))
+                    and (user is None or row['user'] == user)
+                    and (game_id is None or row['game_id'] == game_id)
+                    and (vote is None or row['vote'] == vote)
+                    and (since is None or (row['voted_at'] or '') >= since)
+                    and (until is None or (row['voted_at'] or '') <= until)):
+                found.append((key, row))
+    found.sort(key=lambda item: item[0], reverse=True)
+    return found
+
+
+def _merge_users(users, entries):
+    # Same effect on user rows as writing the entries to storage
+    by_id = {}
+    for user in users:
+        by_id.setdefault(user.get('id'), []).append(user)
+    for entry in entries:
+        if entry['new_user']:
+            user = {'id': entry['user_id'], 'name': entry['name'], 'voted_at': entry['voted_at'],
+                    'submission': entry['submission']}
+            users.append(user)
+            by_id.setdefault(entry['user_id'], []).append(user)
+        else:
+            for user in by_id.get(entry['user_id'], ()):
+                user['voted_at'] = entry['voted_at']
+                user['submission'] = entry['submission']
+
+
+def _fsync_dir(path):
+    # Make a rename durable (not possible on every platform)
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
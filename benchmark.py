@@ -0,0 +1,446 @@
+"""Benchmarks for the voting hot paths.
+
+Every run builds a synthetic dataset in a temporary directory (the real DB_PATH is never
+touched), then measures one of:
+
+    python benchmark.py micro    # compute_formatted_results(), get_all_games(), reload_from_storage()
+    python benchmark.py client   # endpoints through the Flask test client (single process)
+    python benchmark.py server   # endpoints through a local gunicorn with concurrent clients
+    python benchmark.py all
+
+Dataset size: --users, --submissions (per user), --games (games rated per ballot) and
+--submitted-games (extra catalog entries). Endpoint runs report p50/p95/p99 latency,
+throughput and peak RSS (of this process, or of the gunicorn master and workers).
+`--json out.json` also writes the numbers to a file for comparing runs.
+"""
+import argparse
+import contextlib
+import gzip
+import io
+import json
+import os
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+VOTE_CHOICES = ('interested', 'maybe', 'not_interested')
+CATALOG_SIZE = 48  # hardcoded games in app.py
+
+
+# --- Synthetic data ---
+
+def make_dataset(users, submissions, games, submitted_games, seed=1):
+    """Return (users, votes, submitted_games) rows in the storage format.
+    Each user casts `submissions` ballots rating `games` random catalog games."""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    catalog = CATALOG_SIZE + submitted_games
+    per_ballot = min(games, catalog)
+    user_rows, vote_rows = [], []
+    step = 0
+    for user_id in range(1, users + 1):
+        voted_at = None
+        for submission in range(1, submissions + 1):
+            step += 1
+            voted_at = (start + timedelta(seconds=step * 7)).isoformat()
+            for game_id in rng.sample(range(1, catalog + 1), per_ballot):
+                vote_rows.append({'player_id': user_id, 'game_id': str(game_id), 'vote': rng.choice(VOTE_CHOICES),
+                                  'voted_at': voted_at, 'submission': submission})
+        user_rows.append({'id': user_id, 'name': f'user{user_id}', 'voted_at': voted_at, 'submission': submissions})
+    game_rows = [{
+        'title': f'Submitted Game {i}',
+        'url': f'https://store.steampowered.com/app/{900000 + i}/',
+        'price': f'${rng.randint(0, 60)}.99',
+        'max_players': str(rng.randint(2, 64)),
+        'steam_app_id': str(900000 + i),
+        'youtube_id': None,
+        'submitted_at': start.isoformat(),
+    } for i in range(1, submitted_games + 1)]
+    return user_rows, vote_rows, game_rows
+
+
+def seed_storage(args, env):
+    """Write the synthetic dataset into the storage configured by `env`."""
+    from storage import open_storage
+    user_rows, vote_rows, game_rows = make_dataset(args.users, args.submissions, args.games,
+                                                   args.submitted_games, args.seed)
+    saved = {k: os.environ.get(k) for k in env}
+    os.environ.update(env)
+    try:
+        storage = open_storage()
+        started = time.perf_counter()
+        storage.import_rows(user_rows, vote_rows, game_rows, replace=True)
+        elapsed = time.perf_counter() - started
+        storage.close()
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+    print(f"Dataset: {len(user_rows)} users, {len(vote_rows)} votes, {len(game_rows)} submitted games "
+          f"({args.backend}, seeded in {elapsed:.2f}s)", flush=True)
+
+
+def bench_env(args, data_dir):
+    env = {
+        'DB_PATH': os.path.join(data_dir, 'db.json'),
+        'SQLITE_PATH': os.path.join(data_dir, 'db.sqlite3'),
+        'STORAGE_BACKEND': args.backend,
+        'STEAM_PREFETCH': '0',
+        'ADMIN_TOKEN': 'bench',
+    }
+    return env
+
+
+# --- Measurement ---
+
+def read_rss_kb(pid):
+    """Current resident set size of `pid` in kB (Linux /proc), or None."""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        return None
+    return None
+
+
+def child_pids(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+class RSSSampler:
+    """Track the peak combined RSS of `pids_fn()` while the block runs."""
+
+    def __init__(self, pids_fn, interval=0.02):
+        self.pids_fn = pids_fn
+        self.interval = interval
+        self.peak_kb = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        sizes = [read_rss_kb(pid) for pid in self.pids_fn()]
+        total = sum(s for s in sizes if s)
+        if total > self.peak_kb:
+            self.peak_kb = total
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+        if not self.peak_kb:
+            # No /proc (e.g. macOS): fall back to this process's lifetime peak
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.peak_kb = maxrss // 1024 if sys.platform == 'darwin' else maxrss
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(name, latencies, elapsed, peak_rss_kb=None, errors=0):
+    values = sorted(latencies)
+    return {
+        'name': name,
+        'requests': len(values),
+        'errors': errors,
+        'p50_ms': percentile(values, 50) * 1000,
+        'p95_ms': percentile(values, 95) * 1000,
+        'p99_ms': percentile(values, 99) * 1000,
+        'max_ms': (values[-1] * 1000) if values else 0.0,
+        'throughput_rps': len(values) / elapsed if elapsed > 0 else 0.0,
+        'peak_rss_mb': (peak_rss_kb / 1024.0) if peak_rss_kb else None,
+    }
+
+
+def print_table(title, rows):
+    print(f"\n{title}")
+    print(f"{'name':<28}{'n':>7}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+          f"{'req/s':>10}{'RSS MB':>9}")
+    for r in rows:
+        rss = f"{r['peak_rss_mb']:.1f}" if r['peak_rss_mb'] else '-'
+        print(f"{r['name']:<28}{r['requests']:>7}{r['errors']:>5}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}"
+              f"{r['p99_ms']:>10.2f}{r['max_ms']:>10.2f}{r['throughput_rps']:>10.1f}{rss:>9}")
+    sys.stdout.flush()
+
+
+# --- Scenarios ---
+# Each scenario is (name, request count multiplier, concurrency override, request builder).
+# A builder returns (method, path, kwargs) for the test client / requests.
+
+def make_scenarios(args, backup_blob):
+    rng = random.Random(args.seed + 1)
+    catalog = CATALOG_SIZE + args.submitted_games
+    per_ballot = min(args.games, catalog)
+    lock = threading.Lock()
+    new_voter = [0]
+
+    def vote():
+        with lock:
+            if rng.random() < 0.5:
+                name = f'user{rng.randint(1, max(1, args.users))}'
+            else:
+                new_voter[0] += 1
+                name = f'bench{new_voter[0]}'
+            ballot = {str(g): rng.choice(('interested', 'maybe', 'not-interested'))
+                      for g in rng.sample(range(1, catalog + 1), per_ballot)}
+        return 'POST', '/vote', {'json': {'user_name': name, 'votes': ballot}}
+
+    def results():
+        return 'GET', '/api/results', {}
+
+    def history():
+        return 'GET', '/votehistory', {}
+
+    def history_filtered():
+        with lock:
+            user = f'user{rng.randint(1, max(1, args.users))}'
+        return 'GET', '/api/votehistory', {'params': {'user': user, 'limit': 100}}
+
+    def admin_import():
+        return 'POST', '/admin/import', {'data': {'token': 'bench', 'mode': 'replace'},
+                                          'files': {'backup_file': ('backup.ndjson.gz', backup_blob)}}
+
+    return [
+        ('GET /api/results', 1, None, results),
+        ('GET /votehistory', 1, None, history),
+        ('GET /api/votehistory?user=', 1, None, history_filtered),
+        ('POST /vote', 1, None, vote),
+        # Imports replace everything; run a few, one at a time
+        ('POST /admin/import', 0, 1, admin_import),
+    ]
+
+
+def build_backup(env):
+    """An ndjson.gz backup of the seeded dataset, as uploaded to /admin/import."""
+    from backup import export_ndjson
+    from storage import open_storage
+    saved = {k: os.environ.get(k) for k in env}
+    os.environ.update(env)
+    try:
+        storage = open_storage()
+        data = ''.join(export_ndjson(storage, datetime.utcnow().isoformat())).encode('utf-8')
+        storage.close()
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+    return gzip.compress(data)
+
+
+def scenario_count(args, multiplier):
+    return args.requests * multiplier if multiplier else args.import_runs
+
+
+def run_client(args, data_dir):
+    """Drive the app in-process through the Flask test client."""
+    env = bench_env(args, data_dir)
+    seed_storage(args, env)
+    backup_blob = build_backup(env)
+    os.environ.update(env)
+    sys.path.insert(0, ROOT)
+    import app as app_module
+    client = app_module.app.test_client()
+    rows = []
+    for name, multiplier, _concurrency, build in make_scenarios(args, backup_blob):
+        count = scenario_count(args, multiplier)
+        latencies, errors = [], 0
+        with RSSSampler(lambda: [os.getpid()]) as rss, contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            for _ in range(count):
+                method, path, kwargs = build()
+                kwargs = dict(kwargs)
+                if 'params' in kwargs:
+                    kwargs['query_string'] = kwargs.pop('params')
+                if 'files' in kwargs:
+                    field, (filename, blob) = next(iter(kwargs.pop('files').items()))
+                    kwargs['data'] = dict(kwargs['data'], **{field: (io.BytesIO(blob), filename)})
+                t0 = time.perf_counter()
+                resp = client.open(path, method=method, **kwargs)
+                latencies.append(time.perf_counter() - t0)
+                if resp.status_code >= 400:
+                    errors += 1
+            elapsed = time.perf_counter() - started
+        rows.append(summarize(name, latencies, elapsed, rss.peak_kb, errors))
+    print_table(f"Flask test client ({args.requests} requests per endpoint)", rows)
+    return rows
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_server(base_url, proc, timeout=30.0):
+    import requests
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with status {proc.returncode}')
+        try:
+            requests.get(base_url + '/api/results', timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn did not start in time')
+
+
+def run_server(args, data_dir):
+    """Drive a local gunicorn (same Procfile worker class) with concurrent HTTP clients."""
+    import requests
+    env = bench_env(args, data_dir)
+    seed_storage(args, env)
+    backup_blob = build_backup(env)
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    log_path = os.path.join(data_dir, 'gunicorn.log')
+    cmd = [sys.executable, '-m', 'gunicorn', '--workers', str(args.workers), '--worker-class', 'gthread',
+           '--threads', str(args.threads), '--bind', f'127.0.0.1:{port}', 'app:app']
+    with open(log_path, 'w') as log:
+        proc = subprocess.Popen(cmd, cwd=ROOT, env=dict(os.environ, **env), stdout=log, stderr=log)
+    try:
+        wait_for_server(base_url, proc)
+        local = threading.local()
+
+        def session():
+            if not hasattr(local, 'session'):
+                local.session = requests.Session()
+            return local.session
+
+        rows = []
+        for name, multiplier, concurrency, build in make_scenarios(args, backup_blob):
+            count = scenario_count(args, multiplier)
+            concurrency = concurrency or args.concurrency
+            errors = [0]
+
+            def one(_):
+                method, path, kwargs = build()
+                t0 = time.perf_counter()
+                try:
+                    resp = session().request(method, base_url + path, allow_redirects=False, timeout=120, **kwargs)
+                    failed = resp.status_code >= 400
+                except requests.RequestException:
+                    failed = True
+                elapsed = time.perf_counter() - t0
+                if failed:
+                    errors[0] += 1
+                return elapsed
+
+            with RSSSampler(lambda: [proc.pid] + child_pids(proc.pid)) as rss:
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                    latencies = list(pool.map(one, range(count)))
+                elapsed = time.perf_counter() - started
+            rows.append(summarize(name, latencies, elapsed, rss.peak_kb, errors[0]))
+        print_table(f"gunicorn: {args.workers} workers x {args.threads} threads, "
+                    f"{args.concurrency} concurrent clients ({args.requests} requests per endpoint)", rows)
+        return rows
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        if args.verbose:
+            with open(log_path) as f:
+                print(f.read())
+
+
+def time_calls(name, fn, repeat):
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+    return summarize(name, latencies, elapsed)
+
+
+def run_micro(args, data_dir):
+    """Time the in-process hot paths directly against the seeded storage."""
+    env = bench_env(args, data_dir)
+    seed_storage(args, env)
+    os.environ.update(env)
+    sys.path.insert(0, ROOT)
+    import app as app_module
+    rows = [
+        time_calls('compute_formatted_results', app_module.compute_formatted_results, args.repeat),
+        time_calls('get_all_games', app_module.get_all_games, args.repeat),
+        time_calls('reload_from_storage', app_module.reload_from_storage, max(1, args.repeat // 10)),
+    ]
+    print_table(f"Micro-benchmarks ({args.repeat} calls)", rows)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('mode', choices=('micro', 'client', 'server', 'all'))
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--submissions', type=int, default=3, help='ballots per user')
+    parser.add_argument('--games', type=int, default=20, help='games rated per ballot')
+    parser.add_argument('--submitted-games', type=int, default=50, help='extra catalog entries')
+    parser.add_argument('--backend', choices=('sqlite', 'tinydb'), default='sqlite')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint')
+    parser.add_argument('--import-runs', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=50, help='calls per micro-benchmark')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent HTTP clients')
+    parser.add_argument('--json', help='also write results to this file')
+    parser.add_argument('--verbose', action='store_true', help='print the gunicorn log')
+    args = parser.parse_args(argv)
+
+    modes = ('micro', 'client', 'server') if args.mode == 'all' else (args.mode,)
+    report = {'config': vars(args), 'results': {}}
+    for mode in modes:
+        data_dir = tempfile.mkdtemp(prefix='lan-vote-bench-')
+        try:
+            runner = {'micro': run_micro, 'client': run_client, 'server': run_server}[mode]
+            report['results'][mode] = runner(args, data_dir)
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+        if mode != modes[-1] and mode in ('micro', 'client'):
+            # The app module is imported once per process; later in-process modes need a fresh one
+            sys.modules.pop('app', None)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""The game catalog: hardcoded games plus submitted ones, with stable ids and search indexes.
+
+Submitted games get a permanent 'id' when they are stored (see assign_ids()). Rows stored
+before ids were pinned keep the positional id they always had (first id after the
+hardcoded list, in storage order), so votes cast for them still match.
+
+CatalogIndex is built once per catalog version and answers /api/games:
+
+- title search: word prefixes via a sorted word list, substrings via a trigram index, and
+  typo-tolerant matches by trigram similarity;
+- filters on parsed price ('$12.99 or $34.99 for 4-Pack' -> 12.99, 'FREE' -> 0) and parsed
+  player counts ('8 / 12' -> 8..12, 'Crews up to 4' -> 1..4).
+"""
+import bisect
+import re
+
+SORTS = ('relevance', 'title', 'price', 'players')
+# Share of the query's trigrams a title must contain to count as a typo-tolerant match
+FUZZY_THRESHOLD = 0.5
+
+
+def assign_ids(submitted_games, first_id):
+    """Catalog ids for submitted games, in storage order.
+    A row's own 'id' is used when present (the first row claiming an id keeps it). Other rows
+    get first_id + their position, or the next id after the highest one if that is taken."""
+    ids = [_own_id(game) for game in submitted_games]
+    used = set()
+    for position, game_id in enumerate(ids):
+        if game_id is not None:
+            if game_id in used:
+                ids[position] = None
+            used.add(game_id)
+    highest = max(used, default=first_id - 1)
+    for position, game_id in enumerate(ids):
+        if game_id is None:
+            game_id = first_id + position
+            if game_id in used:
+                game_id = highest + 1
+            used.add(game_id)
+            highest = max(highest, game_id)
+            ids[position] = game_id
+    return ids
+
+
+def next_id(submitted_games, first_id):
+    """Id for a newly submitted game: one past every id the catalog uses."""
+    return max(assign_ids(submitted_games, first_id), default=first_id - 1) + 1
+
+
+def _own_id(game):
+    try:
+        game_id = int(game.get('id'))
+    except (TypeError, ValueError):
+        return None
+    return game_id if game_id > 0 else None
+
+
+def build_games(hardcoded, submitted_games):
+    """The full catalog: hardcoded games, then submitted games with their stable ids."""
+    first_id = max((game['id'] for game in hardcoded), default=0) + 1
+    return list(hardcoded) + [dict(game, id=game_id)
+                              for game, game_id in zip(submitted_games, assign_ids(submitted_games, first_id))]
+
+
+def parse_price(text):
+    """Lowest price in a free-text price, in the listed currency units; 0.0 for free games,
+    None if no price is given. '$20.99' -> 20.99, 'FREE' -> 0.0, 'N/A' -> None."""
+    text = str(text or '')
+    if re.search(r'\bfree\b', text, re.IGNORECASE):
+        return 0.0
+    numbers = re.findall(r'([$€£¥]\s*)?(\d[\d,]*(?:\.\d+)?)', text)
+    # Prefer amounts with a currency sign or cents over other numbers ('4-Pack')
+    amounts = ([n for sign, n in numbers if sign] or [n for _sign, n in numbers if '.' in n]
+               or [n for _sign, n in numbers])
+    return min(float(n.replace(',', '')) for n in amounts) if amounts else None
+
+
+def normalize_price(text):
+    """Tidy a submitted price: 'free' -> 'FREE', a bare amount ('10', '4.5') -> '$10.00' /
+    '$4.50'. Anything else is kept as written ('N/A' for blanks)."""
+    text = str(text or '').strip()
+    if not text:
+        return 'N/A'
+    if re.fullmatch(r'free(\s+to\s+play)?', text, re.IGNORECASE):
+        return 'FREE'
+    if re.fullmatch(r'\$?\s*\d+(\.\d{1,2})?', text):
+        return f"${float(text.lstrip('$').strip()):.2f}"
+    return text
+
+
+def parse_player_range(text):
+    """(fewest, most) player counts in a free-text max_players value, or None.
+    '8' -> (8, 8), '8 / 12' -> (8, 12), 'Crews up to 4' -> (1, 4), 'N/A' -> None."""
+    text = str(text or '')
+    numbers = [int(n) for n in re.findall(r'\d+', text)]
+    if not numbers:
+        return None
+    low = 1 if re.search(r'\bup to\b', text, re.IGNORECASE) else min(numbers)
+    return low, max(numbers)
+
+
+def parse_max_players(text):
+    """Largest player count mentioned in a free-text max_players value, or None.
+    '8' -> 8, '8 / 12' -> 12, 'Crews up to 13' -> 13, 'N/A' -> None."""
+    players = parse_player_range(text)
+    return players[1] if players else None
+
+
+def normalize_title(title):
+    """Lowercase, '&' spelled out, punctuation folded into single spaces."""
+    title = str(title or '').lower().replace('&', ' and ')
+    return ' '.join(re.findall(r'[^\W_]+', title))
+
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CatalogIndex:
+    def __init__(self, games):
+        self.games = list(games)
+        self.titles = [normalize_title(game['title']) for game in self.games]
+        self.prices = [parse_price(game.get('price')) for game in self.games]
+        self.players = [parse_player_range(game.get('max_players')) for game in self.games]
+        # Word prefix index: (word, position) pairs, sorted for bisecting
+        self._words = sorted({(word, i) for i, title in enumerate(self.titles) for word in title.split()})
+        self._word_keys = [word for word, _i in self._words]
+        # Trigram index: trigram -> positions of titles containing it
+        self._trigrams = {}
+        for i, title in enumerate(self.titles):
+            for gram in trigrams(title):
+                self._trigrams.setdefault(gram, []).append(i)
+
+    def __len__(self):
+        return len(self.games)
+
+    def search(self, query='', free=False, max_price=None, players=None, sort='relevance'):
+        """Positions of matching games, best first (catalog order when there is no query)."""
+        query = normalize_title(query)
+        if query:
+            scores = self._match(query)
+        else:
+            scores = dict.fromkeys(range(len(self.games)), 0.0)
+        matches = [i for i in scores if self._passes(i, free, max_price, players)]
+        if sort == 'title':
+            matches.sort(key=lambda i: self.titles[i])
+        elif sort == 'price':
+            matches.sort(key=lambda i: (self.prices[i] is None, self.prices[i] or 0.0, self.titles[i]))
+        elif sort == 'players':
+            matches.sort(key=lambda i: (-(self.players[i] or (0, 0))[1], self.titles[i]))
+        else:
+            matches.sort(key=lambda i: (-scores[i], i))
+        return matches
+
+    def item(self, i):
+        """Game dict for the API, with its parsed fields."""
+        players = self.players[i]
+        return dict(self.games[i], price_value=self.prices[i],
+                    min_players=players[0] if players else None, max_players_value=players[1] if players else None)
+
+    def _passes(self, i, free, max_price, players):
+        price = self.prices[i]
+        if free and price != 0.0:
+            return False
+        if max_price is not None and (price is None or price > max_price):
+            return False
+        if players is not None and (self.players[i] is None or self.players[i][1] < players):
+            return False
+        return True
+
+    def _match(self, query):
+        # 3: title starts with the query, 2: every query word starts a title word,
+        # 1: substring, below 1: share of the query's trigrams in the title (typos)
+        scores = {}
+        words = query.split()
+        prefixed = None
+        for word in words:
+            start = bisect.bisect_left(self._word_keys, word)
+            end = bisect.bisect_left(self._word_keys, word + '\uffff', start)
+            hits = {i for _word, i in self._words[start:end]}
+            prefixed = hits if prefixed is None else prefixed & hits
+        for i in prefixed or ():
+            scores[i] = 3.0 if self.titles[i].startswith(query) else 2.0
+        grams = trigrams(query)
+        shared = {}
+        for gram in grams:
+            for i in self._trigrams.get(gram, ()):
+                shared[i] = shared.get(i, 0) + 1
+        if len(query) < 3:
+            # Too short for trigrams to narrow anything down
+            for i, title in enumerate(self.titles):
+                if i not in scores and query in title:
+                    scores[i] = 1.0
+        for i, count in shared.items():
+            if i in scores:
+                continue
+            if query in self.titles[i]:
+                scores[i] = 1.0
+                continue
+            similarity = count / len(grams)
+            if similarity >= FUZZY_THRESHOLD:
+                scores[i] = similarity * 0.99
+        return scores
@@ -0,0 +1,325 @@
+"""Background pipeline for submitted games: dedupe, Steam enrichment and batched writes.
+
+/add_game only queues the submission and returns. A dispatcher thread drops duplicates
+(same Steam app id or same normalized title as a catalog game or one already in the
+pipeline), a small thread pool looks up each game's Steam price through the shared
+cached price fetcher, and a writer thread stores finished games in batches, one storage
+write per batch. Every submission gets a ticket whose progress is kept for the admin
+status endpoint.
+
+Duplicates are checked again against a fresh catalog right before each write, which also
+catches games another worker process stored in the meantime.
+"""
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from catalog import normalize_price, normalize_title
+from metrics import span
+
+STEAM_APP_URL = re.compile(r'store\.steampowered\.com/app/(\d+)', re.IGNORECASE)
+
+
+def steam_app_id_from_url(url):
+    """'https://store.steampowered.com/app/730/CounterStrike_2/' -> '730'; None for other URLs."""
+    match = STEAM_APP_URL.search(url or '')
+    return match.group(1) if match else None
+
+
+def dedupe_keys(game):
+    """Keys under which two games count as the same: Steam app id and normalized title."""
+    keys = set()
+    if game.get('steam_app_id'):
+        keys.add(('app', str(game['steam_app_id'])))
+    title = normalize_title(game.get('title'))
+    if title:
+        keys.add(('title', title))
+    return keys
+
+
+class EnrichmentPipeline:
+    """Queue -> dedupe -> enrich (worker pool) -> batched write.
+
+    `catalog_fn()` returns the current game list, `fetch_fn(app_id)` returns Steam's
+    price_overview as (payload, http_status) (normally the price SteamMediaCache's get, so
+    lookups are cached and shared with the price proxy), and `write_fn(games)` stores a batch
+    and returns their ids.
+    """
+
+    def __init__(self, catalog_fn, fetch_fn, write_fn, workers=4, batch_size=20, batch_seconds=1.0,
+                 max_queue=500, write_attempts=3, retry_seconds=0.5, history=200):
+        self.catalog_fn = catalog_fn
+        self.fetch_fn = fetch_fn
+        self.write_fn = write_fn
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+        self.write_attempts = write_attempts
+        self.retry_seconds = retry_seconds
+        self.history = history
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._ready = queue.Queue()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pid = None
+        self._threads = {}  # loop name -> thread
+        self._executor = None
+        self._tickets = OrderedDict()  # ticket -> status record, oldest first
+        self._pending_keys = {}        # dedupe key -> ticket, for games not stored yet
+        self._active = 0               # submissions not finished yet
+        self._catalog_keys = (None, {})
+        self._stats = {
+            'submitted': 0,
+            'rejected_queue_full': 0,
+            'duplicates': 0,
+            'enriched': 0,
+            'enrich_failures': 0,
+            'stored': 0,
+            'batches': 0,
+            'write_failures': 0,
+            'failed': 0,
+            'last_batch_size': None,
+            'last_batch_seconds': None,
+            'last_error': None,
+        }
+
+    @classmethod
+    def from_env(cls, catalog_fn, fetch_fn, write_fn):
+        # ENRICH_STEAM=0 skips Steam lookups (games are stored as submitted)
+        if os.environ.get('ENRICH_STEAM', '1').lower() in ('0', 'false', 'no'):
+            fetch_fn = None
+        return cls(
+            catalog_fn, fetch_fn, write_fn,
+            workers=int(os.environ.get('ENRICH_WORKERS', '4')),
+            batch_size=int(os.environ.get('ENRICH_BATCH_SIZE', '20')),
+            batch_seconds=float(os.environ.get('ENRICH_BATCH_SECONDS', '1')),
+            max_queue=int(os.environ.get('ENRICH_QUEUE_SIZE', '500')),
+        )
+
+    def submit(self, game):
+        """Queue a submitted game. Never blocks; returns its ticket, or None if the queue is full."""
+        self._ensure_workers()
+        ticket = uuid.uuid4().hex[:12]
+        record = {'ticket': ticket, 'title': game.get('title'), 'steam_app_id': game.get('steam_app_id'),
+                  'state': 'queued', 'submitted_at': datetime.utcnow().isoformat()}
+        with self._lock:
+            try:
+                self._queue.put_nowait((ticket, dict(game)))
+            except queue.Full:
+                self._stats['rejected_queue_full'] += 1
+                return None
+            self._stats['submitted'] += 1
+            self._active += 1
+            self._remember(record)
+        return ticket
+
+    def find_duplicate(self, game):
+        """The catalog game or queued submission `game` duplicates, or None. Lets callers turn
+        obvious duplicates away up front; the pipeline still checks every submission itself."""
+        return self._find_duplicate(game)
+
+    def status(self, ticket):
+        with self._lock:
+            record = self._tickets.get(ticket)
+            return dict(record) if record is not None else None
+
+    def stats(self, recent=50):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_progress'] = self._active
+            stats['recent'] = [dict(record) for record in list(self._tickets.values())[-recent:]][::-1]
+        stats['queue_depth'] = self._queue.qsize()
+        stats['queue_capacity'] = self._queue.maxsize
+        stats['awaiting_write'] = self._ready.qsize()
+        stats['steam_enrichment'] = self.fetch_fn is not None
+        stats['workers_alive'] = sum(1 for thread in self._threads.values() if thread.is_alive()) \
+            if self._pid == os.getpid() else 0
+        return stats
+
+    def drain(self, timeout=10.0):
+        """Wait until every queued submission is finished; False on timeout (called at exit)."""
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self._active:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    # --- Stages ---
+
+    def _ensure_workers(self):
+        # Start lazily so each gunicorn worker (post-fork) gets its own threads
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='enrich')
+                self._threads = {}
+            # Restart only a loop that died; its sibling keeps running
+            for name, loop in (('enrich-dispatch', self._dispatch_loop), ('enrich-write', self._write_loop)):
+                thread = self._threads.get(name)
+                if thread is None or not thread.is_alive():
+                    thread = self._threads[name] = threading.Thread(target=loop, name=name, daemon=True)
+                    thread.start()
+
+    def _dispatch_loop(self):
+        while True:
+            ticket, game = self._queue.get()
+            try:
+                duplicate = self._find_duplicate(game)
+                if duplicate is not None:
+                    self._finish(ticket, game, state='duplicate', duplicate_of=duplicate)
+                    continue
+                with self._lock:
+                    for key in dedupe_keys(game):
+                        self._pending_keys[key] = ticket
+                self._update(ticket, state='enriching')
+                self._executor.submit(self._enrich, ticket, game)
+            except Exception as e:
+                self._finish(ticket, game, state='failed', error=f'dedupe: {e}')
+
+    def _find_duplicate(self, game, include_pending=True):
+        """The catalog game (or in-flight ticket) this game duplicates, or None."""
+        keys = dedupe_keys(game)
+        catalog = self.catalog_fn()
+        if self._catalog_keys[0] is not catalog:
+            index = {}
+            for existing in catalog:
+                for key in dedupe_keys(existing):
+                    index.setdefault(key, {'id': existing.get('id'), 'title': existing.get('title')})
+            self._catalog_keys = (catalog, index)
+        index = self._catalog_keys[1]
+        for key in keys:
+            if key in index:
+                return dict(index[key], matched_on=key[0])
+        if include_pending:
+            with self._lock:
+                for key in keys:
+                    if key in self._pending_keys:
+                        return {'ticket': self._pending_keys[key], 'matched_on': key[0]}
+        return None
+
+    def _enrich(self, ticket, game):
+        game['price'] = normalize_price(game.get('price'))
+        try:
+            app_id = game.get('steam_app_id')
+            if app_id and self.fetch_fn is not None:
+                with span('enrich.steam'):
+                    payload, status = self.fetch_fn(str(app_id))
+                if status == 200 and payload.get('success'):
+                    overview = payload.get('price_overview') or {}
+                    price = overview.get('final_formatted') or overview.get('initial_formatted')
+                    if price:
+                        # The store's current price wins over the submitter's free text
+                        game['price'] = price
+                    game['enriched_at'] = datetime.utcnow().isoformat()
+                    self._count('enriched')
+                    self._update(ticket, state='ready', price=game.get('price'))
+                else:
+                    self._count('enrich_failures')
+                    self._update(ticket, state='ready', enrich_error=payload.get('error') or f'HTTP {status}')
+            else:
+                self._update(ticket, state='ready')
+        except Exception as e:
+            # Enrichment is best effort: the game is still stored as submitted
+            self._count('enrich_failures')
+            self._update(ticket, state='ready', enrich_error=str(e) or type(e).__name__)
+        self._ready.put((ticket, game))
+
+    def _write_loop(self):
+        while True:
+            batch = [self._ready.get()]
+            deadline = time.monotonic() + self.batch_seconds
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._ready.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        """Store a batch; every ticket in it is finished exactly once, whatever fails."""
+        # Last check against a fresh catalog: another process may have stored the same game
+        keep = []
+        for ticket, game in batch:
+            try:
+                duplicate = self._find_duplicate(game, include_pending=False)
+            except Exception as e:
+                self._finish(ticket, game, state='failed', error=f'dedupe: {e}')
+                continue
+            if duplicate is not None:
+                self._finish(ticket, game, state='duplicate', duplicate_of=duplicate)
+            else:
+                keep.append((ticket, game))
+        if not keep:
+            return
+        started = time.perf_counter()
+        for attempt in range(1, self.write_attempts + 1):
+            try:
+                with span('enrich.write_batch'):
+                    ids = self.write_fn([game for _ticket, game in keep])
+                break
+            except Exception as e:
+                with self._lock:
+                    self._stats['write_failures'] += 1
+                    self._stats['last_error'] = f'{type(e).__name__}: {e}'
+                if attempt == self.write_attempts:
+                    for ticket, game in keep:
+                        self._finish(ticket, game, state='failed', error=f'write: {e}')
+                    return
+                time.sleep(self.retry_seconds * 2 ** (attempt - 1))
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['last_batch_size'] = len(keep)
+            self._stats['last_batch_seconds'] = round(time.perf_counter() - started, 4)
+        for (ticket, game), game_id in zip(keep, ids):
+            self._finish(ticket, game, state='stored', game_id=game_id)
+
+    # --- Bookkeeping ---
+
+    def _remember(self, record):
+        # Caller holds self._lock
+        self._tickets[record['ticket']] = record
+        while len(self._tickets) > self.history:
+            oldest = next(iter(self._tickets))
+            if self._tickets[oldest]['state'] not in ('stored', 'duplicate', 'failed'):
+                break
+            self._tickets.popitem(last=False)
+
+    def _update(self, ticket, **fields):
+        with self._lock:
+            record = self._tickets.get(ticket)
+            if record is not None:
+                record.update(fields)
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _finish(self, ticket, game, state, **fields):
+        with self._idle:
+            for key in dedupe_keys(game):
+                if self._pending_keys.get(key) == ticket:
+                    del self._pending_keys[key]
+            record = self._tickets.get(ticket)
+            if record is not None:
+                record.update(fields, state=state, finished_at=datetime.utcnow().isoformat())
+            if state == 'duplicate':
+                self._stats['duplicates'] += 1
+            elif state == 'stored':
+                self._stats['stored'] += 1
+            elif state == 'failed':
+                self._stats['failed'] += 1
+                self._stats['last_error'] = fields.get('error')
+            self._active -= 1
+            self._idle.notify_all()
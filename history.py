@@ -0,0 +1,300 @@
+"""Historical results: tallies as of any moment, and per-game trends over the event.
+
+The columnar vote history (votestore.VoteColumns) keeps every submission with its
+timestamp. ResultsHistory orders its rows by time into an event log and replays it with
+the same rule as the live tally: a player's votes count if they belong to the highest
+submission that player has made so far.
+
+- Checkpoints: every `checkpoint_every` events the replay state is materialized.
+  results_as_of(t) starts from the last checkpoint before t and applies only the delta
+  log between the checkpoint and t.
+- Timeline: per-game counts at the end of fixed-width time buckets. Buckets are aligned
+  to their width, so closed buckets never change and new votes only extend the series.
+
+Rows appended to the history are applied incrementally, including a history reloaded
+from storage whose rows start with the ones already seen. Anything else (an import, rows
+older than the newest event) rebuilds the log.
+
+History only sees vote rows: a user whose latest ballot was empty still counts with their
+previous votes here, and total_voters is the number of users with a vote at that time.
+"""
+import bisect
+import threading
+from array import array
+from datetime import datetime, timedelta, timezone
+
+from tally import VOTE_TYPES, VoteSet, format_results, per_game_voters
+from votestore import VOTE_CODES, tally_key
+
+# Bucket widths (seconds) the timeline picks from: the smallest that fits `points` buckets
+TIMELINE_WIDTHS = (60, 300, 900, 1800, 3600, 3 * 3600, 6 * 3600, 12 * 3600, 86400, 7 * 86400, 30 * 86400)
+_EPOCH = datetime(1970, 1, 1)
+
+
+def parse_as_of(value):
+    """Normalize an as_of value to the naive UTC ISO format votes are stored in.
+    Accepts ISO datetimes (with or without offset), bare dates (meaning the end of that
+    day) and Unix timestamps. Raises ValueError, also for moments outside datetime's range."""
+    value = str(value).strip()
+    try:
+        if value.replace('.', '', 1).isdigit():
+            return _format_epoch(float(value))
+        if len(value) == 10:
+            value += 'T23:59:59.999999'
+        if value.endswith('Z'):
+            value = value[:-1] + '+00:00'
+        moment = datetime.fromisoformat(value)
+        if moment.tzinfo is not None:
+            moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    except OverflowError as e:
+        raise ValueError(f'as_of out of range: {value}') from e
+    return moment.isoformat()
+
+
+def _epoch_seconds(iso):
+    try:
+        moment = datetime.fromisoformat(iso)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return (moment - _EPOCH).total_seconds()
+
+
+def _format_epoch(seconds):
+    return (_EPOCH + timedelta(seconds=seconds)).isoformat()
+
+
+class _ReplayState:
+    """Tally after the first `position` events of the log."""
+    __slots__ = ('position', 'latest', 'ballots', 'started', 'counts')
+
+    def __init__(self):
+        self.position = 0
+        self.latest = {}   # player code -> highest submission seen
+        self.ballots = {}  # player code -> tally keys counted in that submission
+        self.started = {}  # player code -> position of that submission's first event
+        self.counts = {}   # tally key -> number of voters
+
+    def copy(self):
+        state = _ReplayState()
+        state.position = self.position
+        state.latest = dict(self.latest)
+        state.ballots = dict(self.ballots)  # values are tuples, safe to share
+        state.started = dict(self.started)
+        state.counts = dict(self.counts)
+        return state
+
+
+class _Series:
+    """Timeline buckets for one width: bucket start (epoch seconds) -> counts at its end."""
+    __slots__ = ('width', 'state', 'starts', 'counts')
+
+    def __init__(self, width):
+        self.width = width
+        self.state = _ReplayState()
+        self.starts = []
+        self.counts = []
+
+
+class ResultsHistory:
+    def __init__(self, checkpoint_every=2000, max_checkpoints=64):
+        self.checkpoint_every = checkpoint_every
+        self.max_checkpoints = max_checkpoints
+        self._lock = threading.Lock()
+        self._reset(None)
+
+    def _reset(self, columns):
+        self._columns = columns
+        self._rows = 0
+        # The event log: one entry per vote row, ordered by (voted_at, storage order)
+        self._times = []             # ISO timestamp ('' when unknown), for bisecting
+        self._players = array('i')
+        self._submissions = array('i')
+        self._keys = array('i')      # tally key, or -1 for rows that don't count
+        self._epochs = array('d')    # seconds, for timeline buckets (unknown: first known time)
+        self._epoch_cache = {}
+        self._interval = self.checkpoint_every
+        self._checkpoints = [_ReplayState()]  # checkpoint i is the state at position i * _interval
+        self._head = _ReplayState()
+        self._series = {}
+
+    # --- Keeping up with the vote history ---
+
+    def sync(self, columns, rows):
+        """Catch up with the first `rows` rows of `columns`."""
+        with self._lock:
+            if columns is not self._columns and not self._continues(columns, rows):
+                self._reset(columns)
+            self._columns = columns
+            if rows < self._rows:
+                self._reset(columns)
+            if rows > self._rows and not self._append(columns, self._rows, rows):
+                self._reset(columns)
+                self._append(columns, 0, rows)
+            self._rows = rows
+
+    def _continues(self, columns, rows):
+        # A history reloaded from storage is built in the same order, so rows we've already
+        # seen get the same interned codes; if they match, only the new rows need applying.
+        old, seen = self._columns, self._rows
+        if old is None or rows < seen:
+            return False
+        return (columns.player[:seen] == old.player[:seen] and columns.game[:seen] == old.game[:seen]
+                and columns.vote[:seen] == old.vote[:seen]
+                and columns.submission[:seen] == old.submission[:seen]
+                and columns.voted_at[:seen] == old.voted_at[:seen]
+                and columns.players.values[:len(old.players)] == old.players.values[:len(columns.players)]
+                and columns.games.values[:len(old.games)] == old.games.values[:len(columns.games)]
+                and columns.timestamps.values[:len(old.timestamps)]
+                == old.timestamps.values[:len(columns.timestamps)])
+
+    def _append(self, columns, start, end):
+        """Add rows start..end to the log; False if they would not go at its end."""
+        time_values = columns.timestamps.values
+        order = sorted(range(start, end), key=lambda i: time_values[columns.voted_at[i]] or '')
+        if self._times and order and (time_values[columns.voted_at[order[0]]] or '') < self._times[-1]:
+            return False
+        for i in order:
+            when = time_values[columns.voted_at[i]] or ''
+            code = columns.vote[i]
+            self._times.append(when)
+            self._players.append(columns.player[i])
+            self._submissions.append(columns.submission[i])
+            self._keys.append(tally_key(columns.game[i], code) if code else -1)
+            self._epochs.append(self._epoch(when))
+        self._advance_head()
+        return True
+
+    def _epoch(self, when):
+        if when not in self._epoch_cache:
+            self._epoch_cache[when] = _epoch_seconds(when)
+        seconds = self._epoch_cache[when]
+        previous = self._epochs[-1] if self._epochs else None
+        if seconds is None or (previous is not None and seconds < previous):
+            # Keep epochs sorted: unknown or odd timestamps are charted with their predecessor
+            return previous if previous is not None else -1.0
+        if previous == -1.0:
+            # Events with unknown times sort first; chart them at the first known time
+            for i in range(len(self._epochs)):
+                self._epochs[i] = seconds
+        return seconds
+
+    def _advance_head(self):
+        head, end = self._head, len(self._times)
+        while head.position < end:
+            boundary = len(self._checkpoints) * self._interval
+            self._replay(head, min(boundary, end))
+            if head.position == boundary:
+                self._checkpoints.append(head.copy())
+                if len(self._checkpoints) > self.max_checkpoints:
+                    # Keep every other checkpoint: positions stay multiples of the new interval
+                    self._checkpoints = self._checkpoints[::2]
+                    self._interval *= 2
+
+    def _replay(self, state, end):
+        """Apply events state.position..end to `state` (the delta log)."""
+        players, submissions, keys = self._players, self._submissions, self._keys
+        latest, ballots, started, counts = state.latest, state.ballots, state.started, state.counts
+        for i in range(state.position, end):
+            p = players[i]
+            submission = submissions[i]
+            current = latest.get(p, 0)
+            if submission > current:
+                for key in ballots.get(p, ()):
+                    counts[key] -= 1
+                latest[p] = current = submission
+                ballots[p] = ()
+                started[p] = i
+            key = keys[i]
+            if submission == current and key >= 0:
+                ballots[p] += (key,)
+                counts[key] = counts.get(key, 0) + 1
+        state.position = max(state.position, end)
+
+    def _state_at(self, end):
+        """Replay state after the first `end` events (a fresh copy unless it is the head)."""
+        if end == self._head.position:
+            return self._head
+        state = self._checkpoints[min(end // self._interval, len(self._checkpoints) - 1)].copy()
+        self._replay(state, end)
+        return state
+
+    # --- Queries ---
+
+    def vote_set_as_of(self, as_of, games):
+        """VoteSet of the ballots counted at `as_of` (a parse_as_of() string); games
+        submitted after `as_of` are left out. Voter keys are player codes."""
+        with self._lock:
+            state = self._state_at(bisect.bisect_right(self._times, as_of))
+            voters = {}
+            for p in sorted(state.ballots, key=state.started.__getitem__):
+                for key in state.ballots[p]:
+                    voters.setdefault(key, []).append(p)
+            total_voters = len(state.latest)
+            columns = self._columns
+        games = [game for game in games if (game.get('submitted_at') or '') <= as_of]
+        return VoteSet(games, per_game_voters(games, columns, voters), total_voters)
+
+    def results_as_of(self, as_of, games, labels):
+        """The /api/results payload as it was at `as_of`; voters are shown as labels[code]."""
+        vote_set = self.vote_set_as_of(as_of, games)
+        per_game = {game_id: {vote_type: [labels[p] for p in players] for vote_type, players in votes.items()}
+                    for game_id, votes in vote_set.voters.items()}
+        return format_results(vote_set.games, per_game, vote_set.total_voters)
+
+    def timeline(self, games, points=60):
+        """Per-game counts over time in at most `points` buckets.
+        Returns {'bucket_seconds', 'times' (bucket starts), 'games': [{id, title, interested,
+        maybe, not_interested}]}, where each series holds the counts at the end of each bucket."""
+        with self._lock:
+            if not self._times:
+                return {'bucket_seconds': None, 'times': [], 'games': []}
+            first, last = self._epochs[0], self._epochs[-1]
+            width = next((w for w in TIMELINE_WIDTHS if last // w - first // w < points), None)
+            if width is None:
+                largest = TIMELINE_WIDTHS[-1]
+                width = largest * int((last // largest - first // largest) // points + 1)
+            series = self._series.get(width)
+            if series is None:
+                # Only the widths asked for recently are kept up to date
+                if len(self._series) >= 4:
+                    self._series.clear()
+                series = self._series[width] = _Series(width)
+            self._extend_series(series)
+            starts, snapshots = list(series.starts), list(series.counts)
+            columns = self._columns
+        times, filled = [], []
+        bucket, index = starts[0], 0
+        while bucket <= starts[-1]:
+            if index + 1 < len(starts) and starts[index + 1] <= bucket:
+                index += 1
+            times.append(_format_epoch(bucket))
+            filled.append(snapshots[index])
+            bucket += width
+        result = []
+        for game in games:
+            code = columns.games.get(str(game['id']))
+            if code is None:
+                continue
+            entry = {'id': str(game['id']), 'title': game['title']}
+            for vote_type in VOTE_TYPES:
+                key = tally_key(code, VOTE_CODES[vote_type])
+                entry[vote_type] = [counts.get(key, 0) for counts in filled]
+            result.append(entry)
+        return {'bucket_seconds': width, 'times': times, 'games': result}
+
+    def _extend_series(self, series):
+        state, width, epochs = series.state, series.width, self._epochs
+        end = len(self._times)
+        i = state.position
+        while i < end:
+            bucket = epochs[i] // width * width
+            j = bisect.bisect_left(epochs, bucket + width, i, end)
+            self._replay(state, j)
+            if series.starts and series.starts[-1] == bucket:
+                series.counts[-1] = dict(state.counts)
+            else:
+                series.starts.append(bucket)
+                series.counts.append(dict(state.counts))
+            i = j
@@ -0,0 +1,92 @@
+"""Conditional GET (ETag / 304) and gzip response compression helpers.
+
+ETags are weak (W/"...") and derived from data versions, so a page can be answered with
+a 304 before anything is rendered, and the same version may be sent gzipped or not.
+"""
+import gzip
+import hashlib
+import os
+import threading
+
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/csv',
+    'application/json', 'application/javascript', 'text/javascript',
+}
+MIN_COMPRESS_SIZE = 500
+GZIP_LEVEL = 6
+
+
+def build_tag(*dirs):
+    """Short hash of every file under `dirs`, so ETags change when templates/assets are redeployed
+    even if the data version did not. Identical across workers of the same deploy."""
+    digest = hashlib.sha1()
+    for root_dir in dirs:
+        for root, subdirs, files in os.walk(root_dir):
+            subdirs.sort()
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                digest.update(path.encode('utf-8'))
+                with open(path, 'rb') as f:
+                    digest.update(f.read())
+    return digest.hexdigest()[:10]
+
+
+def accepts_gzip(request):
+    return 'gzip' in request.accept_encodings
+
+
+def add_vary(response, header):
+    vary = response.vary
+    if header not in vary:
+        vary.add(header)
+
+
+def compress_response(request, response, min_size=MIN_COMPRESS_SIZE, level=GZIP_LEVEL):
+    """gzip a buffered response in place when the client accepts it and it is worth it.
+    Streamed, passthrough (static files), already-encoded and non-text responses are left alone."""
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    add_vary(response, 'Accept-Encoding')
+    if (response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or not accepts_gzip(request)):
+        return response
+    body = response.get_data()
+    if len(body) < min_size:
+        return response
+    response.set_data(gzip.compress(body, level))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+class VersionedBody:
+    """One rendered body cached per version, kept both raw and gzipped.
+
+    `get(version, render)` re-renders only when `version` differs from the cached one, so
+    repeat requests cost a dict lookup instead of a template render plus compression.
+    """
+
+    def __init__(self, level=GZIP_LEVEL):
+        self.level = level
+        self._lock = threading.Lock()
+        self._version = None
+        self._raw = None
+        self._gzipped = None
+        self.renders = 0
+
+    def get(self, version, render):
+        """Return (raw bytes, gzipped bytes) for `version`."""
+        with self._lock:
+            if self._raw is not None and self._version == version:
+                return self._raw, self._gzipped
+        body = render()
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        gzipped = gzip.compress(body, self.level)
+        with self._lock:
+            self._version = version
+            self._raw = body
+            self._gzipped = gzipped
+            self.renders += 1
+        return body, gzipped
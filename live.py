@@ -0,0 +1,164 @@
+import json
+import threading
+import time
+from collections import deque
+
+
+def sse_event(event, data, event_id=None):
+    """Format one Server-Sent Events message."""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def results_diff(old, new):
+    """Compact diff between two /api/results payloads: changed/removed games and any
+    top lists or totals that changed."""
+    old_games = {g['id']: g for g in old.get('games', [])}
+    new_ids = set()
+    changed = []
+    for game in new.get('games', []):
+        new_ids.add(game['id'])
+        if old_games.get(game['id']) != game:
+            changed.append(game)
+    diff = {
+        'games': changed,
+        'removed': [game_id for game_id in old_games if game_id not in new_ids],
+    }
+    for key in ('top_interested', 'top_maybe', 'top_engagement', 'total_voters'):
+        if old.get(key) != new.get(key):
+            diff[key] = new.get(key)
+    return diff
+
+
+class ResultsBroadcaster:
+    """Fans out results changes to Server-Sent Events subscribers.
+
+    Versions are storage generations, so a client can resume on any worker: it is sent the
+    chain of diffs since its version if this worker still has them, otherwise a snapshot.
+    Each change is diffed and serialized once, no matter how many clients are listening.
+    While anyone is subscribed, one pump thread calls `poll_fn` so changes made by other
+    worker processes are picked up without waiting for a request to this one.
+
+    Every open stream pins a server thread, so at most `max_subscribers` (0: unlimited) are
+    served at once: callers reserve() a slot before streaming and release() it afterwards.
+    """
+
+    def __init__(self, poll_fn=None, poll_interval=1.0, history_size=256, max_subscribers=0):
+        self.poll_fn = poll_fn
+        self.poll_interval = poll_interval
+        self.max_subscribers = max_subscribers
+        self._cond = threading.Condition()
+        self._version = None
+        self._results = None
+        self._snapshot_event = None
+        self._history = deque(maxlen=history_size)  # (base version, version, serialized diff event)
+        self._subscribers = 0
+        self._rejected = 0
+        self._pump = None
+
+    def publish(self, version, results_fn):
+        """Record the results at `version`. `results_fn` is only called when someone is listening."""
+        with self._cond:
+            if version == self._version:
+                return
+            if not self._subscribers:
+                # Nobody to diff for; reconnecting clients will get a snapshot
+                self._version = version
+                self._results = None
+                self._snapshot_event = None
+                self._history.clear()
+                return
+            results = results_fn()
+            if self._results is not None:
+                diff = results_diff(self._results, results)
+                diff['version'] = version
+                diff['base'] = self._version
+                self._history.append((self._version, version, sse_event('diff', diff, event_id=version)))
+            self._version = version
+            self._results = results
+            self._snapshot_event = None
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {'subscribers': self._subscribers, 'max_subscribers': self.max_subscribers,
+                    'rejected': self._rejected, 'version': self._version, 'history': len(self._history)}
+
+    def reserve(self):
+        """Claim a subscriber slot; False when `max_subscribers` streams are already open."""
+        with self._cond:
+            if self.max_subscribers and self._subscribers >= self.max_subscribers:
+                self._rejected += 1
+                return False
+            self._subscribers += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self._subscribers -= 1
+
+    def stream(self, last_version=None, results_fn=None, heartbeat=15.0, max_duration=300.0):
+        """Generator of SSE text for one subscriber holding a reserve()d slot. Ends after
+        `max_duration` so the browser reconnects (with Last-Event-ID) instead of pinning a
+        server thread forever."""
+        with self._cond:
+            if self._results is None and results_fn is not None:
+                self._results = results_fn()
+        self._ensure_pump()
+        yield 'retry: 3000\n\n'
+        version = last_version
+        deadline = time.monotonic() + max_duration
+        while True:
+            with self._cond:
+                if version == self._version:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return
+                    self._cond.wait(timeout=min(heartbeat, remaining))
+                events, version = self._events_since(version)
+            if events:
+                yield ''.join(events)
+            elif time.monotonic() < deadline:
+                yield ': heartbeat\n\n'
+
+    def _events_since(self, version):
+        # Caller holds self._cond. Returns (events to send, version the client will be at).
+        if version == self._version or self._results is None:
+            return [], version
+        chain = []
+        at = version
+        for base, new_version, event in self._history:
+            if base == at:
+                chain.append(event)
+                at = new_version
+        if at == self._version and chain:
+            return chain, at
+        if self._snapshot_event is None:
+            self._snapshot_event = sse_event('snapshot', dict(self._results, version=self._version),
+                                             event_id=self._version)
+        return [self._snapshot_event], self._version
+
+    def _ensure_pump(self):
+        if self.poll_fn is None:
+            return
+        with self._cond:
+            if self._pump is not None and self._pump.is_alive():
+                return
+            self._pump = threading.Thread(target=self._run_pump, name='results-pump', daemon=True)
+            self._pump.start()
+
+    def _run_pump(self):
+        while True:
+            time.sleep(self.poll_interval)
+            with self._cond:
+                if not self._subscribers:
+                    self._pump = None
+                    return
+            try:
+                self.poll_fn()
+            except Exception as e:
+                print(f"Live results poll failed: {e}", flush=True)
@@ -0,0 +1,264 @@
+"""In-process metrics: timing spans and Prometheus text exposition.
+
+Histograms and counters live in a module-level registry. `span(name)` times a block into
+the `lan_vote_span_seconds{span=...}` histogram and, while a request is being tracked, also
+into that request's span list (used for the slow-request log).
+
+Each gunicorn worker has its own registry. When METRICS_DIR is set, every worker
+periodically writes a snapshot there and /metrics merges all of them, so a scrape that
+lands on any worker sees the whole server.
+"""
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def state(self):
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+    @staticmethod
+    def merge(states):
+        merged = {}
+        for state in states:
+            for labels, value in state:
+                key = tuple(labels)
+                merged[key] = merged.get(key, 0) + value
+        return merged
+
+    def render(self, merged):
+        lines = []
+        for labels, value in sorted(merged.items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [count per bucket..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        with self._lock:
+            counts = self._values.get(labelvalues)
+            if counts is None:
+                counts = self._values[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[len(self.buckets)] += 1
+            counts[-1] += value
+
+    def state(self):
+        with self._lock:
+            return [[list(labels), list(counts)] for labels, counts in self._values.items()]
+
+    @staticmethod
+    def merge(states):
+        merged = {}
+        for state in states:
+            for labels, counts in state:
+                key = tuple(labels)
+                if key in merged:
+                    merged[key] = [a + b for a, b in zip(merged[key], counts)]
+                else:
+                    merged[key] = list(counts)
+        return merged
+
+    def render(self, merged):
+        lines = []
+        for labels, counts in sorted(merged.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _format_value(float(bound))
+                bucket_labels = _format_labels(self.labelnames, labels, ['le="%s"' % le])
+                lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(counts[-1])}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._flusher = None
+        self._flusher_pid = None
+        self._lock = threading.Lock()
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def snapshot(self):
+        return {metric.name: metric.state() for metric in self._metrics}
+
+    def render(self, snapshots=None):
+        """Prometheus text format for this process, or for a list of snapshots merged together."""
+        if snapshots is None:
+            snapshots = [self.snapshot()]
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render(metric.merge(s.get(metric.name, []) for s in snapshots)))
+        return '\n'.join(lines) + '\n'
+
+    # --- Cross-process aggregation (METRICS_DIR) ---
+
+    def write_snapshot(self, directory):
+        path = os.path.join(directory, f'worker-{os.getpid()}.json')
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, path)
+
+    def render_directory(self, directory):
+        """Write this worker's snapshot, then merge every worker's snapshot in `directory`.
+        Snapshots of exited workers are kept so counters never go backwards."""
+        self.write_snapshot(directory)
+        snapshots = []
+        for path in glob.glob(os.path.join(directory, 'worker-*.json')):
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return self.render(snapshots)
+
+    def start_flusher(self, directory, interval=5.0):
+        """Write this worker's snapshot to `directory` every `interval` seconds (one thread per pid)."""
+        with self._lock:
+            if self._flusher is not None and self._flusher.is_alive() and self._flusher_pid == os.getpid():
+                return
+            os.makedirs(directory, exist_ok=True)
+            self._flusher_pid = os.getpid()
+            self._flusher = threading.Thread(target=self._flush_loop, args=(directory, interval),
+                                             name='metrics-flush', daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self, directory, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.write_snapshot(directory)
+            except OSError as e:
+                print(f"Metrics snapshot failed: {e}", flush=True)
+
+
+REGISTRY = Registry()
+REQUEST_SECONDS = REGISTRY.histogram(
+    'lan_vote_request_seconds', 'Time spent handling HTTP requests, by route.', ('method', 'route', 'status'))
+SPAN_SECONDS = REGISTRY.histogram(
+    'lan_vote_span_seconds', 'Time spent in instrumented operations (storage, tally, templates, SMTP, HTTP).',
+    ('span',))
+SPAN_ERRORS = REGISTRY.counter(
+    'lan_vote_span_errors_total', 'Instrumented operations that raised.', ('span',))
+
+_local = threading.local()
+
+
+@contextmanager
+def span(name):
+    """Time the enclosed block as span `name`."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        SPAN_ERRORS.inc(name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        SPAN_SECONDS.observe(elapsed, name)
+        spans = getattr(_local, 'spans', None)
+        if spans is not None:
+            spans.append((name, elapsed))
+
+
+def timed(name):
+    """Decorator form of span()."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument(obj, prefix, methods):
+    """Replace `obj`'s bound `methods` with timed versions named `prefix.method`."""
+    for method in methods:
+        setattr(obj, method, timed(f'{prefix}.{method}')(getattr(obj, method)))
+    return obj
+
+
+def begin_request():
+    """Start collecting spans for the current thread's request."""
+    _local.spans = []
+
+
+def end_request():
+    """Stop collecting and return the request's [(span, seconds), ...]."""
+    spans = getattr(_local, 'spans', None) or []
+    _local.spans = None
+    return spans
+
+
+def summarize_spans(spans):
+    """Total time per span name, largest first, e.g. 'storage.record_ballot=12.3ms x1'."""
+    totals = {}
+    for name, elapsed in spans:
+        total, count = totals.get(name, (0.0, 0))
+        totals[name] = (total + elapsed, count + 1)
+    ordered = sorted(totals.items(), key=lambda item: item[1][0], reverse=True)
+    return ', '.join(f'{name}={total * 1000:.1f}ms x{count}' for name, (total, count) in ordered)
@@ -0,0 +1,278 @@
+import json
+import os
+import queue
+import smtplib
+import ssl
+import threading
+import time
+from datetime import datetime
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+
+from metrics import span
+
+
+class SMTPConfig:
+    """SMTP settings, normally read from the SMTP_* environment variables."""
+
+    def __init__(self, server=None, port=587, username=None, password=None, sender='', recipient=None,
+                 starttls=True, timeout=30):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.sender = sender
+        self.recipient = recipient
+        self.starttls = starttls
+        self.timeout = timeout
+
+    @classmethod
+    def from_env(cls):
+        username = os.environ.get('SMTP_USERNAME')
+        return cls(
+            server=os.environ.get('SMTP_SERVER'),
+            port=int(os.environ.get('SMTP_PORT', '587')),
+            username=username,
+            password=os.environ.get('SMTP_PASSWORD'),
+            sender=os.environ.get('SMTP_FROM', username or ''),
+            recipient=os.environ.get('SMTP_TO'),
+            # Set SMTP_STARTTLS=0 for a plain local server (e.g. a test stand-in)
+            starttls=os.environ.get('SMTP_STARTTLS', '1').lower() not in ('0', 'false', 'no'),
+            timeout=float(os.environ.get('SMTP_TIMEOUT', '30')),
+        )
+
+    @property
+    def configured(self):
+        return bool(self.server and self.recipient)
+
+
+def build_vote_email(user_names, results_summary, sender, recipient):
+    """Build the notification email for one or more voters with the current results summary."""
+    now = datetime.utcnow().isoformat()
+    if len(user_names) == 1:
+        subject = f"LAN Game Vote: {user_names[0]} submitted a vote ({now} UTC)"
+        intro = f"<p><strong>{user_names[0]}</strong> just submitted votes.</p>"
+    else:
+        subject = f"LAN Game Vote: {len(user_names)} new votes ({now} UTC)"
+        intro = f"<p><strong>{', '.join(user_names)}</strong> just submitted votes.</p>"
+
+    # Build a simple HTML summary
+    top_int = results_summary.get('top_interested', [])
+    lines_int = ''.join([f"<li>{item['title']}: {item['count']}</li>" for item in top_int])
+    total_voters = results_summary.get('total_voters', 0)
+
+    html = f"""
+    <html>
+      <body>
+        {intro}
+        <p>Total voters: <strong>{total_voters}</strong></p>
+        <h3>Top Interested</h3>
+        <ol>
+          {lines_int}
+        </ol>
+        <p>Full JSON summary attached below:</p>
+        <pre style=\"white-space: pre-wrap; font-family: monospace;\">{json.dumps(results_summary, indent=2)}</pre>
+      </body>
+    </html>
+    """
+
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = sender
+    msg['To'] = recipient
+    part_html = MIMEText(html, 'html')
+    msg.attach(part_html)
+    return msg
+
+
+class VoteNotifier:
+    """Background delivery of vote notification emails.
+
+    Votes are queued (bounded; overflow is dropped and counted) and a single worker
+    thread coalesces everything that arrives within `coalesce_seconds` into one digest
+    email with the latest results summary. The SMTP connection is kept open and reused
+    across digests, and re-established if the server drops it.
+    """
+
+    def __init__(self, config, summary_fn, coalesce_seconds=10.0, max_queue=100, idle_timeout=300.0):
+        self.config = config
+        self.summary_fn = summary_fn
+        self.coalesce_seconds = coalesce_seconds
+        self.idle_timeout = idle_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._smtp = None
+        self._stopping = False
+        self._stats = {
+            'enqueued': 0,
+            'dropped': 0,
+            'emails_sent': 0,
+            'send_failures': 0,
+            'connections_opened': 0,
+            'last_send_seconds': None,
+            'total_send_seconds': 0.0,
+            'last_error': None,
+        }
+
+    @classmethod
+    def from_env(cls, summary_fn):
+        return cls(
+            SMTPConfig.from_env(),
+            summary_fn,
+            coalesce_seconds=float(os.environ.get('SMTP_COALESCE_SECONDS', '10')),
+            max_queue=int(os.environ.get('SMTP_QUEUE_SIZE', '100')),
+            idle_timeout=float(os.environ.get('SMTP_IDLE_TIMEOUT', '300')),
+        )
+
+    def notify(self, user_name):
+        """Queue a notification for `user_name`. Never blocks; returns False if skipped or dropped."""
+        if not self.config.configured:
+            print('SMTP not configured; skipping vote email.', flush=True)
+            return False
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(user_name)
+        except queue.Full:
+            with self._lock:
+                self._stats['dropped'] += 1
+            return False
+        with self._lock:
+            self._stats['enqueued'] += 1
+        return True
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        sent = stats['emails_sent']
+        stats['avg_send_seconds'] = (stats.pop('total_send_seconds') / sent) if sent else None
+        stats['queue_depth'] = self._queue.qsize()
+        stats['queue_capacity'] = self._queue.maxsize
+        stats['worker_alive'] = bool(self._thread and self._thread.is_alive())
+        stats['connected'] = self._smtp is not None
+        return stats
+
+    def close(self, timeout=5.0):
+        """Flush anything pending and close the SMTP connection (called at exit)."""
+        self._stopping = True
+        if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                return
+            self._thread.join(timeout)
+
+    def _ensure_worker(self):
+        # Start lazily so each gunicorn worker (post-fork) gets its own thread
+        with self._lock:
+            if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._smtp = None
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='vote-notifier', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                self._disconnect()
+                continue
+            names = [] if first is None else [first]
+            stop = first is None
+            deadline = time.monotonic() + self.coalesce_seconds
+            while not stop:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stopping:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                else:
+                    names.append(item)
+            # Drain whatever else is already waiting into this digest
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                else:
+                    names.append(item)
+            if names:
+                self._deliver(list(dict.fromkeys(names)))
+            if stop:
+                self._disconnect()
+                return
+
+    def _deliver(self, names):
+        started = time.perf_counter()
+        try:
+            msg = build_vote_email(names, self.summary_fn(), self.config.sender, self.config.recipient)
+            try:
+                self._send(msg)
+            except smtplib.SMTPServerDisconnected:
+                # Stale persistent connection; reconnect once and retry
+                self._disconnect()
+                self._send(msg)
+            except smtplib.SMTPException:
+                # The server answered (auth failed, sender or recipient refused, ...): a retry
+                # would get the same answer. SMTPException is an OSError, so this comes first.
+                raise
+            except OSError:
+                # Connection reset or timed out; reconnect once and retry
+                self._disconnect()
+                self._send(msg)
+        except Exception as e:
+            self._disconnect()
+            with self._lock:
+                self._stats['send_failures'] += 1
+                self._stats['last_error'] = str(e)
+            print(f"Email notification failed: {e}", flush=True)
+            return
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._stats['emails_sent'] += 1
+            self._stats['last_send_seconds'] = elapsed
+            self._stats['total_send_seconds'] += elapsed
+
+    def _send(self, msg):
+        server = self._connect()
+        with span('smtp.send'):
+            server.sendmail(self.config.sender, [self.config.recipient], msg.as_string())
+
+    def _connect(self):
+        if self._smtp is not None:
+            return self._smtp
+        cfg = self.config
+        with span('smtp.connect'):
+            server = smtplib.SMTP(cfg.server, cfg.port, timeout=cfg.timeout)
+            try:
+                if cfg.starttls:
+                    server.starttls(context=ssl.create_default_context())
+                if cfg.username and cfg.password:
+                    server.login(cfg.username, cfg.password)
+            except Exception:
+                server.close()
+                raise
+        self._smtp = server
+        with self._lock:
+            self._stats['connections_opened'] += 1
+        return server
+
+    def _disconnect(self):
+        server, self._smtp = self._smtp, None
+        if server is None:
+            return
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
@@ -0,0 +1,133 @@
+"""Opt-in cProfile capture of individual requests.
+
+Profiling is armed for N requests, either at startup (PROFILE_REQUESTS=N) or at runtime via
+`arm()`, which writes PROFILE_DIR/armed.json so every gunicorn worker picks it up within
+`check_interval` seconds. Each worker then profiles up to N of its own requests (one in
+`every`, optionally only for paths starting with `path_prefix`) and writes one pstats file
+per request to PROFILE_DIR, named after the time, pid, endpoint and duration. Inspect them
+with `python -m pstats <file>` or snakeviz.
+"""
+import cProfile
+import json
+import os
+import re
+import threading
+import time
+
+ARM_FILE = 'armed.json'
+
+
+class RequestProfiler:
+    def __init__(self, directory, requests=0, every=1, path_prefix='', check_interval=1.0):
+        self.directory = directory
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        # Only one request at a time: cProfile cannot run two profilers at once on newer Pythons
+        self._busy = threading.Lock()
+        self._remaining = requests
+        self._every = max(1, every)
+        self._path_prefix = path_prefix
+        self._seen = 0
+        self._arm_mtime = self._arm_file_mtime()  # an arm file left from before startup is ignored
+        self._next_check = 0.0
+        self._written = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            os.environ.get('PROFILE_DIR', 'profiles'),
+            requests=int(os.environ.get('PROFILE_REQUESTS', '0')),
+            every=int(os.environ.get('PROFILE_EVERY', '1')),
+            path_prefix=os.environ.get('PROFILE_PATH_PREFIX', ''),
+        )
+
+    def arm(self, requests, every=1, path_prefix=''):
+        """Profile the next `requests` requests in every worker sharing PROFILE_DIR."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, ARM_FILE)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'requests': requests, 'every': every, 'path_prefix': path_prefix, 'armed_at': time.time()}, f)
+        os.replace(tmp, path)
+        with self._lock:
+            self._next_check = 0.0
+
+    def start(self, path):
+        """Return a running profiler if this request should be profiled, else None."""
+        self._check_armed()
+        with self._lock:
+            if self._remaining <= 0 or not path.startswith(self._path_prefix):
+                return None
+            self._seen += 1
+            if self._seen % self._every:
+                return None
+        if not self._busy.acquire(blocking=False):
+            return None
+        with self._lock:
+            if self._remaining <= 0:
+                self._busy.release()
+                return None
+            self._remaining -= 1
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (e.g. a debugger) is active
+            self._busy.release()
+            return None
+        return profiler
+
+    def finish(self, profiler, endpoint, elapsed):
+        """Stop `profiler` and write its stats; returns the file path."""
+        try:
+            profiler.disable()
+            os.makedirs(self.directory, exist_ok=True)
+            name = re.sub(r'[^A-Za-z0-9_.-]+', '_', endpoint or 'unmatched')
+            stamp = time.strftime('%Y%m%d-%H%M%S')
+            path = os.path.join(self.directory, f'{stamp}-{os.getpid()}-{name}-{elapsed * 1000:.0f}ms.prof')
+            profiler.dump_stats(path)
+            with self._lock:
+                self._written += 1
+            return path
+        finally:
+            self._busy.release()
+
+    def status(self):
+        self._check_armed()
+        with self._lock:
+            status = {'directory': self.directory, 'remaining': self._remaining, 'every': self._every,
+                      'path_prefix': self._path_prefix, 'written_by_this_worker': self._written}
+        try:
+            status['files'] = sorted(f for f in os.listdir(self.directory) if f.endswith('.prof'))[-50:]
+        except OSError:
+            status['files'] = []
+        return status
+
+    def _arm_file_mtime(self):
+        try:
+            return os.stat(os.path.join(self.directory, ARM_FILE)).st_mtime
+        except OSError:
+            return None
+
+    def _check_armed(self):
+        # Picks up arm() calls made by any worker; at most one stat() per check_interval
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + self.check_interval
+        try:
+            path = os.path.join(self.directory, ARM_FILE)
+            mtime = os.stat(path).st_mtime
+            if mtime == self._arm_mtime:
+                return
+            with open(path) as f:
+                armed = json.load(f)
+        except (OSError, ValueError):
+            return
+        with self._lock:
+            self._arm_mtime = mtime
+            self._remaining = int(armed.get('requests', 0))
+            self._every = max(1, int(armed.get('every', 1)))
+            self._path_prefix = armed.get('path_prefix', '')
+            self._seen = 0
@@ -0,0 +1,226 @@
+"""Alternative rankings over the latest-submission vote set.
+
+A scoring engine turns a tally.VoteSet (who voted what on each game, current submissions only)
+into a ranked list of games. Engines are registered by name with @register_engine and
+selected with /api/results?engine=<name>; each declares its query parameters with
+defaults. EngineCache keeps one result per (engine, params) for the current data version.
+"""
+import math
+from collections import OrderedDict
+
+from catalog import parse_max_players
+from tally import VOTE_TYPES, VersionedCache
+
+
+def _int_param(minimum=None):
+    def parse(value):
+        try:
+            number = int(value)
+        except ValueError:
+            raise ValueError('must be an integer')
+        if minimum is not None and number < minimum:
+            raise ValueError(f'must be at least {minimum}')
+        return number
+    return parse
+
+
+def _float_param(minimum=None, maximum=None):
+    def parse(value):
+        try:
+            number = float(value)
+        except ValueError:
+            raise ValueError('must be a number')
+        if not math.isfinite(number) or (minimum is not None and number < minimum) \
+                or (maximum is not None and number > maximum):
+            raise ValueError('out of range')
+        return number
+    return parse
+
+
+def _bool_param(value):
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+class ScoringEngine:
+    """Base class. Subclasses set `name`, `description` and `params`
+    ({name: (parser, default)}; a default of None means "derived from the data") and
+    implement score(vote_set, **params) -> [entry, ...] where each entry has at least
+    'id', 'title' and 'score'."""
+    name = None
+    description = ''
+    params = {}
+
+    def parse_params(self, args):
+        """Pick this engine's parameters out of a mapping (e.g. request.args).
+        Raises ValueError naming the bad parameter."""
+        parsed = {}
+        for key, (parser, default) in self.params.items():
+            raw = args.get(key)
+            if raw is None or raw == '':
+                parsed[key] = default
+                continue
+            try:
+                parsed[key] = parser(raw)
+            except (TypeError, ValueError) as e:
+                raise ValueError(f'{key}: {e}')
+        return parsed
+
+    def score(self, vote_set, **params):
+        raise NotImplementedError
+
+    def rank(self, vote_set, **params):
+        """score(), sorted by score, then interested count, then title."""
+        entries = self.score(vote_set, **params)
+        entries.sort(key=lambda e: (-e['score'], -e.get('interested_count', 0), e['title']))
+        for position, entry in enumerate(entries, start=1):
+            entry['rank'] = position
+        return entries
+
+    @staticmethod
+    def entry(game, counts, score, **extra):
+        entry = {
+            'id': str(game['id']),
+            'title': game['title'],
+            'score': score,
+            'interested_count': counts['interested'],
+            'maybe_count': counts['maybe'],
+            'not_interested_count': counts['not_interested'],
+        }
+        entry.update(extra)
+        return entry
+
+
+ENGINES = OrderedDict()
+
+
+def register_engine(cls):
+    """Class decorator adding an engine to ENGINES under its `name`."""
+    ENGINES[cls.name] = cls()
+    return cls
+
+
+def describe_engines():
+    return [{'name': engine.name, 'description': engine.description,
+             'params': {key: default for key, (_parser, default) in engine.params.items()}}
+            for engine in ENGINES.values()]
+
+
+@register_engine
+class WeightedEngine(ScoringEngine):
+    name = 'weighted'
+    description = 'Sum of per-vote weights (interested=2, maybe=1, not interested=-1 by default).'
+    params = {
+        'w_interested': (_float_param(), 2.0),
+        'w_maybe': (_float_param(), 1.0),
+        'w_not_interested': (_float_param(), -1.0),
+    }
+
+    def score(self, vote_set, w_interested, w_maybe, w_not_interested):
+        entries = []
+        for game in vote_set.games:
+            counts = vote_set.counts(game['id'])
+            score = (counts['interested'] * w_interested + counts['maybe'] * w_maybe
+                     + counts['not_interested'] * w_not_interested)
+            entries.append(self.entry(game, counts, score))
+        return entries
+
+
+@register_engine
+class BordaEngine(ScoringEngine):
+    name = 'borda'
+    description = ('Borda count: each voter ranks interested > maybe > not interested > unrated; a game '
+                   'earns a point per game its voter ranked strictly lower and half a point per game tied '
+                   'with it. Unrated games earn nothing from that voter.')
+    params = {}
+
+    def score(self, vote_set):
+        catalog = len(vote_set.games)
+        game_ids = {str(game['id']) for game in vote_set.games}
+        # Per voter: how many catalog games they put in each category
+        per_voter = {}
+        for game_id, votes in vote_set.voters.items():
+            if game_id not in game_ids:
+                continue
+            for vote_type in VOTE_TYPES:
+                for voter in votes.get(vote_type, ()):
+                    per_voter.setdefault(voter, dict.fromkeys(VOTE_TYPES, 0))[vote_type] += 1
+        entries = []
+        for game in vote_set.games:
+            votes = vote_set.voters.get(str(game['id']), {})
+            points = 0.0
+            for voter in votes.get('interested', ()):
+                c = per_voter[voter]
+                points += catalog - c['interested'] + (c['interested'] - 1) / 2.0
+            for voter in votes.get('maybe', ()):
+                c = per_voter[voter]
+                points += catalog - c['interested'] - c['maybe'] + (c['maybe'] - 1) / 2.0
+            for voter in votes.get('not_interested', ()):
+                c = per_voter[voter]
+                points += catalog - c['interested'] - c['maybe'] - c['not_interested'] \
+                    + (c['not_interested'] - 1) / 2.0
+            entries.append(self.entry(game, vote_set.counts(game['id']), points))
+        return entries
+
+
+@register_engine
+class ApprovalEngine(ScoringEngine):
+    name = 'approval'
+    description = ('Approval voting: a game is approved by voters who marked it interested (and maybe, '
+                   'unless include_maybe=0). Games approved by fewer than `quorum` of all voters rank '
+                   'below every game that reached it.')
+    params = {
+        'quorum': (_float_param(0.0, 1.0), 0.5),
+        'include_maybe': (_bool_param, True),
+    }
+
+    def score(self, vote_set, quorum, include_maybe):
+        needed = math.ceil(quorum * vote_set.total_voters)
+        entries = []
+        for game in vote_set.games:
+            counts = vote_set.counts(game['id'])
+            approvals = counts['interested'] + (counts['maybe'] if include_maybe else 0)
+            share = approvals / vote_set.total_voters if vote_set.total_voters else 0.0
+            qualifies = approvals > 0 and approvals >= needed
+            entries.append(self.entry(game, counts, approvals, approvals=approvals, share=round(share, 4),
+                                      qualifies=qualifies))
+        return entries
+
+    def rank(self, vote_set, **params):
+        entries = super().rank(vote_set, **params)
+        entries.sort(key=lambda e: not e['qualifies'])  # stable: keeps score order within each group
+        for position, entry in enumerate(entries, start=1):
+            entry['rank'] = position
+        return entries
+
+
+@register_engine
+class HeadcountEngine(ScoringEngine):
+    name = 'headcount'
+    description = ('Games whose max_players fits the group (default: everyone who voted), ranked by '
+                   'interested + maybe. Games with no parseable max_players are left out unless '
+                   'include_unknown=1.')
+    params = {
+        'players': (_int_param(1), None),
+        'include_unknown': (_bool_param, False),
+    }
+
+    def score(self, vote_set, players, include_unknown):
+        headcount = players or vote_set.total_voters
+        entries = []
+        for game in vote_set.games:
+            max_players = parse_max_players(game.get('max_players'))
+            if max_players is None and not include_unknown:
+                continue
+            if max_players is not None and max_players < headcount:
+                continue
+            counts = vote_set.counts(game['id'])
+            entries.append(self.entry(game, counts, counts['interested'] + counts['maybe'],
+                                      max_players=max_players, headcount=headcount))
+        return entries
+
+
+class EngineCache(VersionedCache):
+    """Ranked results per (engine, params), valid for one data version."""
+
+    def get(self, version, engine, params, compute):
+        return super().get(version, (engine.name, tuple(sorted(params.items()))), compute)
@@ -46,12 +46,14 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    // Error events don't bubble, so one capturing listener covers cards added later too
+    document.addEventListener('error', function(e) {
+        if (e.target.classList && e.target.classList.contains('video-thumbnail') && !e.target.onerror) {
+            applyThumbnailFallback(e.target);
+        }
+    }, true);
     const thumbnailImages = document.querySelectorAll('.video-thumbnail');
     thumbnailImages.forEach(img => {
-        // Attach error handler for future failures
-        img.addEventListener('error', function() {
-            applyThumbnailFallback(this);
-        });
         // If image already finished loading but failed, apply fallback immediately
         if (img.complete && img.naturalWidth === 0) {
             applyThumbnailFallback(img);
@@ -166,9 +166,36 @@ function displayResults(data) {
     resultsContainer.appendChild(container);
 }
 
-// Fetch and display results when the page loads
-document.addEventListener('DOMContentLoaded', () => {
-    // Fetch results
+// Current results, kept up to date by the live stream
+let currentResults = null;
+
+function renderResults(data) {
+    displayTopResults(data);
+    displayFullResults(data);
+    loadRanking();
+    scheduleTimeline();
+}
+
+// Apply a diff event from /api/results/stream: changed games are replaced by id,
+// removed ids dropped, and top lists / totals replaced when present
+function applyResultsDiff(data, diff) {
+    const changed = new Map(diff.games.map(game => [game.id, game]));
+    const removed = new Set(diff.removed || []);
+    const games = data.games
+        .filter(game => !removed.has(game.id))
+        .map(game => changed.get(game.id) || game);
+    const known = new Set(games.map(game => game.id));
+    diff.games.forEach(game => {
+        if (!known.has(game.id)) games.push(game);
+    });
+    const next = { ...data, games };
+    ['top_interested', 'top_maybe', 'top_engagement', 'total_voters'].forEach(key => {
+        if (key in diff) next[key] = diff[key];
+    });
+    return next;
+}
+
+function fetchResults() {
     fetch('/api/results')
         .then(response => {
             if (!response.ok) {
@@ -177,14 +204,186 @@ document.addEventListener('DOMContentLoaded', () => {
             return response.json();
         })
         .then(data => {
-            console.log('Results data:', data);
-            displayTopResults(data);
-            displayFullResults(data);
+            currentResults = data;
+            renderResults(data);
         })
         .catch(error => {
             console.error('Error fetching results:', error);
             showError();
         });
+}
+
+// Fallback when live results are unavailable (no EventSource, or the server answered 503
+// because its stream limit was reached): poll every POLL_INTERVAL_MS
+const POLL_INTERVAL_MS = 10000;
+let pollTimer = null;
+
+function pollResults() {
+    fetchResults();
+    if (pollTimer === null) {
+        pollTimer = setInterval(fetchResults, POLL_INTERVAL_MS);
+    }
+}
+
+// Subscribe to live results; the browser reconnects (with Last-Event-ID) on its own
+function streamResults() {
+    const source = new EventSource('/api/results/stream');
+    source.addEventListener('snapshot', event => {
+        currentResults = JSON.parse(event.data);
+        renderResults(currentResults);
+    });
+    source.addEventListener('diff', event => {
+        if (!currentResults) return;
+        currentResults = applyResultsDiff(currentResults, JSON.parse(event.data));
+        renderResults(currentResults);
+    });
+    source.onerror = () => {
+        // CLOSED means the browser gave up (e.g. a 503); transient drops stay CONNECTING
+        if (source.readyState === EventSource.CLOSED) {
+            pollResults();
+        }
+    };
+}
+
+// --- Alternative rankings (/api/results?engine=...) ---
+let rankingEngines = [];
+
+function setupRankings() {
+    const select = document.getElementById('rankingEngine');
+    if (!select) return;
+    fetch('/api/results/engines')
+        .then(response => response.json())
+        .then(engines => {
+            rankingEngines = engines;
+            select.innerHTML = engines.map(engine => `<option value="${engine.name}">${engine.name}</option>`).join('');
+            select.addEventListener('change', loadRanking);
+            document.getElementById('rankingPlayers').addEventListener('change', loadRanking);
+            loadRanking();
+        })
+        .catch(error => console.error('Error fetching ranking engines:', error));
+}
+
+function loadRanking() {
+    const select = document.getElementById('rankingEngine');
+    if (!select || !select.value) return;
+    const engine = rankingEngines.find(e => e.name === select.value) || {};
+    const playersLabel = document.getElementById('rankingPlayersLabel');
+    const players = document.getElementById('rankingPlayers').value;
+    const usesPlayers = engine.params && 'players' in engine.params;
+    playersLabel.classList.toggle('hidden', !usesPlayers);
+    document.getElementById('rankingDescription').textContent = engine.description || '';
+
+    const params = new URLSearchParams({ engine: select.value, limit: 15 });
+    if (usesPlayers && players) params.set('players', players);
+    // Cached server-side per data version, and revalidated with ETags here
+    fetch(`/api/results?${params}`)
+        .then(response => response.json())
+        .then(data => displayRanking(data))
+        .catch(error => console.error('Error fetching ranking:', error));
+}
+
+function displayRanking(data) {
+    const list = document.getElementById('rankingList');
+    if (!list) return;
+    if (!data.ranking || data.ranking.length === 0) {
+        list.innerHTML = `<p class="text-gray-500 text-center py-4">${data.error || 'No games to rank yet'}</p>`;
+        return;
+    }
+    list.innerHTML = data.ranking.map(entry => `
+        <div class="flex items-center justify-between p-3 bg-gray-50 rounded-lg ${entry.qualifies === false ? 'opacity-50' : ''}">
+            <div class="flex items-center">
+                <span class="text-lg font-bold text-indigo-600 mr-3">${entry.rank}</span>
+                <span class="font-medium text-gray-800">${entry.title}</span>
+                ${entry.max_players ? `<span class="text-xs text-gray-500 ml-2">up to ${entry.max_players} players</span>` : ''}
+            </div>
+            <span class="text-sm font-semibold text-gray-700">${Number.isInteger(entry.score) ? entry.score : entry.score.toFixed(1)}</span>
+        </div>
+    `).join('');
+}
+
+// --- Trend chart (/api/results/timeline) ---
+const TREND_REFRESH_MS = 10000;
+const TREND_COLORS = ['#4f46e5', '#16a34a', '#d97706', '#dc2626', '#0891b2', '#9333ea', '#db2777', '#65a30d', '#475569', '#ea580c'];
+let trendChart = null;
+let trendData = null;
+let trendTimer = null;
+let trendLoadedAt = 0;
+
+function setupTimeline() {
+    const metric = document.getElementById('trendMetric');
+    if (!metric) return;
+    metric.addEventListener('change', () => displayTimeline(trendData));
+}
+
+// Live updates arrive with every vote; the trend only needs refreshing every few seconds
+function scheduleTimeline() {
+    if (trendTimer) return;
+    const wait = Math.max(0, trendLoadedAt + TREND_REFRESH_MS - Date.now());
+    trendTimer = setTimeout(() => {
+        trendTimer = null;
+        trendLoadedAt = Date.now();
+        loadTimeline();
+    }, wait);
+}
+
+function loadTimeline() {
+    if (!document.getElementById('trendChart')) return;
+    fetch('/api/results/timeline?points=60&top=10')
+        .then(response => response.json())
+        .then(data => {
+            trendData = data;
+            displayTimeline(data);
+        })
+        .catch(error => console.error('Error fetching timeline:', error));
+}
+
+function displayTimeline(data) {
+    const canvas = document.getElementById('trendChart');
+    if (!canvas || !data || !window.Chart) return;
+    const empty = !data.games || data.games.length === 0;
+    document.getElementById('trendEmpty').classList.toggle('hidden', !empty);
+    canvas.parentElement.classList.toggle('hidden', empty);
+    if (empty) return;
+
+    const metric = document.getElementById('trendMetric').value;
+    const labels = data.times.map(time => new Date(time + 'Z').toLocaleString([], { month: 'short', day: 'numeric', hour: '2-digit', minute: '2-digit' }));
+    const datasets = data.games.map((game, index) => ({
+        label: game.title,
+        data: metric === 'engagement' ? game.interested.map((count, i) => count + game.maybe[i]) : game[metric],
+        borderColor: TREND_COLORS[index % TREND_COLORS.length],
+        backgroundColor: TREND_COLORS[index % TREND_COLORS.length],
+        fill: false,
+        tension: 0.2,
+        pointRadius: 0
+    }));
+    if (trendChart) {
+        trendChart.data.labels = labels;
+        trendChart.data.datasets = datasets;
+        trendChart.update('none');
+        return;
+    }
+    trendChart = new Chart(canvas, {
+        type: 'line',
+        data: { labels, datasets },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            interaction: { mode: 'index', intersect: false },
+            scales: { y: { beginAtZero: true, ticks: { precision: 0 } } },
+            plugins: { legend: { position: 'bottom' } }
+        }
+    });
+}
+
+// Fetch and display results when the page loads
+document.addEventListener('DOMContentLoaded', () => {
+    setupRankings();
+    setupTimeline();
+    if (window.EventSource) {
+        streamResults();
+    } else {
+        pollResults();
+    }
 });
 
 // Function to display top results
@@ -248,7 +447,7 @@ function displayFullResults(data) {
     
     if (tableBody && data.games) {
         // Sort games by interested count (descending)
-        const sortedGames = data.games.sort((a, b) => b.interested_count - a.interested_count);
+        const sortedGames = [...data.games].sort((a, b) => b.interested_count - a.interested_count);
         
         tableBody.innerHTML = sortedGames.map(game => `
             <tr class="border-t border-gray-200 hover:bg-gray-50">
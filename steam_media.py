@@ -0,0 +1,356 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import span
+
+STEAM_APPDETAILS_URL = 'https://store.steampowered.com/api/appdetails'
+MEDIA_FILTERS = 'movies,screenshots,price_overview'
+
+
+class SteamClient:
+    """Thin wrapper around the Steam appdetails API using one pooled requests.Session."""
+
+    def __init__(self, api_url=STEAM_APPDETAILS_URL, timeout=8, pool_size=10):
+        self.api_url = api_url
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        # STEAM_API_URL can point at a local fake appdetails server for testing
+        return cls(
+            api_url=os.environ.get('STEAM_API_URL', STEAM_APPDETAILS_URL),
+            timeout=float(os.environ.get('STEAM_TIMEOUT', '8')),
+            pool_size=int(os.environ.get('STEAM_POOL_SIZE', '10')),
+        )
+
+    @property
+    def session(self):
+        # One session per process; sessions must not be shared across a fork
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._session = session
+                self._pid = os.getpid()
+            return self._session
+
+    def appdetails(self, app_ids, filters=MEDIA_FILTERS):
+        """Fetch raw appdetails for one or more app ids. Returns the decoded JSON (keyed by app id)."""
+        if isinstance(app_ids, (list, tuple)):
+            app_ids = ','.join(str(a) for a in app_ids)
+        with span('steam.appdetails'):
+            resp = self.session.get(
+                self.api_url,
+                params={'appids': app_ids, 'filters': filters},
+                timeout=self.timeout,
+            )
+            resp.raise_for_status()
+            return resp.json() or {}
+
+    def fetch_media(self, app_id):
+        """Fetch media for a single app and return (payload, http_status) as served by the proxy."""
+        raw = self.appdetails(app_id)
+        # Steam API returns keyed by app id (string)
+        item = raw.get(app_id) or raw.get(str(app_id))
+        if not item or not item.get('success'):
+            return {'success': False, 'error': 'Steam API returned no data'}, 404
+        data = item.get('data', {})
+        return {
+            'success': True,
+            'movies': data.get('movies', []),
+            'screenshots': data.get('screenshots', []),
+            'price_overview': data.get('price_overview', {})
+        }, 200
+
+    def fetch_prices(self, app_ids):
+        """Fetch price_overview for many apps in one call.
+        Steam only accepts several `appids` per request with the price_overview filter.
+        Returns {app_id: (payload, http_status)} for the ids Steam answered.
+        """
+        raw = self.appdetails(list(app_ids), filters='price_overview')
+        results = {}
+        for app_id in app_ids:
+            item = raw.get(str(app_id))
+            if item is None:
+                continue
+            if not item.get('success'):
+                results[app_id] = ({'success': False, 'error': 'Steam API returned no data'}, 404)
+                continue
+            # Free titles come back with an empty list instead of an object
+            data = item.get('data') or {}
+            results[app_id] = ({'success': True, 'price_overview': data.get('price_overview', {})}, 200)
+        return results
+
+    def fetch_price(self, app_id):
+        result = self.fetch_prices([app_id]).get(app_id)
+        if result is None:
+            return {'success': False, 'error': 'Steam API returned no data'}, 404
+        return result
+
+
+class _Entry:
+    __slots__ = ('payload', 'status', 'fetched_at', 'size')
+
+    def __init__(self, payload, status, fetched_at, size):
+        self.payload = payload
+        self.status = status
+        self.fetched_at = fetched_at
+        self.size = size
+
+
+class _Flight:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SteamMediaCache:
+    """LRU + TTL cache in front of the Steam appdetails API.
+
+    - Fresh entries (younger than `ttl`) are served directly.
+    - Stale entries (up to `ttl + stale_ttl`) are served immediately while one background
+      refresh runs.
+    - Concurrent misses for the same key share a single upstream fetch.
+    - Bounded by `max_entries` and by approximate payload size `max_bytes`.
+    - "No data" answers are cached for `negative_ttl`; upstream errors are not cached.
+    """
+
+    def __init__(self, fetcher, ttl=6 * 3600, stale_ttl=24 * 3600, negative_ttl=600,
+                 max_entries=2000, max_bytes=32 * 1024 * 1024, refresh_workers=4):
+        self.fetcher = fetcher
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.refresh_workers = refresh_workers
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._inflight = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self._stats = {
+            'hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'refreshes': 0,
+            'upstream_calls': 0,
+            'upstream_errors': 0,
+            'evictions': 0,
+        }
+
+    @classmethod
+    def from_env(cls, fetcher):
+        return cls(
+            fetcher,
+            ttl=float(os.environ.get('STEAM_CACHE_TTL', str(6 * 3600))),
+            stale_ttl=float(os.environ.get('STEAM_CACHE_STALE_TTL', str(24 * 3600))),
+            max_entries=int(os.environ.get('STEAM_CACHE_MAX_ENTRIES', '2000')),
+            max_bytes=int(os.environ.get('STEAM_CACHE_MAX_BYTES', str(32 * 1024 * 1024))),
+        )
+
+    def get(self, key):
+        """Return (payload, http_status) for `key`, fetching upstream only when needed."""
+        with self._lock:
+            cached = self._lookup(key)
+            if cached is not None:
+                return cached
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[key] = flight
+                self._stats['misses'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self._fetch(key)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def get_many(self, keys, fetch_many=None, batch_size=20, workers=8):
+        """Return {key: (payload, http_status)} for many keys at once.
+
+        Cached keys are answered directly and keys another caller is already fetching wait
+        for that fetch. The rest are fetched with `fetch_many(chunk)` (one upstream call per
+        `batch_size` keys, returning {key: (payload, status)}) when given, otherwise one by
+        one on a bounded thread pool; keys a batch call did not answer are then fetched one
+        by one too. Per-key failures become 500 payloads.
+        """
+        results, waiting, leading = {}, {}, {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                cached = self._lookup(key)
+                if cached is not None:
+                    results[key] = cached
+                elif key in self._inflight:
+                    waiting[key] = self._inflight[key]
+                    self._stats['coalesced'] += 1
+                else:
+                    leading[key] = self._inflight[key] = _Flight()
+                    self._stats['misses'] += 1
+
+        try:
+            missing = list(leading)
+            if fetch_many is not None and missing:
+                for i in range(0, len(missing), batch_size):
+                    chunk = missing[i:i + batch_size]
+                    with self._lock:
+                        self._stats['upstream_calls'] += 1
+                    try:
+                        fetched = fetch_many(chunk)
+                    except Exception as e:
+                        with self._lock:
+                            self._stats['upstream_errors'] += 1
+                        print(f"Steam batch fetch failed for {len(chunk)} apps: {e}", flush=True)
+                        continue
+                    for key, (payload, status) in fetched.items():
+                        if key in chunk:
+                            self.put(key, payload, status)
+                            leading[key].result = (payload, status)
+                missing = [key for key in missing if leading[key].result is None]
+
+            def fetch_one(key):
+                flight = leading[key]
+                try:
+                    flight.result = self._fetch(key)
+                except Exception as e:
+                    flight.error = e
+
+            if missing:
+                with ThreadPoolExecutor(max_workers=max(1, min(workers, len(missing))),
+                                        thread_name_prefix='steam-batch') as pool:
+                    list(pool.map(fetch_one, missing))
+        finally:
+            with self._lock:
+                for key, flight in leading.items():
+                    if self._inflight.get(key) is flight:
+                        del self._inflight[key]
+            for flight in leading.values():
+                if flight.result is None and flight.error is None:
+                    flight.error = RuntimeError('Steam batch fetch aborted')
+                flight.event.set()
+
+        for key, flight in list(leading.items()) + list(waiting.items()):
+            flight.event.wait()
+            if flight.error is not None:
+                results[key] = {'success': False, 'error': str(flight.error)}, 500
+            else:
+                results[key] = flight.result
+        return results
+
+    def peek(self, key):
+        """Return the cached (payload, status) for `key` regardless of age, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return (entry.payload, entry.status) if entry is not None else None
+
+    def put(self, key, payload, status=200):
+        size = len(json.dumps(payload))
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[key] = _Entry(payload, status, time.monotonic(), size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _key, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self._stats['evictions'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+            stats['inflight'] = len(self._inflight)
+        return stats
+
+    def _lookup(self, key):
+        # Caller holds self._lock. Returns a cached (payload, status) or None on a miss.
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        age = time.monotonic() - entry.fetched_at
+        ttl = self.ttl if entry.status == 200 else self.negative_ttl
+        if age < ttl:
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry.payload, entry.status
+        if entry.status == 200 and age < ttl + self.stale_ttl:
+            self._entries.move_to_end(key)
+            self._stats['stale_hits'] += 1
+            self._schedule_refresh(key)
+            return entry.payload, entry.status
+        return None
+
+    def _fetch(self, key):
+        with self._lock:
+            self._stats['upstream_calls'] += 1
+        try:
+            payload, status = self.fetcher(key)
+        except Exception:
+            with self._lock:
+                self._stats['upstream_errors'] += 1
+            raise
+        self.put(key, payload, status)
+        return payload, status
+
+    def _schedule_refresh(self, key):
+        # Caller holds self._lock
+        if key in self._refreshing or key in self._inflight:
+            return
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.refresh_workers, thread_name_prefix='steam-refresh')
+            self._executor_pid = os.getpid()
+        self._refreshing.add(key)
+        self._stats['refreshes'] += 1
+        self._executor.submit(self._refresh, key)
+
+    def _refresh(self, key):
+        try:
+            payload, status = self.fetcher(key)
+            with self._lock:
+                self._stats['upstream_calls'] += 1
+            # Keep serving the stale copy rather than replacing good data with "no data"
+            if status == 200:
+                self.put(key, payload, status)
+        except Exception as e:
+            with self._lock:
+                self._stats['upstream_errors'] += 1
+            print(f"Steam media refresh failed for {key}: {e}", flush=True)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
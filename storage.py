@@ -0,0 +1,793 @@
+"""Storage backends for users, votes and submitted games.
+
+Rows are plain dicts shaped like the original TinyDB documents, so the rest of the app
+(and backup files) don't care which backend is in use:
+
+- users:           {'id', 'name', 'voted_at', 'submission'}
+- votes:           {'player_id', 'game_id', 'vote', 'voted_at', 'submission'}
+- submitted_games: {'id', 'title', 'url', 'price', 'max_players', 'steam_app_id', 'youtube_id', 'submitted_at'}
+
+Unknown keys (e.g. from hand-edited backups) are preserved.
+"""
+import bisect
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development only
+    fcntl = None
+
+from tinydb import TinyDB, Query
+
+from catalog import next_id
+from votestore import VoteColumns
+
+TABLES = ('users', 'votes', 'submitted_games')
+
+COLUMNS = {
+    'users': ('id', 'name', 'voted_at', 'submission'),
+    'votes': ('player_id', 'game_id', 'vote', 'voted_at', 'submission'),
+    'submitted_games': ('title', 'url', 'price', 'max_players', 'steam_app_id', 'youtube_id', 'submitted_at'),
+}
+
+
+class Storage:
+    """Interface shared by the TinyDB and SQLite backends.
+
+    Every write bumps a storage-wide generation counter and returns the new value, so
+    processes sharing the same files (e.g. gunicorn workers) can cheaply tell when
+    another process changed the data.
+    """
+
+    def all_users(self):
+        raise NotImplementedError
+
+    def all_votes(self):
+        raise NotImplementedError
+
+    def all_submitted_games(self):
+        raise NotImplementedError
+
+    def count_users(self):
+        raise NotImplementedError
+
+    def snapshot(self):
+        """Consistent view of all tables: {'users', 'votes', 'submitted_games', 'generation'}."""
+        raise NotImplementedError
+
+    def columnar_snapshot(self):
+        """Like snapshot(), but 'votes' is a compact VoteColumns instead of a list of dicts."""
+        snap = self.snapshot()
+        snap['votes'] = VoteColumns.from_dicts(snap['votes'])
+        return snap
+
+    def generation(self):
+        """Current change counter; cheap enough to call on every request."""
+        raise NotImplementedError
+
+    def record_ballot(self, user_name, votes, now_iso):
+        """Upsert the user, bump their submission counter and insert the ballot's votes.
+        `votes` is a list of (game_id, vote_type).
+        Returns (user_id, submission, new_user, generation).
+        """
+        raise NotImplementedError
+
+    def insert_submitted_game(self, game, first_id=1):
+        """Store a submitted game under a permanent catalog id, chosen inside the write so
+        concurrent submissions can't collide (see catalog.assign_ids(); `first_id` is the
+        first id after the hardcoded games). Returns (game_id, generation).
+        """
+        ids, generation = self.insert_submitted_games([game], first_id)
+        return ids[0], generation
+
+    def insert_submitted_games(self, games, first_id=1):
+        """Batch form of insert_submitted_game(): one write and one generation bump for all
+        of `games`, which get consecutive new ids. Returns ([game_id, ...], generation).
+        """
+        raise NotImplementedError
+
+    def apply_logged_ballots(self, entries):
+        """Write ballots already recorded in the ballot log (see ballotlog.py) in one write.
+        Each entry carries its resolved 'user_id', 'name', 'new_user', 'submission',
+        'voted_at', 'votes' ([game_id, vote] pairs) and log 'seq'; the highest seq is stored
+        with them, so replaying a log twice doesn't duplicate votes. Returns the generation.
+        """
+        raise NotImplementedError
+
+    def ballot_log_position(self):
+        """Highest ballot log seq written by apply_logged_ballots() (0 if none)."""
+        raise NotImplementedError
+
+    def iter_snapshot(self):
+        """Yield (table, row) for every row of every table, from one consistent snapshot."""
+        raise NotImplementedError
+
+    def bulk_import(self, rows, replace=False):
+        """Insert (table, row) pairs from any iterable, committing all tables in one write.
+        With `replace`, existing rows are swapped out atomically (all or nothing).
+        Rows for unknown tables and non-dict rows are skipped.
+        Returns ({table: rows inserted}, generation).
+        """
+        raise NotImplementedError
+
+    def import_rows(self, users, votes, submitted_games, replace=False):
+        """List-based convenience wrapper around bulk_import(). Returns the new generation."""
+        rows = [('users', r) for r in users] + [('votes', r) for r in votes] + \
+            [('submitted_games', r) for r in submitted_games]
+        _counts, generation = self.bulk_import(rows, replace=replace)
+        return generation
+
+    def vote_history(self, limit, cursor=None, user=None, game_id=None, vote=None, since=None, until=None):
+        """One page of vote history, newest first, optionally filtered.
+
+        Ordered by (voted_at, submission, player_id, row id), all descending; `cursor` is the
+        sort key of the last row of the previous page. `since`/`until` are inclusive ISO
+        timestamp bounds. Returns (rows, next_cursor) where rows are
+        {'voted_at', 'user', 'player_id', 'game_id', 'vote', 'submission'} and next_cursor
+        is None on the last page.
+        """
+        raise NotImplementedError
+
+    def is_empty(self):
+        return not (self.count_users() or self.all_votes() or self.all_submitted_games())
+
+    def close(self):
+        pass
+
+
+@contextmanager
+def file_lock(lock_path, thread_lock, exclusive=False):
+    """Hold `thread_lock` and an flock on `lock_path`: shared for readers, exclusive for
+    writers, so several processes can share the files it guards."""
+    with thread_lock:
+        with open(lock_path, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+
+
+def read_generation(path):
+    """The generation counter kept in a small text file; 0 if it is missing or unreadable."""
+    try:
+        with open(path) as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def write_generation(path, generation):
+    # Caller holds the exclusive lock; the file is swapped in atomically
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(str(generation))
+    os.replace(tmp_path, path)
+    return generation
+
+
+def _history_key(vote, pk):
+    # Legacy rows may miss voted_at/submission; they sort as '' and 1 like the old page did
+    player_id = vote.get('player_id')
+    return (vote.get('voted_at') or '', vote.get('submission', 1) or 1,
+            player_id if isinstance(player_id, int) else 0, pk)
+
+
+def _next_submission(user, prior_votes):
+    # Legacy votes with missing 'submission' count as submission 1
+    max_sub_from_votes = max((v.get('submission', 1) for v in prior_votes), default=0)
+    return max(user.get('submission', 0) or 0, max_sub_from_votes) + 1
+
+
+class TinyDBStorage(Storage):
+    """The original single-JSON-file backend.
+
+    Safe across processes: writes hold an exclusive flock on `<path>.lock` (reads a shared
+    one) and every operation opens the file fresh, so no process works from a stale
+    TinyDB query cache or document id counter. The generation lives in `<path>.gen`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = path + '.lock'
+        self.generation_path = path + '.gen'
+        self._lock = threading.RLock()
+        self._history = None
+        with self._open(exclusive=True):
+            pass
+
+    def _locked(self, exclusive=False):
+        return file_lock(self.lock_path, self._lock, exclusive)
+
+    @contextmanager
+    def _open(self, exclusive=False):
+        with self._locked(exclusive):
+            db = TinyDB(self.path)
+            try:
+                yield db
+            finally:
+                db.close()
+
+    def _read(self, table):
+        with self._open() as db:
+            return db.table(table).all()
+
+    def all_users(self):
+        return self._read('users')
+
+    def all_votes(self):
+        return self._read('votes')
+
+    def all_submitted_games(self):
+        return self._read('submitted_games')
+
+    def count_users(self):
+        with self._open() as db:
+            return len(db.table('users'))
+
+    def snapshot(self):
+        with self._open() as db:
+            snap = {table: db.table(table).all() for table in TABLES}
+            snap['generation'] = self.generation()
+        return snap
+
+    def generation(self):
+        return read_generation(self.generation_path)
+
+    def _bump_generation(self):
+        # Caller holds the exclusive lock
+        return write_generation(self.generation_path, self.generation() + 1)
+
+    def record_ballot(self, user_name, votes, now_iso):
+        with self._open(exclusive=True) as db:
+            users_table = db.table('users')
+            votes_table = db.table('votes')
+            UserQuery = Query()
+            existing_user = users_table.get(UserQuery.name == user_name)
+            if existing_user:
+                user_id = existing_user['id']
+                VoteQuery = Query()
+                prior_votes = votes_table.search(VoteQuery.player_id == user_id)
+                submission = _next_submission(existing_user, prior_votes)
+                users_table.update({'voted_at': now_iso, 'submission': submission}, UserQuery.id == user_id)
+            else:
+                user_id = max([len(users_table)] + [u.get('id') or 0 for u in users_table.all()]) + 1
+                submission = 1
+                users_table.insert({'id': user_id, 'name': user_name, 'voted_at': now_iso, 'submission': submission})
+            # One file write for the whole ballot
+            votes_table.insert_multiple([
+                {'player_id': user_id, 'game_id': game_id, 'vote': vote, 'voted_at': now_iso, 'submission': submission}
+                for game_id, vote in votes
+            ])
+            generation = self._bump_generation()
+        return user_id, submission, existing_user is None, generation
+
+    def insert_submitted_games(self, games, first_id=1):
+        with self._open(exclusive=True) as db:
+            table = db.table('submitted_games')
+            game_id = next_id(table.all(), first_id)
+            games = [dict(game, id=game_id + i) for i, game in enumerate(games)]
+            table.insert_multiple(games)
+            return [game['id'] for game in games], self._bump_generation()
+
+    def apply_logged_ballots(self, entries):
+        with self._locked(exclusive=True):
+            data = self._read_raw()
+            users = dict(data.get('users', {}))
+            votes = dict(data.get('votes', {}))
+            by_id = {}
+            for doc_id, user in users.items():
+                by_id.setdefault(user.get('id'), []).append(doc_id)
+            next_user = max((int(doc_id) for doc_id in users), default=0) + 1
+            next_vote = max((int(doc_id) for doc_id in votes), default=0) + 1
+            for entry in entries:
+                user_id = entry['user_id']
+                if entry['new_user']:
+                    users[str(next_user)] = {'id': user_id, 'name': entry['name'], 'voted_at': entry['voted_at'],
+                                             'submission': entry['submission']}
+                    by_id.setdefault(user_id, []).append(str(next_user))
+                    next_user += 1
+                else:
+                    for doc_id in by_id.get(user_id, ()):
+                        users[doc_id] = dict(users[doc_id], voted_at=entry['voted_at'], submission=entry['submission'])
+                for game_id, vote in entry['votes']:
+                    votes[str(next_vote)] = {'player_id': user_id, 'game_id': game_id, 'vote': vote,
+                                             'voted_at': entry['voted_at'], 'submission': entry['submission']}
+                    next_vote += 1
+            position = max([self._log_position(data)] + [entry['seq'] for entry in entries])
+            data.update(users=users, votes=votes, _meta={'1': {'ballot_log_seq': position}})
+            self._write_raw(data)
+            return self._bump_generation()
+
+    def ballot_log_position(self):
+        with self._locked():
+            return self._log_position(self._read_raw())
+
+    @staticmethod
+    def _log_position(data):
+        return max([0] + [doc.get('ballot_log_seq', 0) for doc in data.get('_meta', {}).values()])
+
+    def iter_snapshot(self):
+        # TinyDB parses the whole file anyway, so iterate over one in-memory snapshot
+        snap = self.snapshot()
+        for table in TABLES:
+            for row in snap[table]:
+                yield table, row
+
+    def bulk_import(self, rows, replace=False):
+        counts = dict.fromkeys(TABLES, 0)
+        with self._locked(exclusive=True):
+            data = self._read_raw()
+            tables = {table: ({} if replace else dict(data.get(table, {}))) for table in TABLES}
+            next_ids = {table: max((int(doc_id) for doc_id in docs), default=0) + 1 for table, docs in tables.items()}
+            for table, row in rows:
+                if table not in tables or not isinstance(row, dict):
+                    continue
+                tables[table][str(next_ids[table])] = row
+                next_ids[table] += 1
+                counts[table] += 1
+            data.update(tables)
+            self._write_raw(data)
+            return counts, self._bump_generation()
+
+    def vote_history(self, limit, cursor=None, user=None, game_id=None, vote=None, since=None, until=None):
+        keys, rows = self._history_index()
+        # keys ascend; walk backwards from just below the cursor
+        i = (bisect.bisect_left(keys, tuple(cursor)) if cursor else len(keys)) - 1
+        page = []
+        while i >= 0 and len(page) <= limit:
+            row = rows[i]
+            if ((user is None or row['user'] == user)
+                    and (game_id is None or row['game_id'] == game_id)
+                    and (vote is None or row['vote'] == vote)
+                    and (since is None or (row['voted_at'] or '') >= since)
+                    and (until is None or (row['voted_at'] or '') <= until)):
+                page.append((keys[i], row))
+            i -= 1
+        next_cursor = list(page[limit - 1][0]) if len(page) > limit else None
+        return [row for _key, row in page[:limit]], next_cursor
+
+    def _history_index(self):
+        # Sorted once per generation instead of once per request
+        with self._lock:
+            generation = self.generation()
+            if self._history is None or self._history[0] != generation:
+                snap = self.snapshot()
+                names = {u.get('id'): u.get('name') for u in snap['users']}
+                entries = sorted(
+                    (_history_key(v, v.doc_id), {
+                        'voted_at': v.get('voted_at'),
+                        'user': names.get(v.get('player_id'), 'Unknown'),
+                        'player_id': v.get('player_id'),
+                        'game_id': str(v.get('game_id')),
+                        'vote': v.get('vote'),
+                        'submission': v.get('submission', 1),
+                    })
+                    for v in snap['votes']
+                )
+                self._history = (snap['generation'], [k for k, _ in entries], [r for _, r in entries])
+            return self._history[1], self._history[2]
+
+    def _read_raw(self):
+        # Caller holds the lock
+        try:
+            with open(self.path) as f:
+                content = f.read()
+        except FileNotFoundError:
+            return {}
+        return json.loads(content) if content.strip() else {}
+
+    def _write_raw(self, data):
+        # Caller holds the exclusive lock. Write a temp file and rename so the swap is atomic.
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    pk INTEGER PRIMARY KEY AUTOINCREMENT,
+    id INTEGER,
+    name TEXT,
+    voted_at TEXT,
+    submission INTEGER,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_users_name ON users(name);
+CREATE INDEX IF NOT EXISTS idx_users_id ON users(id);
+
+CREATE TABLE IF NOT EXISTS votes (
+    pk INTEGER PRIMARY KEY AUTOINCREMENT,
+    player_id INTEGER,
+    game_id TEXT,
+    vote TEXT,
+    voted_at TEXT,
+    submission INTEGER,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_votes_player_submission ON votes(player_id, submission);
+CREATE INDEX IF NOT EXISTS idx_votes_game ON votes(game_id);
+-- Vote history page order (see vote_history); expressions must match the query exactly
+CREATE INDEX IF NOT EXISTS idx_votes_history
+    ON votes(COALESCE(voted_at, ''), COALESCE(submission, 1), COALESCE(player_id, 0), pk);
+
+CREATE TABLE IF NOT EXISTS submitted_games (
+    pk INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT,
+    url TEXT,
+    price TEXT,
+    max_players TEXT,
+    steam_app_id TEXT,
+    youtube_id TEXT,
+    submitted_at TEXT,
+    extra TEXT
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', 0);
+"""
+
+
+class SQLiteStorage(Storage):
+    """SQLite backend (WAL mode). Each ballot and each import is a single transaction.
+    Writers serialize on BEGIN IMMEDIATE, so several processes can share one database file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self.conn.executescript(SCHEMA)
+
+    @property
+    def conn(self):
+        # One connection per thread and per process (connections must not cross a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _transaction(self):
+        return _Transaction(self.conn)
+
+    def _rows(self, table):
+        return [_row_to_dict(table, r) for r in self.conn.execute(f'SELECT * FROM {table} ORDER BY pk')]
+
+    def all_users(self):
+        return self._rows('users')
+
+    def all_votes(self):
+        return self._rows('votes')
+
+    def all_submitted_games(self):
+        return self._rows('submitted_games')
+
+    def count_users(self):
+        return self.conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+
+    def snapshot(self):
+        conn = self.conn
+        # A read transaction gives every SELECT the same WAL snapshot
+        conn.execute('BEGIN')
+        try:
+            snap = {table: self._rows(table) for table in TABLES}
+            snap['generation'] = self.generation()
+        finally:
+            conn.execute('COMMIT')
+        return snap
+
+    def columnar_snapshot(self):
+        conn = self.conn
+        conn.execute('BEGIN')
+        try:
+            snap = {'users': self._rows('users'), 'submitted_games': self._rows('submitted_games')}
+            # Plain tuples straight into the columns; no per-row dict
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute('SELECT player_id, game_id, vote, submission, voted_at, extra FROM votes ORDER BY pk')
+            snap['votes'] = VoteColumns.from_rows(_vote_tuples(cursor))
+            snap['generation'] = self.generation()
+        finally:
+            conn.execute('COMMIT')
+        return snap
+
+    def generation(self):
+        return self.conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()[0]
+
+    def record_ballot(self, user_name, votes, now_iso):
+        with self._transaction() as conn:
+            row = conn.execute('SELECT * FROM users WHERE name = ? ORDER BY pk LIMIT 1', (user_name,)).fetchone()
+            if row is not None:
+                user = _row_to_dict('users', row)
+                user_id = user['id']
+                max_sub = conn.execute(
+                    'SELECT MAX(COALESCE(submission, 1)) FROM votes WHERE player_id = ?', (user_id,)
+                ).fetchone()[0]
+                submission = max(user.get('submission', 0) or 0, max_sub or 0) + 1
+                conn.execute('UPDATE users SET voted_at = ?, submission = ? WHERE id = ?', (now_iso, submission, user_id))
+            else:
+                count, max_id = conn.execute('SELECT COUNT(*), COALESCE(MAX(id), 0) FROM users').fetchone()
+                user_id = max(count, max_id) + 1
+                submission = 1
+                conn.execute('INSERT INTO users (id, name, voted_at, submission) VALUES (?, ?, ?, ?)',
+                             (user_id, user_name, now_iso, submission))
+            conn.executemany(
+                'INSERT INTO votes (player_id, game_id, vote, voted_at, submission) VALUES (?, ?, ?, ?, ?)',
+                [(user_id, str(game_id), vote, now_iso, submission) for game_id, vote in votes],
+            )
+            generation = _bump_generation(conn)
+        return user_id, submission, row is None, generation
+
+    def insert_submitted_games(self, games, first_id=1):
+        with self._transaction() as conn:
+            game_id = next_id(self._rows('submitted_games'), first_id)
+            games = [dict(game, id=game_id + i) for i, game in enumerate(games)]
+            _insert_rows(conn, 'submitted_games', games)
+            return [game['id'] for game in games], _bump_generation(conn)
+
+    def apply_logged_ballots(self, entries):
+        with self._transaction() as conn:
+            for entry in entries:
+                if entry['new_user']:
+                    conn.execute('INSERT INTO users (id, name, voted_at, submission) VALUES (?, ?, ?, ?)',
+                                 (entry['user_id'], entry['name'], entry['voted_at'], entry['submission']))
+                else:
+                    conn.execute('UPDATE users SET voted_at = ?, submission = ? WHERE id = ?',
+                                 (entry['voted_at'], entry['submission'], entry['user_id']))
+            conn.executemany(
+                'INSERT INTO votes (player_id, game_id, vote, voted_at, submission) VALUES (?, ?, ?, ?, ?)',
+                [(entry['user_id'], str(game_id), vote, entry['voted_at'], entry['submission'])
+                 for entry in entries for game_id, vote in entry['votes']],
+            )
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('ballot_log_seq', 0)")
+            conn.execute("UPDATE meta SET value = MAX(value, ?) WHERE key = 'ballot_log_seq'",
+                         (max(entry['seq'] for entry in entries),))
+            return _bump_generation(conn)
+
+    def ballot_log_position(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'ballot_log_seq'").fetchone()
+        return row[0] if row else 0
+
+    def iter_snapshot(self):
+        conn = self.conn
+        conn.execute('BEGIN')
+        try:
+            for table in TABLES:
+                for row in conn.execute(f'SELECT * FROM {table} ORDER BY pk'):
+                    yield table, _row_to_dict(table, row)
+        finally:
+            conn.execute('COMMIT')
+
+    def bulk_import(self, rows, replace=False, batch_size=1000):
+        counts = dict.fromkeys(TABLES, 0)
+        pending = {table: [] for table in TABLES}
+        with self._transaction() as conn:
+            if replace:
+                for table in TABLES:
+                    conn.execute(f'DELETE FROM {table}')
+            for table, row in rows:
+                if table not in pending or not isinstance(row, dict):
+                    continue
+                pending[table].append(row)
+                if len(pending[table]) >= batch_size:
+                    _insert_rows(conn, table, pending[table])
+                    counts[table] += len(pending[table])
+                    pending[table] = []
+            for table, batch in pending.items():
+                _insert_rows(conn, table, batch)
+                counts[table] += len(batch)
+            generation = _bump_generation(conn)
+        return counts, generation
+
+    def vote_history(self, limit, cursor=None, user=None, game_id=None, vote=None, since=None, until=None):
+        key = "(COALESCE(v.voted_at, ''), COALESCE(v.submission, 1), COALESCE(v.player_id, 0), v.pk)"
+        where = []
+        params = []
+        if cursor:
+            # The leading-column bound lets SQLite seek into the index instead of scanning from the top
+            where.append(f"COALESCE(v.voted_at, '') <= ? AND {key} < (?, ?, ?, ?)")
+            params.append(cursor[0])
+            params.extend(cursor)
+        if user is not None:
+            where.append('v.player_id IN (SELECT id FROM users WHERE name = ?)')
+            params.append(user)
+        if game_id is not None:
+            where.append('v.game_id = ?')
+            params.append(game_id)
+        if vote is not None:
+            where.append('v.vote = ?')
+            params.append(vote)
+        if since is not None:
+            where.append("COALESCE(v.voted_at, '') >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("COALESCE(v.voted_at, '') <= ?")
+            params.append(until)
+        sql = f"""
+            SELECT v.pk, v.player_id, v.game_id, v.vote, v.voted_at, v.submission,
+                   (SELECT u.name FROM users u WHERE u.id = v.player_id ORDER BY u.pk DESC LIMIT 1) AS user_name
+            FROM votes v
+            {'WHERE ' + ' AND '.join(where) if where else ''}
+            ORDER BY COALESCE(v.voted_at, '') DESC, COALESCE(v.submission, 1) DESC,
+                     COALESCE(v.player_id, 0) DESC, v.pk DESC
+            LIMIT ?
+        """
+        params.append(limit + 1)
+        rows = self.conn.execute(sql, params).fetchall()
+        page = [{
+            'voted_at': r['voted_at'],
+            'user': r['user_name'] if r['user_name'] is not None else 'Unknown',
+            'player_id': r['player_id'],
+            'game_id': r['game_id'],
+            'vote': r['vote'],
+            'submission': r['submission'] if r['submission'] is not None else 1,
+        } for r in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = list(_history_key(dict(last), last['pk']))
+        return page, next_cursor
+
+    def is_empty(self):
+        return not any(self.conn.execute(f'SELECT 1 FROM {table} LIMIT 1').fetchone() for table in TABLES)
+
+    def import_if_empty(self, users, votes, submitted_games):
+        """Import rows only if every table is empty, checked inside the write transaction
+        so concurrently starting workers migrate at most once. Returns True if imported.
+        """
+        with self._transaction() as conn:
+            if any(conn.execute(f'SELECT 1 FROM {table} LIMIT 1').fetchone() for table in TABLES):
+                return False
+            _insert_rows(conn, 'users', users)
+            _insert_rows(conn, 'votes', votes)
+            _insert_rows(conn, 'submitted_games', submitted_games)
+            _bump_generation(conn)
+        return True
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK around a block; serializes writers across processes."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute('COMMIT')
+        else:
+            self.conn.execute('ROLLBACK')
+        return False
+
+
+def _bump_generation(conn):
+    conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'generation'")
+    return conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()[0]
+
+
+def _row_to_dict(table, row):
+    d = {}
+    for col in COLUMNS[table]:
+        value = row[col]
+        if value is not None:
+            d[col] = value
+    if row['extra']:
+        d.update(json.loads(row['extra']))
+    return d
+
+
+def _vote_tuples(rows):
+    # (player_id, game_id, vote, submission, voted_at, extra) -> VoteColumns row, with the
+    # same defaults/overrides _row_to_dict() would apply
+    for player_id, game_id, vote, submission, voted_at, extra in rows:
+        if extra:
+            v = {k: val for k, val in zip(COLUMNS['votes'], (player_id, game_id, vote, voted_at, submission))
+                 if val is not None}
+            v.update(json.loads(extra))
+            yield v.get('player_id'), v.get('game_id'), v.get('vote'), v.get('submission', 1), v.get('voted_at')
+        else:
+            yield player_id, game_id, vote, 1 if submission is None else submission, voted_at
+
+
+def _insert_rows(conn, table, rows):
+    cols = COLUMNS[table]
+    sql = f"INSERT INTO {table} ({', '.join(cols)}, extra) VALUES ({', '.join('?' for _ in cols)}, ?)"
+    params = []
+    for row in rows:
+        if not isinstance(row, dict):
+            continue
+        extra = {k: v for k, v in row.items() if k not in cols}
+        values = [row.get(col) for col in cols]
+        # Only scalars fit the typed columns; anything else rides along in `extra`
+        for i, col in enumerate(cols):
+            if values[i] is not None and not isinstance(values[i], (str, int, float)):
+                extra[col] = values[i]
+                values[i] = None
+        params.append(values + [json.dumps(extra) if extra else None])
+    conn.executemany(sql, params)
+
+
+def migrate_tinydb(json_path, target, only_if_empty=False):
+    """Copy every row from a TinyDB file into a SQLiteStorage (one transaction).
+    Returns row counts, or None if `only_if_empty` and the target already had data.
+    """
+    source = TinyDB(json_path)
+    try:
+        users = source.table('users').all()
+        votes = source.table('votes').all()
+        submitted_games = source.table('submitted_games').all()
+    finally:
+        source.close()
+    if only_if_empty:
+        if not target.import_if_empty(users, votes, submitted_games):
+            return None
+    else:
+        target.import_rows(users, votes, submitted_games)
+    return {'users': len(users), 'votes': len(votes), 'submitted_games': len(submitted_games)}
+
+
+def open_storage(backend=None, db_path=None, sqlite_path=None, ballot_log=None):
+    """Open the configured backend.
+
+    STORAGE_BACKEND selects 'sqlite' (default) or 'tinydb'. DB_PATH is the TinyDB file;
+    SQLITE_PATH defaults to DB_PATH with a .sqlite3 extension. When the SQLite database
+    is new and empty but a TinyDB file exists, its data is migrated once automatically.
+
+    BALLOT_LOG puts a group-committed write-ahead ballot log in front of the backend (see
+    ballotlog.py); it is on by default for TinyDB and off for SQLite. BALLOT_LOG_PATH
+    defaults to the database path with a .ballots extension.
+    """
+    backend = (backend or os.environ.get('STORAGE_BACKEND', 'sqlite')).lower()
+    db_path = db_path or os.environ.get('DB_PATH', 'db.json')
+    if backend == 'tinydb':
+        _ensure_dir(db_path)
+        storage = TinyDBStorage(db_path)
+    elif backend == 'sqlite':
+        sqlite_path = sqlite_path or os.environ.get('SQLITE_PATH') or (os.path.splitext(db_path)[0] + '.sqlite3')
+        _ensure_dir(sqlite_path)
+        storage = SQLiteStorage(sqlite_path)
+        if storage.is_empty() and os.path.exists(db_path) and os.path.getsize(db_path) > 0:
+            counts = migrate_tinydb(db_path, storage, only_if_empty=True)
+            if counts is not None:
+                print(f"Migrated TinyDB data from {db_path} to {sqlite_path}: {counts}", flush=True)
+    else:
+        raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+    if ballot_log is None:
+        ballot_log = os.environ.get('BALLOT_LOG', '1' if backend == 'tinydb' else '0').lower() in ('1', 'true', 'yes')
+    if not ballot_log:
+        return storage
+    from ballotlog import BallotLogStorage  # ballotlog builds on this module
+    log_path = os.environ.get('BALLOT_LOG_PATH') or (os.path.splitext(storage.path)[0] + '.ballots')
+    return BallotLogStorage.from_env(storage, log_path)
+
+
+def _ensure_dir(path):
+    try:
+        db_dir = os.path.dirname(path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+    except Exception:
+        # If we cannot create the directory, opening the database will fail later with a clearer error
+        pass
@@ -0,0 +1,250 @@
+import threading
+from array import array
+from collections import OrderedDict
+
+from votestore import VoteColumns, VOTE_CODES, tally_key, vote_code
+
+# Vote types that count towards results (others are stored but ignored, as before)
+VOTE_TYPES = ('interested', 'not_interested', 'maybe')
+
+
+def format_results(games, per_game, total_voters):
+    """Build the /api/results payload from per-game voter name lists.
+    `per_game` maps str(game id) -> {'interested': [...], 'not_interested': [...], 'maybe': [...]}.
+    """
+    formatted_results = {
+        'games': [],
+        'top_interested': [],
+        'top_maybe': [],
+        'top_engagement': [],
+        'total_voters': total_voters
+    }
+
+    interested_counts = []
+    maybe_counts = []
+    engagement_counts = []
+
+    for game in games:
+        game_id = str(game['id'])
+        game_data = per_game.get(game_id)
+        if game_data is None:
+            continue
+        interested_count = len(game_data['interested'])
+        maybe_count = len(game_data['maybe'])
+        engagement_count = interested_count + maybe_count
+
+        formatted_results['games'].append({
+            'id': game_id,
+            'title': game['title'],
+            'interested': game_data['interested'],
+            'not_interested': game_data['not_interested'],
+            'maybe': game_data['maybe'],
+            'interested_count': interested_count,
+            'maybe_count': maybe_count,
+            'engagement_count': engagement_count
+        })
+
+        interested_counts.append((game['title'], interested_count))
+        maybe_counts.append((game['title'], maybe_count))
+        engagement_counts.append((game['title'], engagement_count, interested_count, maybe_count))
+
+    # Sort and get top 10
+    interested_counts.sort(key=lambda x: x[1], reverse=True)
+    maybe_counts.sort(key=lambda x: x[1], reverse=True)
+    # For engagement, break ties by interested then maybe
+    engagement_counts.sort(key=lambda x: (x[1], x[2], x[3]), reverse=True)
+
+    formatted_results['top_interested'] = [{'title': title, 'count': count} for title, count in interested_counts[:10]]
+    formatted_results['top_maybe'] = [{'title': title, 'count': count} for title, count in maybe_counts[:10]]
+    formatted_results['top_engagement'] = [
+        {'title': title, 'count': engagement}
+        for (title, engagement, _ic, _mc) in engagement_counts[:10]
+    ]
+
+    return formatted_results
+
+
+class VoteSet:
+    """Per-game voter lists for the latest submission of every user.
+    `voters` maps str(game id) -> {vote type: [voter key, ...]}; voter keys are opaque."""
+    __slots__ = ('games', 'voters', 'total_voters')
+
+    def __init__(self, games, voters, total_voters):
+        self.games = games
+        self.voters = voters
+        self.total_voters = total_voters
+
+    def counts(self, game_id):
+        votes = self.voters.get(str(game_id), {})
+        return {vote_type: len(votes.get(vote_type, ())) for vote_type in VOTE_TYPES}
+
+
+class TallyStore:
+    """In-process running tally of the latest submission per user.
+
+    The full vote history is kept in a compact VoteColumns store and tallied once at seed
+    time; after that, a new ballot is appended to the history, retracts the user's
+    previous submission from the per-game voter lists and applies the new one.
+    Produces exactly the same payload as the full-scan compute_formatted_results().
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._games = []
+        self._user_names = {}      # user id -> name
+        self._user_rows = 0        # number of user rows (total_voters)
+        self._columns = VoteColumns()
+        self._latest = array('i')  # player code -> latest submission number
+        self._ballots = {}         # player code -> [tally key, ...] counted in the latest submission
+        self._voters = {}          # tally key -> [player code, ...] in vote order
+        self._cached = None
+        self._cached_vote_set = None
+
+    def seed(self, users, votes, games):
+        """Rebuild the tally from scratch (startup, imports, consistency repair).
+        `votes` is a VoteColumns or an iterable of vote dicts."""
+        users = list(users)
+        columns = votes if isinstance(votes, VoteColumns) else VoteColumns.from_dicts(votes)
+        with self._lock:
+            self._games = list(games)
+            self._user_names = {u.get('id'): u.get('name') for u in users}
+            self._user_rows = len(users)
+            self._columns = columns
+            self._latest = columns.latest_submissions(users)
+            self._voters = columns.tally(self._latest)
+            ballots = {}
+            for key, players in self._voters.items():
+                for p in players:
+                    ballots.setdefault(p, []).append(key)
+            self._ballots = ballots
+            self._cached = None
+            self._cached_vote_set = None
+
+    def set_games(self, games):
+        with self._lock:
+            self._games = list(games)
+            self._cached = None
+            self._cached_vote_set = None
+
+    def apply_ballot(self, user_id, user_name, submission, votes, new_user=False, voted_at=None):
+        """Apply a freshly recorded submission.
+        `votes` is an iterable of (game_id, vote_type) pairs for that submission.
+        """
+        votes = list(votes)
+        with self._lock:
+            columns = self._columns
+            columns.players.intern(user_id)
+            columns.extend((user_id, game_id, vote_type, submission, voted_at) for game_id, vote_type in votes)
+            p = columns.players.codes[user_id]
+            while len(self._latest) <= p:
+                self._latest.append(1)
+            self._retract(p)
+            if new_user:
+                self._user_rows += 1
+            self._user_names[user_id] = user_name
+            self._latest[p] = submission
+            keys = []
+            for game_id, vote_type in votes:
+                code = vote_code(vote_type)
+                if code:
+                    key = tally_key(columns.games.codes[str(game_id)], code)
+                    self._voters.setdefault(key, []).append(p)
+                    keys.append(key)
+            self._ballots[p] = keys
+            self._cached = None
+            self._cached_vote_set = None
+
+    def results(self):
+        """Return the formatted results. The returned dict is shared; do not mutate it."""
+        with self._lock:
+            if self._cached is None:
+                self._cached = format_results(self._games, self._per_game(), self._user_rows)
+            return self._cached
+
+    def memory_stats(self):
+        with self._lock:
+            return {'vote_rows': len(self._columns), 'column_bytes': self._columns.nbytes(),
+                    'players': len(self._columns.players), 'current_ballots': len(self._ballots)}
+
+    def vote_set(self):
+        """Current ballots as a VoteSet (voter keys are player codes), the input scoring
+        engines rank. Cached until the next change."""
+        with self._lock:
+            if self._cached_vote_set is None:
+                self._cached_vote_set = VoteSet(
+                    self._games, per_game_voters(self._games, self._columns, self._voters), self._user_rows)
+            return self._cached_vote_set
+
+    def history_view(self):
+        """(columns, rows, games, labels) for historical queries: the vote history, how many of
+        its rows are complete, the game list and user names by player code."""
+        with self._lock:
+            columns = self._columns
+            names = [self._user_names.get(user_id, 'Unknown') for user_id in columns.players.values]
+            return columns, len(columns), self._games, names
+
+    def _per_game(self):
+        columns = self._columns
+        names = [self._user_names.get(user_id, 'Unknown') for user_id in columns.players.values]
+        return per_game_voters(self._games, columns, self._voters, names)
+
+    def _retract(self, p):
+        for key in set(self._ballots.pop(p, ())):
+            voters = self._voters.get(key)
+            if voters:
+                voters[:] = [u for u in voters if u != p]
+
+
+def per_game_voters(games, columns, voters, labels=None):
+    """Turn {tally key: [player code, ...]} into per-game lists keyed by vote type, holding
+    `labels[code]` (e.g. user names, as format_results() wants) or the player codes themselves."""
+    per_game = {}
+    for game in games:
+        game_id = str(game['id'])
+        game_code = columns.games.get(game_id)
+        per_game[game_id] = {
+            vote_type: _labelled(voters.get(tally_key(game_code, VOTE_CODES[vote_type]), ()), labels)
+            if game_code is not None else []
+            for vote_type in VOTE_TYPES
+        }
+    return per_game
+
+
+def _labelled(codes, labels):
+    return [labels[p] for p in codes] if labels is not None else list(codes)
+
+
+def tally_columns(users, columns, games):
+    """Full-scan results straight from a VoteColumns history (no incremental state)."""
+    users = list(users)
+    voters = columns.tally(columns.latest_submissions(users))
+    user_names = {u.get('id'): u.get('name') for u in users}
+    names = [user_names.get(user_id, 'Unknown') for user_id in columns.players.values]
+    return format_results(games, per_game_voters(games, columns, voters, names), len(users))
+
+
+class VersionedCache:
+    """Computed results keyed by request parameters, valid for one data version.
+    A new version drops everything; at most `max_entries` keys are kept."""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._version = None
+        self._entries = OrderedDict()
+
+    def get(self, version, key, compute):
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._entries.clear()
+            elif key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        result = compute()
+        with self._lock:
+            if version == self._version:
+                self._entries[key] = result
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return result
@@ -0,0 +1,122 @@
+import os
+import socket
+import socketserver
+import sys
+import threading
+
+import pytest
+
+# The app is a set of top-level modules; make them importable from the tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    """Minimal plain-text SMTP server: records messages and connections, and can drop
+    every open connection to simulate a server-side timeout."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+        self.messages = []      # (connection number, envelope recipients, raw data)
+        self.connections = 0
+        self.refused_recipients = set()  # answered with 550
+        self._open = []
+        self._lock = threading.Lock()
+        self.received = threading.Condition(self._lock)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def drop_connections(self):
+        with self._lock:
+            handlers, self._open = self._open, []
+        for handler in handlers:
+            try:
+                handler.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def wait_for_messages(self, count, timeout=5.0):
+        with self.received:
+            return self.received.wait_for(lambda: len(self.messages) >= count, timeout)
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server
+        with server._lock:
+            server.connections += 1
+            number = server.connections
+            server._open.append(self)
+        recipients = []
+        try:
+            self._reply('220 stub ESMTP')
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    return
+                command = line.decode('ascii', 'replace').strip()
+                verb = command.split(' ', 1)[0].upper()
+                if verb in ('EHLO', 'HELO'):
+                    self._reply('250 stub')
+                elif verb == 'MAIL':
+                    recipients = []
+                    self._reply('250 OK')
+                elif verb == 'RCPT':
+                    recipient = command.split(':', 1)[1].strip().strip('<>')
+                    if recipient in server.refused_recipients:
+                        self._reply('550 No such user')
+                    else:
+                        recipients.append(recipient)
+                        self._reply('250 OK')
+                elif verb == 'DATA':
+                    self._reply('354 End data with <CR><LF>.<CR><LF>')
+                    data = []
+                    while True:
+                        chunk = self.rfile.readline()
+                        if not chunk or chunk.rstrip(b'\r\n') == b'.':
+                            break
+                        data.append(chunk)
+                    with server.received:
+                        server.messages.append((number, recipients, b''.join(data).decode('utf-8', 'replace')))
+                        server.received.notify_all()
+                    self._reply('250 OK queued')
+                elif verb == 'QUIT':
+                    self._reply('221 Bye')
+                    return
+                else:
+                    self._reply('250 OK')
+        except OSError:
+            return
+
+    def _reply(self, text):
+        self.wfile.write((text + '\r\n').encode('ascii'))
+
+
+@pytest.fixture
+def smtp_stub():
+    server = SMTPStub()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """The app, imported once against a temporary database (configuration is read at import)."""
+    data_dir = tmp_path_factory.mktemp('data')
+    os.environ.update(STORAGE_BACKEND='sqlite', DB_PATH=str(data_dir / 'db.json'), ENRICH_STEAM='0',
+                      ENRICH_BATCH_SECONDS='0.05')
+    for name in ('SQLITE_PATH', 'SMTP_SERVER', 'ADMIN_TOKEN', 'BALLOT_LOG', 'METRICS_DIR'):
+        os.environ.pop(name, None)
+    import app
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
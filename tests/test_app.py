@@ -0,0 +1,123 @@
+import gzip
+import io
+import json
+from urllib.parse import parse_qs, unquote_plus, urlparse
+
+import pytest
+
+
+@pytest.mark.parametrize('votes', [{'1': ['x']}, {'1': {'a': 1}}, {'1': 7}, {'1': 'loved-it'}])
+def test_vote_rejects_unknown_vote_values(client, votes):
+    response = client.post('/vote', json={'user_name': 'mallory', 'votes': votes})
+    assert response.status_code == 400
+    assert response.json['success'] is False
+
+
+@pytest.mark.parametrize('body', [['not', 'a', 'dict'], {'user_name': 5}, {'user_name': 'eve', 'votes': ['1']}])
+def test_vote_rejects_malformed_ballots(client, body):
+    assert client.post('/vote', json=body).status_code == 400
+
+
+def test_vote_accepts_the_voting_page_values(client):
+    votes = {'1': 'interested', '2': 'maybe', '3': 'not-interested', '4': ''}
+    response = client.post('/vote', json={'user_name': 'walter', 'votes': votes})
+    assert response.status_code == 200
+    assert response.json['success'] is True
+
+
+def _weighted_entry(client, game_id):
+    ranking = client.get('/api/results?engine=weighted').json['ranking']
+    return next(entry for entry in ranking if entry['id'] == game_id)
+
+
+def test_voting_page_not_interested_counts_against_the_game(client):
+    before = _weighted_entry(client, '6')
+    response = client.post('/vote', json={'user_name': 'nadia', 'votes': {'6': 'not-interested'}})
+    assert response.status_code == 200
+
+    after = _weighted_entry(client, '6')
+    assert after['not_interested_count'] == before['not_interested_count'] + 1
+    assert after['score'] == before['score'] - 1
+    game = next(game for game in client.get('/api/results').json['games'] if game['id'] == '6')
+    assert 'nadia' in game['not_interested']
+
+
+def test_timeline_plots_voting_page_not_interested_votes(client):
+    client.post('/vote', json={'user_name': 'trudy', 'votes': {'7': 'not-interested'}})
+    timeline = client.get('/api/results/timeline?games=7').json
+    assert timeline['games'][0]['not_interested'][-1] >= 1
+
+
+def _gzipped_backup(rows=200):
+    lines = [json.dumps({'type': 'header', 'version': 1})]
+    lines += [json.dumps({'table': 'users', 'row': {'id': 1000 + i, 'name': f'imported{i}'}}) for i in range(rows)]
+    return gzip.compress('\n'.join(lines).encode('utf-8'))
+
+
+@pytest.mark.parametrize('damage', ['truncated', 'corrupt'])
+def test_import_rejects_damaged_gzip_uploads(client, damage):
+    data = _gzipped_backup()
+    if damage == 'truncated':
+        data = data[:len(data) // 2]
+    else:
+        data = data[:20] + bytes(b ^ 0xFF for b in data[20:60]) + data[60:]
+    response = client.post('/admin/import', data={'mode': 'merge', 'backup_file': (io.BytesIO(data), 'backup.ndjson.gz')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 302
+    assert 'Invalid backup' in unquote_plus(response.headers['Location'])
+
+
+def test_live_streams_beyond_the_limit_get_503(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module.live_results, 'max_subscribers', 1)
+    first = client.get('/api/results/stream', buffered=False)
+    assert first.status_code == 200
+    assert first.mimetype == 'text/event-stream'
+
+    rejected = client.get('/api/results/stream')
+    assert rejected.status_code == 503
+    assert rejected.headers['Retry-After'] == '30'
+
+    # Closing the open stream frees its slot
+    first.close()
+    assert app_module.live_results.stats()['subscribers'] == 0
+    second = client.get('/api/results/stream', buffered=False)
+    assert second.status_code == 200
+    second.close()
+
+
+@pytest.mark.parametrize('as_of', ['9' * 30, '1e999', 'yesterday', '0001-01-01T00:00:00+01:00'])
+def test_results_reject_unusable_as_of(client, as_of):
+    assert client.get('/api/results', query_string={'as_of': as_of}).status_code == 400
+
+
+@pytest.mark.parametrize('max_price', ['nan', 'inf', '-Infinity', 'cheap'])
+def test_games_reject_unusable_max_price(client, max_price):
+    assert client.get('/api/games', query_string={'max_price': max_price}).status_code == 400
+
+
+def test_games_filter_by_max_price(client):
+    everything = client.get('/api/games', query_string={'limit': '200'}).json['items']
+    priced = [game['id'] for game in everything if game['price_value']]
+    assert priced
+
+    response = client.get('/api/games', query_string={'max_price': '0', 'limit': '200'})
+    assert response.status_code == 200
+    games = response.json['items']
+    assert games
+    assert all(game['price_value'] is not None and game['price_value'] <= 0 for game in games)
+    assert not set(priced) & {game['id'] for game in games}
+
+
+def test_add_game_turns_away_a_catalog_duplicate(client):
+    response = client.post('/add_game', data={'title': '7 days to DIE!', 'url': 'https://example.com/7dtd'})
+    assert response.status_code == 302
+    location = unquote_plus(response.headers['Location'])
+    assert 'error=7 Days to Die is already on the list' in location
+
+
+def test_add_game_returns_a_reference_to_the_submission(app_module, client):
+    response = client.post('/add_game', data={'title': 'Deep Rock Galactic', 'url': 'https://example.com/drg'})
+    message = parse_qs(urlparse(response.headers['Location']).query)['success'][0]
+    ticket = message.rsplit('reference ', 1)[1].rstrip(').')
+    assert app_module.enrichment.drain(5)
+    assert app_module.enrichment.status(ticket)['state'] == 'stored'
@@ -0,0 +1,156 @@
+import json
+
+import pytest
+
+from ballotlog import BallotLogStorage
+from storage import SQLiteStorage, TinyDBStorage
+
+
+@pytest.fixture(params=['sqlite', 'tinydb'])
+def paths(request, tmp_path):
+    if request.param == 'sqlite':
+        return SQLiteStorage, str(tmp_path / 'db.sqlite3'), str(tmp_path / 'db.ballots')
+    return TinyDBStorage, str(tmp_path / 'db.json'), str(tmp_path / 'db.ballots')
+
+
+def open_log(paths):
+    """A log that only compacts when asked (and on startup)."""
+    backend, db_path, log_path = paths
+    inner = backend(db_path)
+    return inner, BallotLogStorage(inner, log_path, commit_window=0, compact_seconds=3600, compact_entries=10 ** 6)
+
+
+def vote(log, name, *games, when='2026-10-01T12:00:00'):
+    return log.record_ballot(name, [(game_id, 'interested') for game_id in games], when)
+
+
+def test_reads_merge_the_log_without_compacting(paths):
+    inner, log = open_log(paths)
+    vote(log, 'alice', '1', '2', when='2026-10-01T12:00:00')
+    vote(log, 'bob', '3', when='2026-10-01T12:00:01')
+    vote(log, 'alice', '4', when='2026-10-01T12:00:02')
+
+    assert inner.all_votes() == []
+    assert log.count_users() == 2
+    assert not log.is_empty()
+    assert {(user['name'], user['submission']) for user in log.all_users()} == {('alice', 2), ('bob', 1)}
+    assert len(log.all_votes()) == 4
+
+    rows, cursor = log.vote_history(2)
+    assert [(row['user'], row['game_id']) for row in rows] == [('alice', '4'), ('bob', '3')]
+    rows, cursor = log.vote_history(2, cursor=cursor)
+    assert [row['game_id'] for row in rows] == ['2', '1']
+    assert cursor is None
+    assert [row['game_id'] for row in log.vote_history(10, user='bob')[0]] == ['3']
+
+    exported = list(log.iter_snapshot())
+    assert [table for table, _row in exported] == ['users', 'users', 'votes', 'votes', 'votes', 'votes']
+    assert log.stats()['compactions'] == 0
+    assert inner.all_votes() == []
+
+
+def test_history_pages_across_storage_and_log(paths):
+    inner, log = open_log(paths)
+    vote(log, 'alice', '1', '2', when='2026-10-01T12:00:00')
+    vote(log, 'bob', '3', '4', when='2026-10-01T12:00:02')
+    log.compact()
+    vote(log, 'carol', '5', when='2026-10-01T12:00:01')
+    vote(log, 'dave', '6', when='2026-10-01T12:00:03')
+
+    seen, cursor = [], None
+    while True:
+        rows, cursor = log.vote_history(2, cursor=cursor)
+        seen.extend(row['game_id'] for row in rows)
+        if cursor is None:
+            break
+    assert seen == ['6', '4', '3', '5', '2', '1']
+
+
+def test_startup_replays_the_log(paths):
+    _inner, log = open_log(paths)
+    vote(log, 'alice', '1', '2')
+    vote(log, 'bob', '3')
+    generation = log.generation()
+
+    # Another process (or a restart after a crash) opens the same files
+    inner, reopened = open_log(paths)
+    assert len(inner.all_votes()) == 3
+    assert {user['name'] for user in inner.all_users()} == {'alice', 'bob'}
+    assert reopened.generation() == generation
+    assert reopened.stats()['uncompacted_entries'] == 0
+    assert vote(reopened, 'alice', '4')[:3] == (1, 2, False)
+
+
+def test_entries_applied_before_a_crash_are_not_applied_twice(paths):
+    inner, log = open_log(paths)
+    vote(log, 'alice', '1', '2')
+    vote(log, 'bob', '3')
+    # Compaction wrote the entries to storage, then the process died before starting a fresh log
+    _log_id, entries, _end = log._read_log()
+    inner.apply_logged_ballots(entries)
+
+    assert len(log.all_votes()) == 3
+    assert log.count_users() == 2
+    inner, reopened = open_log(paths)
+    assert len(inner.all_votes()) == 3
+    assert len(inner.all_users()) == 2
+
+
+def test_a_torn_tail_is_truncated(paths):
+    _inner, log = open_log(paths)
+    vote(log, 'alice', '1')
+    # A process crashed halfway through an append; that ballot was never acknowledged
+    with open(log.path, 'ab') as f:
+        f.write(b'{"seq":2,"generation":9,"user_id"')
+
+    assert len(log.all_votes()) == 1
+    vote(log, 'bob', '2')
+    with open(log.path, 'rb') as f:
+        lines = f.read().splitlines()
+    assert [json.loads(line).get('name') for line in lines[1:]] == ['alice', 'bob']
+
+    inner, _reopened = open_log(paths)
+    assert sorted(v['game_id'] for v in inner.all_votes()) == ['1', '2']
+
+
+def test_export_includes_logged_ballots(paths):
+    _inner, log = open_log(paths)
+    vote(log, 'alice', '1')
+    log.compact()
+    vote(log, 'alice', '2')
+    vote(log, 'bob', '3')
+
+    tables = {'users': [], 'votes': [], 'submitted_games': []}
+    for table, row in log.iter_snapshot():
+        tables[table].append(row)
+    assert {(user['name'], user['submission']) for user in tables['users']} == {('alice', 2), ('bob', 1)}
+    assert sorted(v['game_id'] for v in tables['votes']) == ['1', '2', '3']
+
+
+def test_legacy_rows_without_a_submission_are_indexed(paths):
+    backend, db_path, _log_path = paths
+    backend(db_path).bulk_import([
+        ('users', {'id': 1, 'name': 'alice', 'voted_at': '2024-01-01T00:00:00', 'submission': None}),
+        ('votes', {'player_id': 1, 'game_id': '1', 'vote': 'interested', 'submission': None}),
+    ])
+    _inner, log = open_log(paths)
+    assert vote(log, 'alice', '2')[:3] == (1, 2, False)
+
+
+def test_reads_reuse_the_storage_log_position(paths, monkeypatch):
+    inner, log = open_log(paths)
+    vote(log, 'alice', '1')
+    calls = []
+    ballot_log_position = inner.ballot_log_position
+    monkeypatch.setattr(inner, 'ballot_log_position', lambda: calls.append(1) or ballot_log_position())
+
+    for _ in range(5):
+        log.all_votes()
+        log.vote_history(10)
+    assert calls == []  # read once when the log was opened
+
+    # A compaction elsewhere moves the storage generation, so the position is read again
+    _log_id, entries, _end = log._read_log()
+    inner.apply_logged_ballots(entries)
+    assert len(log.all_votes()) == 1
+    assert len(calls) == 1
@@ -0,0 +1,64 @@
+import pytest
+
+from catalog import CatalogIndex, normalize_title, parse_player_range, parse_price
+
+GAMES = [
+    {'id': 1, 'title': 'Deep Rock Galactic', 'price': '$29.99', 'max_players': '4'},
+    {'id': 2, 'title': 'Rocket League', 'price': 'FREE', 'max_players': '8'},
+    {'id': 3, 'title': 'Age of Empires II: Definitive Edition', 'price': '$19.99', 'max_players': '8'},
+    {'id': 4, 'title': 'Dungeons & Dragons Online', 'price': 'Free to Play', 'max_players': 'Parties up to 6'},
+    {'id': 5, 'title': 'Lethal Company', 'price': 'N/A', 'max_players': 'N/A'},
+]
+
+
+def titles(index, query='', **filters):
+    return [GAMES[i]['title'] for i in index.search(query, **filters)]
+
+
+@pytest.mark.parametrize('title, normalized', [
+    ('Age of Empires II: Definitive Edition', 'age of empires ii definitive edition'),
+    ('Dungeons & Dragons Online', 'dungeons and dragons online'),
+    ('  7 days to DIE! ', '7 days to die'),
+    ('Tom_Clancy’s  Rainbow-Six', 'tom clancy s rainbow six'),
+    (None, ''),
+])
+def test_normalize_title(title, normalized):
+    assert normalize_title(title) == normalized
+
+
+def test_index_parses_titles_prices_and_players():
+    index = CatalogIndex(GAMES)
+    assert index.titles[3] == 'dungeons and dragons online'
+    assert index.prices == [29.99, 0.0, 19.99, 0.0, None]
+    assert index.players == [(4, 4), (8, 8), (8, 8), (1, 6), None]
+    item = index.item(3)
+    assert (item['price_value'], item['min_players'], item['max_players_value']) == (0.0, 1, 6)
+    assert parse_price('$20.99 / 4-Pack $59.99') == 20.99
+    assert parse_player_range('8 / 12') == (8, 12)
+
+
+def test_prefix_search_ranks_title_starts_first():
+    index = CatalogIndex(GAMES)
+    assert titles(index, 'rock') == ['Rocket League', 'Deep Rock Galactic']
+    assert titles(index, 'deep ro') == ['Deep Rock Galactic']
+    assert titles(index, 'emp def') == ['Age of Empires II: Definitive Edition']
+    assert titles(index, 'D&D') == ['Dungeons & Dragons Online']
+
+
+def test_trigram_search_tolerates_typos():
+    index = CatalogIndex(GAMES)
+    assert titles(index, 'galatic') == ['Deep Rock Galactic']
+    assert titles(index, 'lethal compnay') == ['Lethal Company']
+    assert titles(index, 'minecraft') == []
+
+
+def test_search_filters():
+    index = CatalogIndex(GAMES)
+    assert titles(index, free=True) == ['Rocket League', 'Dungeons & Dragons Online']
+    assert titles(index, max_price=20) == ['Rocket League', 'Age of Empires II: Definitive Edition',
+                                           'Dungeons & Dragons Online']
+    assert titles(index, players=6) == ['Rocket League', 'Age of Empires II: Definitive Edition',
+                                        'Dungeons & Dragons Online']
+    assert titles(index, sort='price') == ['Dungeons & Dragons Online', 'Rocket League',
+                                           'Age of Empires II: Definitive Edition', 'Deep Rock Galactic',
+                                           'Lethal Company']
@@ -0,0 +1,51 @@
+import threading
+import time
+
+
+def test_local_vote_bursts_do_not_trigger_full_reloads(app_module, monkeypatch):
+    reloads = []
+    reload_from_storage = app_module.reload_from_storage
+
+    def counting_reload():
+        reloads.append(1)
+        reload_from_storage()
+
+    monkeypatch.setattr(app_module, 'reload_from_storage', counting_reload)
+    record_ballot = app_module.storage.record_ballot
+
+    def slow_record_ballot(*args, **kwargs):
+        # Widen the gap between the storage write and its in-memory delta
+        result = record_ballot(*args, **kwargs)
+        time.sleep(0.005)
+        return result
+
+    monkeypatch.setattr(app_module.storage, 'record_ballot', slow_record_ballot)
+    done = threading.Event()
+    errors = []
+
+    def voter(n):
+        client = app_module.app.test_client()
+        for i in range(10):
+            response = client.post('/vote', json={'user_name': f'burst{n}', 'votes': {str(i % 5 + 1): 'interested'}})
+            if response.status_code != 200:
+                errors.append(response.status_code)
+
+    def reader():
+        client = app_module.app.test_client()
+        while not done.is_set():
+            if client.get('/api/results').status_code != 200:
+                errors.append('results')
+
+    readers = [threading.Thread(target=reader) for _ in range(5)]
+    voters = [threading.Thread(target=voter, args=(n,)) for n in range(10)]
+    for thread in readers + voters:
+        thread.start()
+    for thread in voters:
+        thread.join()
+    done.set()
+    for thread in readers:
+        thread.join()
+
+    assert errors == []
+    assert reloads == []
+    assert app_module.check_tally_consistency()
@@ -0,0 +1,71 @@
+import threading
+import time
+
+from enrichment import EnrichmentPipeline
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('timed out')
+        time.sleep(0.005)
+
+
+def test_price_comes_from_the_price_fetcher():
+    stored, fetched = [], []
+
+    def fetch_price(app_id):
+        fetched.append(app_id)
+        return {'success': True, 'price_overview': {'final_formatted': '$4.99'}}, 200
+
+    def write(games):
+        stored.extend(games)
+        return list(range(1000, 1000 + len(games)))
+
+    pipeline = EnrichmentPipeline(lambda: [], fetch_price, write, batch_seconds=0.01)
+    ticket = pipeline.submit({'title': 'Portal', 'steam_app_id': '400', 'price': '20'})
+    assert pipeline.drain(5)
+
+    assert fetched == ['400']
+    assert stored[0]['price'] == '$4.99'
+    assert pipeline.status(ticket)['state'] == 'stored'
+
+
+def test_find_duplicate_matches_catalog_games_by_normalized_title():
+    catalog = [{'id': 1, 'title': 'Among Us'}]
+    pipeline = EnrichmentPipeline(lambda: catalog, None, lambda games: [])
+    assert pipeline.find_duplicate({'title': 'among us!'})['id'] == 1
+    assert pipeline.find_duplicate({'title': 'Among Them'}) is None
+
+
+def test_failed_write_finishes_each_ticket_once():
+    state = {'catalog': []}
+    gate = threading.Event()
+
+    def fetch_price(app_id):
+        gate.wait(5)
+        return {'success': True, 'price_overview': {}}, 200
+
+    def write(games):
+        raise OSError('disk full')
+
+    pipeline = EnrichmentPipeline(lambda: state['catalog'], fetch_price, write, batch_seconds=0.5,
+                                  write_attempts=2, retry_seconds=0)
+    portal = pipeline.submit({'title': 'Portal', 'steam_app_id': '400'})
+    half_life = pipeline.submit({'title': 'Half-Life', 'steam_app_id': '70'})
+    wait_until(lambda: all(pipeline.status(t)['state'] == 'enriching' for t in (portal, half_life)))
+    # Another process stores Portal while both are being enriched
+    state['catalog'] = [{'id': 7, 'title': 'Portal'}]
+    gate.set()
+
+    assert pipeline.drain(5)
+    assert pipeline.status(portal)['state'] == 'duplicate'
+    assert pipeline.status(portal)['duplicate_of']['id'] == 7
+    assert pipeline.status(half_life)['state'] == 'failed'
+    assert pipeline.status(half_life)['error'] == 'write: disk full'
+    stats = pipeline.stats()
+    assert stats['in_progress'] == 0
+    assert (stats['duplicates'], stats['failed'], stats['stored']) == (1, 1, 0)
+    assert stats['write_failures'] == 2
+    assert stats['workers_alive'] == 2
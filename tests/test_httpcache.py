@@ -0,0 +1,65 @@
+import gzip
+import json
+
+from httpcache import VersionedBody
+
+
+def test_versioned_body_renders_once_per_version():
+    body = VersionedBody()
+    renders = []
+
+    def render():
+        renders.append(1)
+        return f'version {len(renders)}'
+
+    assert body.get(1, render)[0] == b'version 1'
+    raw, gzipped = body.get(1, render)
+    assert raw == b'version 1'
+    assert gzip.decompress(gzipped) == raw
+    assert body.get(2, render)[0] == b'version 2'
+    assert body.renders == len(renders) == 2
+
+
+def test_results_answer_304_while_the_etag_matches(client):
+    first = client.get('/api/results')
+    etag = first.headers['ETag']
+    assert first.status_code == 200
+    assert etag.startswith('W/"')
+    assert first.headers['Cache-Control'] == 'no-cache'
+
+    again = client.get('/api/results', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.data == b''
+    assert again.headers['ETag'] == etag
+
+
+def test_etag_changes_after_a_vote(client):
+    etag = client.get('/api/results').headers['ETag']
+    assert client.post('/vote', json={'user_name': 'etta', 'votes': {'2': 'interested'}}).status_code == 200
+
+    fresh = client.get('/api/results', headers={'If-None-Match': etag})
+    assert fresh.status_code == 200
+    assert fresh.headers['ETag'] != etag
+    assert 'etta' in next(game for game in fresh.json['games'] if game['id'] == '2')['interested']
+    assert client.get('/').headers['ETag'] != etag
+
+
+def test_gzip_is_negotiated(client):
+    plain = client.get('/api/results')
+    assert 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.headers['Vary']
+
+    compressed = client.get('/api/results', headers={'Accept-Encoding': 'gzip, deflate'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert json.loads(gzip.decompress(compressed.data)) == plain.json
+    # Same version either way, so the ETag is shared
+    assert compressed.headers['ETag'] == plain.headers['ETag']
+
+
+def test_index_page_is_gzipped_and_conditional(client):
+    page = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert page.status_code == 200
+    assert page.headers['Content-Encoding'] == 'gzip'
+    assert b'<html' in gzip.decompress(page.data).lower()
+    assert client.get('/', headers={'If-None-Match': page.headers['ETag']}).status_code == 304
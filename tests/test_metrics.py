@@ -0,0 +1,60 @@
+import re
+
+from metrics import Registry
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})? (\S+)$')
+
+
+def samples(text):
+    """{'name{labels}': value} for every sample line; fails on anything that is not exposition format."""
+    values = {}
+    for line in text.splitlines():
+        if line.startswith('# HELP ') or line.startswith('# TYPE '):
+            continue
+        match = SAMPLE.match(line)
+        assert match, f'not a sample line: {line!r}'
+        values[match.group(1) + (match.group(2) or '')] = float(match.group(3))
+    return values
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    errors = registry.counter('demo_errors_total', 'Errors.', ('span',))
+    seconds = registry.histogram('demo_seconds', 'Time.', ('span',), buckets=(0.1, 1.0))
+    errors.inc('db')
+    errors.inc('db', amount=2)
+    seconds.observe(0.05, 'db')
+    seconds.observe(0.5, 'db')
+    seconds.observe(3, 'db')
+
+    assert registry.render().splitlines() == [
+        '# HELP demo_errors_total Errors.',
+        '# TYPE demo_errors_total counter',
+        'demo_errors_total{span="db"} 3',
+        '# HELP demo_seconds Time.',
+        '# TYPE demo_seconds histogram',
+        'demo_seconds_bucket{span="db",le="0.1"} 1',
+        'demo_seconds_bucket{span="db",le="1"} 2',
+        'demo_seconds_bucket{span="db",le="+Inf"} 3',
+        'demo_seconds_sum{span="db"} 3.55',
+        'demo_seconds_count{span="db"} 3',
+    ]
+    # Worker snapshots merge by adding up
+    merged = samples(registry.render([registry.snapshot(), registry.snapshot()]))
+    assert merged['demo_errors_total{span="db"}'] == 6
+    assert merged['demo_seconds_count{span="db"}'] == 6
+
+
+def test_metrics_endpoint_counts_requests_and_spans(client):
+    before = samples(client.get('/metrics').get_data(as_text=True))
+    assert client.post('/vote', json={'user_name': 'metra', 'votes': {'3': 'maybe'}}).status_code == 200
+    response = client.get('/metrics')
+    assert response.mimetype == 'text/plain'
+    after = samples(response.get_data(as_text=True))
+
+    vote_requests = 'lan_vote_request_seconds_count{method="POST",route="/vote",status="200"}'
+    record_ballot = 'lan_vote_span_seconds_count{span="storage.record_ballot"}'
+    assert after[vote_requests] == before.get(vote_requests, 0) + 1
+    assert after[record_ballot] == before.get(record_ballot, 0) + 1
+    assert after['lan_vote_request_seconds_bucket{method="POST",route="/vote",status="200",le="+Inf"}'] == \
+        after[vote_requests]
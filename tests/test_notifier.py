@@ -0,0 +1,72 @@
+from notifier import SMTPConfig, VoteNotifier
+
+
+def summary():
+    return {'total_voters': 2, 'top_interested': [{'title': 'Among Us', 'count': 2}]}
+
+
+def make_notifier(smtp_stub, coalesce_seconds):
+    config = SMTPConfig(server='127.0.0.1', port=smtp_stub.port, sender='vote@example.com',
+                        recipient='admin@example.com', starttls=False, timeout=5)
+    return VoteNotifier(config, summary, coalesce_seconds=coalesce_seconds)
+
+
+def test_votes_within_the_window_become_one_digest(smtp_stub):
+    notifier = make_notifier(smtp_stub, coalesce_seconds=0.3)
+    for name in ('alice', 'bob', 'alice'):
+        assert notifier.notify(name)
+    notifier.close()
+
+    assert len(smtp_stub.messages) == 1
+    _connection, recipients, data = smtp_stub.messages[0]
+    assert recipients == ['admin@example.com']
+    assert '2 new votes' in data
+    assert 'alice, bob' in data
+    assert notifier.stats()['emails_sent'] == 1
+
+
+def test_connection_is_reused_across_digests(smtp_stub):
+    notifier = make_notifier(smtp_stub, coalesce_seconds=0.01)
+    notifier.notify('alice')
+    assert smtp_stub.wait_for_messages(1)
+    notifier.notify('bob')
+    assert smtp_stub.wait_for_messages(2)
+    notifier.close()
+
+    assert smtp_stub.connections == 1
+    assert [number for number, _recipients, _data in smtp_stub.messages] == [1, 1]
+    stats = notifier.stats()
+    assert stats['emails_sent'] == 2
+    assert stats['connections_opened'] == 1
+
+
+def test_reconnects_after_the_server_drops_the_connection(smtp_stub):
+    notifier = make_notifier(smtp_stub, coalesce_seconds=0.01)
+    notifier.notify('alice')
+    assert smtp_stub.wait_for_messages(1)
+    smtp_stub.drop_connections()
+    notifier.notify('bob')
+    assert smtp_stub.wait_for_messages(2)
+    notifier.close()
+
+    assert smtp_stub.connections == 2
+    assert 'bob' in smtp_stub.messages[1][2]
+    stats = notifier.stats()
+    assert stats['emails_sent'] == 2
+    assert stats['send_failures'] == 0
+    assert stats['connections_opened'] == 2
+
+
+def test_refused_recipient_fails_without_retrying(smtp_stub):
+    smtp_stub.refused_recipients.add('admin@example.com')
+    notifier = make_notifier(smtp_stub, coalesce_seconds=0.01)
+    notifier.notify('alice')
+    notifier.close()
+
+    assert smtp_stub.messages == []
+    assert smtp_stub.connections == 1
+    stats = notifier.stats()
+    assert stats['send_failures'] == 1
+    assert stats['emails_sent'] == 0
+    assert stats['connections_opened'] == 1
+    assert 'No such user' in stats['last_error']
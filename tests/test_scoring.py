@@ -0,0 +1,78 @@
+import pytest
+
+from scoring import ENGINES
+from tally import VoteSet
+
+
+def vote_set():
+    games = [
+        {'id': 1, 'title': 'Alpha', 'max_players': '4'},
+        {'id': 2, 'title': 'Beta', 'max_players': '2'},
+        {'id': 3, 'title': 'Gamma', 'max_players': 'N/A'},
+    ]
+    voters = {
+        '1': {'interested': ['v1'], 'maybe': ['v2']},
+        '2': {'interested': ['v3'], 'maybe': ['v1']},
+        '3': {'not_interested': ['v2']},
+    }
+    return VoteSet(games, voters, total_voters=3)
+
+
+def rank(name, **args):
+    engine = ENGINES[name]
+    return engine.rank(vote_set(), **engine.parse_params(args))
+
+
+def test_borda_counts_games_each_voter_ranked_lower():
+    ranking = rank('borda')
+    assert [(entry['title'], entry['score']) for entry in ranking] == [('Alpha', 4.0), ('Beta', 3.0), ('Gamma', 1.0)]
+    assert [entry['rank'] for entry in ranking] == [1, 2, 3]
+
+
+def test_approval_quorum_and_maybe():
+    ranking = rank('approval')
+    assert [(entry['title'], entry['approvals'], entry['qualifies']) for entry in ranking] == [
+        ('Alpha', 2, True), ('Beta', 2, True), ('Gamma', 0, False)]
+    assert ranking[0]['share'] == pytest.approx(0.6667)
+
+    ranking = rank('approval', include_maybe='0')
+    assert [(entry['title'], entry['approvals'], entry['qualifies']) for entry in ranking] == [
+        ('Alpha', 1, False), ('Beta', 1, False), ('Gamma', 0, False)]
+    assert [entry['qualifies'] for entry in rank('approval', include_maybe='0', quorum='0.3')] == [True, True, False]
+
+
+def test_headcount_keeps_games_that_fit_the_group():
+    assert [entry['title'] for entry in rank('headcount')] == ['Alpha']  # everyone who voted: 3
+    ranking = rank('headcount', players='2')
+    assert [(entry['title'], entry['score'], entry['max_players']) for entry in ranking] == [
+        ('Alpha', 2, 4), ('Beta', 2, 2)]
+    assert [entry['title'] for entry in rank('headcount', players='2', include_unknown='1')] == [
+        'Alpha', 'Beta', 'Gamma']
+
+
+@pytest.mark.parametrize('name, args', [('approval', {'quorum': '1.5'}), ('headcount', {'players': '0'})])
+def test_engines_reject_out_of_range_params(name, args):
+    with pytest.raises(ValueError):
+        ENGINES[name].parse_params(args)
+
+
+@pytest.mark.parametrize('name', ['borda', 'approval', 'headcount'])
+def test_results_endpoint_serves_every_engine(client, name):
+    response = client.get(f'/api/results?engine={name}&limit=2')
+    assert response.status_code == 200
+    assert response.json['engine'] == name
+    assert len(response.json['ranking']) <= 2
+
+
+def test_results_endpoint_rejects_an_unknown_engine(client):
+    response = client.get('/api/results?engine=plurality')
+    assert response.status_code == 400
+    assert response.json['success'] is False
+    assert set(response.json['engines']) >= {'weighted', 'borda', 'approval', 'headcount'}
+
+
+@pytest.mark.parametrize('limit', ['-1', 'ten'])
+def test_results_endpoint_rejects_a_bad_limit(client, limit):
+    response = client.get(f'/api/results?engine=borda&limit={limit}')
+    assert response.status_code == 400
+    assert response.json['success'] is False
@@ -0,0 +1,164 @@
+import threading
+import time
+
+from steam_media import SteamMediaCache
+
+
+class FakeFetcher:
+    """Stand-in for SteamClient.fetch_media: counts calls and answers '<key> v<call number>'."""
+
+    def __init__(self, gate=None, status=200):
+        self.gate = gate
+        self.status = status
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, key):
+        with self._lock:
+            self.calls.append(key)
+            version = len(self.calls)
+        if self.gate is not None:
+            self.gate.wait(5)
+        return {'success': self.status == 200, 'movies': [f'{key} v{version}']}, self.status
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('timed out')
+        time.sleep(0.005)
+
+
+def test_concurrent_misses_share_one_upstream_fetch():
+    gate = threading.Event()
+    fetcher = FakeFetcher(gate=gate)
+    cache = SteamMediaCache(fetcher)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('730'))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: cache.stats()['coalesced'] == 7)
+    gate.set()
+    for thread in threads:
+        thread.join()
+
+    assert fetcher.calls == ['730']
+    assert results == [({'success': True, 'movies': ['730 v1']}, 200)] * 8
+    assert cache.stats()['misses'] == 1
+
+
+def test_stale_entries_are_served_while_refreshing():
+    fetcher = FakeFetcher()
+    cache = SteamMediaCache(fetcher, ttl=0.05, stale_ttl=60)
+    assert cache.get('730')[0]['movies'] == ['730 v1']
+    time.sleep(0.1)
+
+    # Stale: the old copy comes back at once and a background refresh fetches v2
+    assert cache.get('730')[0]['movies'] == ['730 v1']
+    wait_until(lambda: cache.peek('730')[0]['movies'] == ['730 v2'])
+    assert cache.get('730')[0]['movies'] == ['730 v2']
+    stats = cache.stats()
+    assert stats['stale_hits'] == 1
+    assert stats['refreshes'] == 1
+    assert len(fetcher.calls) == 2
+
+
+def test_expired_entries_are_fetched_again():
+    fetcher = FakeFetcher()
+    cache = SteamMediaCache(fetcher, ttl=0.05, stale_ttl=0)
+    cache.get('730')
+    assert cache.get('730')[0]['movies'] == ['730 v1']
+    assert len(fetcher.calls) == 1
+    time.sleep(0.1)
+
+    assert cache.get('730')[0]['movies'] == ['730 v2']
+    assert cache.stats()['stale_hits'] == 0
+
+
+def test_no_data_answers_expire_after_the_negative_ttl():
+    fetcher = FakeFetcher(status=404)
+    cache = SteamMediaCache(fetcher, ttl=60, stale_ttl=60, negative_ttl=0.05)
+    cache.get('999')
+    cache.get('999')
+    assert len(fetcher.calls) == 1
+    time.sleep(0.1)
+
+    # Not served stale: "no data" is refetched synchronously
+    cache.get('999')
+    assert len(fetcher.calls) == 2
+
+
+def test_least_recently_used_entry_is_evicted():
+    fetcher = FakeFetcher()
+    cache = SteamMediaCache(fetcher, max_entries=2)
+    cache.get('a')
+    cache.get('b')
+    cache.get('a')  # 'b' is now the least recently used
+    cache.get('c')
+
+    assert cache.peek('b') is None
+    assert cache.peek('a') is not None and cache.peek('c') is not None
+    assert cache.stats()['evictions'] == 1
+    cache.get('b')
+    assert fetcher.calls == ['a', 'b', 'c', 'b']
+
+
+def test_size_bound_evicts_oldest_entries():
+    fetcher = FakeFetcher()
+    one_entry = len('{"success": true, "movies": ["a v1"]}')
+    cache = SteamMediaCache(fetcher, max_bytes=one_entry * 2)
+    for key in ('a', 'b', 'c'):
+        cache.get(key)
+
+    assert cache.peek('a') is None
+    assert cache.stats()['entries'] == 2
+
+
+def test_batch_misses_are_counted_once():
+    fetcher = FakeFetcher()
+    cache = SteamMediaCache(fetcher)
+    cache.get('10')
+    batches = []
+
+    def fetch_many(chunk):
+        batches.append(chunk)
+        return {key: ({'success': True, 'price_overview': {}}, 200) for key in chunk if key != '20'}
+
+    results = cache.get_many(['10', '20', '30'], fetch_many=fetch_many)
+
+    assert batches == [['20', '30']]
+    assert fetcher.calls == ['10', '20']  # '20' was missing from the batch answer
+    assert set(results) == {'10', '20', '30'}
+    stats = cache.stats()
+    assert stats['misses'] == 3
+    assert stats['upstream_calls'] == 3
+    assert stats['inflight'] == 0
+
+
+def test_batches_share_in_flight_fetches():
+    gate = threading.Event()
+    fetcher = FakeFetcher(gate=gate)
+    cache = SteamMediaCache(fetcher)
+    single = []
+    thread = threading.Thread(target=lambda: single.append(cache.get('730')))
+    thread.start()
+    wait_until(lambda: cache.stats()['inflight'] == 1)
+    batches = []
+
+    def fetch_many(chunk):
+        batches.append(chunk)
+        return {key: ({'success': True, 'movies': [f'{key} batch']}, 200) for key in chunk}
+
+    batch = []
+    waiter = threading.Thread(target=lambda: batch.append(cache.get_many(['730', '10'], fetch_many=fetch_many)))
+    waiter.start()
+    wait_until(lambda: cache.stats()['coalesced'] == 1)
+    gate.set()
+    thread.join()
+    waiter.join()
+
+    assert batches == [['10']]
+    assert fetcher.calls == ['730']
+    assert batch[0]['730'] == single[0]
+    assert cache.stats()['misses'] == 2
@@ -0,0 +1,25 @@
+import random
+
+
+def test_deltas_match_a_full_rescan(app_module, client, monkeypatch):
+    reloads = []
+    reload_from_storage = app_module.reload_from_storage
+    monkeypatch.setattr(app_module, 'reload_from_storage', lambda: reloads.append(1) or reload_from_storage())
+    rng = random.Random(1)
+    voters = [f'delta{n}' for n in range(6)]
+    choices = ('interested', 'maybe', 'not_interested', 'not-interested')
+
+    for step in range(40):
+        name = rng.choice(voters)
+        action = rng.choice(('cast', 'change', 'clear'))
+        if action == 'clear':
+            # An empty ballot is a new submission with no votes: the previous ones stop counting
+            votes = {str(game_id): '' for game_id in range(1, 6)}
+        else:
+            games = rng.sample(range(1, 9), rng.randint(1, 4) if action == 'cast' else 2)
+            votes = {str(game_id): rng.choice(choices) for game_id in games}
+        response = client.post('/vote', json={'user_name': name, 'votes': votes})
+        assert response.status_code == 200
+        assert app_module.check_tally_consistency(), f'step {step}: {action} by {name}'
+
+    assert reloads == []
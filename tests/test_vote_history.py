@@ -0,0 +1,71 @@
+import itertools
+from datetime import datetime, timedelta
+
+import pytest
+
+_moments = (datetime(2030, 1, 1) + timedelta(minutes=n) for n in itertools.count())
+
+
+@pytest.fixture
+def moment(app_module, monkeypatch):
+    """A timestamp no other test uses; every vote cast during the test gets it."""
+    frozen = next(_moments)
+
+    class FrozenDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return frozen
+
+    monkeypatch.setattr(app_module, 'datetime', FrozenDatetime)
+    return frozen.isoformat()
+
+
+@pytest.fixture
+def same_moment_votes(moment, client):
+    """Ballots that all share one timestamp, so only submission, player and row id order them."""
+    ballots = [('hana', {'1': 'interested', '2': 'maybe', '3': 'interested'}),
+               ('ivan', {'1': 'maybe', '4': 'not-interested'}),
+               ('hana', {'2': 'interested', '5': 'maybe'}),
+               ('jules', {'1': 'interested', '2': 'interested', '3': 'maybe', '4': 'maybe'})]
+    for name, votes in ballots:
+        assert client.post('/vote', json={'user_name': name, 'votes': votes}).status_code == 200
+    return sum(len(votes) for _name, votes in ballots)
+
+
+def page_through(client, moment, **params):
+    items, cursor, pages = [], None, 0
+    while True:
+        query = dict(params, since=moment, until=moment, limit=3)
+        if cursor:
+            query['cursor'] = cursor
+        body = client.get('/api/votehistory', query_string=query).json
+        assert body['success']
+        items.extend(body['items'])
+        cursor = body['next_cursor']
+        pages += 1
+        if cursor is None:
+            return items, pages
+
+
+def test_cursor_pages_have_no_gaps_or_repeats(same_moment_votes, moment, client):
+    items, pages = page_through(client, moment)
+    assert len(items) == same_moment_votes
+    assert pages == -(-same_moment_votes // 3)
+    seen = [(item['user'], item['submission'], item['game_id']) for item in items]
+    assert len(set(seen)) == len(seen)
+    order = [(item['submission'], item['player_id']) for item in items]
+    assert order == sorted(order, reverse=True)
+
+
+def test_filters_apply_across_pages(same_moment_votes, moment, client):
+    items, _pages = page_through(client, moment, user='hana')
+    first = min(item['submission'] for item in items)  # users persist across tests
+    assert sorted((item['submission'] - first, item['game_id']) for item in items) == \
+        [(0, '1'), (0, '2'), (0, '3'), (1, '2'), (1, '5')]
+    items, _pages = page_through(client, moment, game='1', vote='interested')
+    assert sorted(item['user'] for item in items) == ['hana', 'jules']
+    assert page_through(client, moment, vote='not-interested')[0][0]['user'] == 'ivan'
+
+
+def test_unknown_cursor_is_rejected(client):
+    assert client.get('/api/votehistory', query_string={'cursor': 'not-a-cursor'}).status_code == 400
@@ -0,0 +1,36 @@
+import random
+
+import pytest
+
+import votestore
+from votestore import VoteColumns
+
+
+def random_columns(seed=7, rows=5000):
+    rng = random.Random(seed)
+    votes = ('interested', 'maybe', 'not_interested', 'not-interested', 'loved-it', None)
+    return VoteColumns.from_rows(
+        (rng.randint(1, 200), str(rng.randint(1, 60)), rng.choice(votes), rng.randint(1, 4),
+         f'2026-10-01T12:{rng.randint(0, 59):02d}:00')
+        for _ in range(rows)
+    )
+
+
+def test_numpy_tally_matches_the_plain_tally(monkeypatch):
+    pytest.importorskip('numpy')
+    columns = random_columns()
+    users = [{'id': player_id, 'submission': 2} for player_id in range(1, 200, 3)]
+    latest = columns.latest_submissions(users)
+    monkeypatch.setattr(votestore, 'np', None)
+    assert columns.latest_submissions(users) == latest
+    monkeypatch.undo()
+
+    expected = columns._tally_arrays(latest)
+    assert expected
+    assert columns._tally_numpy(latest) == expected
+    assert columns.tally(latest) == expected
+
+
+def test_empty_columns_tally_to_nothing():
+    columns = VoteColumns.from_rows([])
+    assert columns.tally(columns.latest_submissions()) == {}
@@ -0,0 +1,192 @@
+"""Compact columnar storage for vote rows.
+
+Votes are kept as parallel typed arrays instead of one dict per row: user ids, game ids
+and timestamps are interned to small ints, and vote types are stored as one-byte codes.
+A row costs ~17 bytes instead of several hundred for a dict with string keys.
+
+Tallies of the current submission per user are a single pass over the arrays; with NumPy
+installed (it is in requirements.txt) the pass is vectorized (a mask, a stable argsort and
+a bincount). Without it the same tally runs as a plain loop.
+"""
+from array import array
+from enum import IntEnum
+
+try:
+    import numpy as np
+except ImportError:  # pure-Python fallback below
+    np = None
+
+
+class Vote(IntEnum):
+    OTHER = 0  # stored vote strings that don't count towards results
+    INTERESTED = 1
+    NOT_INTERESTED = 2
+    MAYBE = 3
+
+
+VOTE_CODES = {'interested': Vote.INTERESTED, 'not_interested': Vote.NOT_INTERESTED, 'maybe': Vote.MAYBE}
+VOTE_NAMES = {code: name for name, code in VOTE_CODES.items()}
+# Stored spellings read as a canonical vote: the voting page submits 'not-interested'
+VOTE_ALIASES = {'not-interested': Vote.NOT_INTERESTED}
+STORED_VOTE_CODES = dict(VOTE_CODES, **VOTE_ALIASES)
+KEY_STRIDE = 4  # tally keys are game_code * KEY_STRIDE + vote_code
+
+
+def vote_code(vote):
+    return STORED_VOTE_CODES.get(vote, Vote.OTHER) if isinstance(vote, str) else Vote.OTHER
+
+
+def tally_key(game_code, code):
+    return game_code * KEY_STRIDE + code
+
+
+def _as_int(value, default=1):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class Interner:
+    """Maps hashable values to dense int codes 0..n-1 and back."""
+    __slots__ = ('values', 'codes')
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def intern(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def get(self, value):
+        return self.codes.get(value)
+
+    def __len__(self):
+        return len(self.values)
+
+
+class VoteColumns:
+    """Append-only columnar vote history.
+
+    Columns (one entry per vote row, in storage order): `player` (interned user id),
+    `game` (interned str game id), `vote` (Vote code), `submission`, and `voted_at`
+    (interned ISO timestamp; every vote of a ballot shares one).
+    """
+    __slots__ = ('player', 'game', 'vote', 'submission', 'voted_at', 'players', 'games', 'timestamps')
+
+    def __init__(self):
+        self.player = array('i')
+        self.game = array('i')
+        self.vote = array('b')
+        self.submission = array('i')
+        self.voted_at = array('i')
+        self.players = Interner()
+        self.games = Interner()
+        self.timestamps = Interner()
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from (player_id, game_id, vote, submission, voted_at) tuples."""
+        columns = cls()
+        columns.extend(rows)
+        return columns
+
+    @classmethod
+    def from_dicts(cls, votes):
+        """Build from vote dicts as stored; rows without a player_id are skipped."""
+        return cls.from_rows(
+            (v.get('player_id'), v.get('game_id'), v.get('vote'), v.get('submission', 1), v.get('voted_at'))
+            for v in votes
+        )
+
+    def extend(self, rows):
+        # Hot path for seeding (100k+ rows): interning is inlined as dict.setdefault calls
+        player_codes, player_values = self.players.codes, self.players.values
+        game_codes, game_values = self.games.codes, self.games.values
+        time_codes, time_values = self.timestamps.codes, self.timestamps.values
+        player, game, vote, submission, voted_at = self.player, self.game, self.vote, self.submission, self.voted_at
+        codes = STORED_VOTE_CODES
+        for player_id, game_id, vote_type, sub, when in rows:
+            if player_id is None:
+                continue
+            p = player_codes.setdefault(player_id, len(player_values))
+            if p == len(player_values):
+                player_values.append(player_id)
+            game_id = str(game_id)
+            g = game_codes.setdefault(game_id, len(game_values))
+            if g == len(game_values):
+                game_values.append(game_id)
+            t = time_codes.setdefault(when, len(time_values))
+            if t == len(time_values):
+                time_values.append(when)
+            player.append(p)
+            game.append(g)
+            vote.append(codes.get(vote_type, 0) if isinstance(vote_type, str) else 0)
+            submission.append(sub if type(sub) is int else _as_int(sub))
+            voted_at.append(t)
+
+    def append(self, player_id, game_id, vote_type, sub, when):
+        self.extend(((player_id, game_id, vote_type, sub, when),))
+
+    def __len__(self):
+        return len(self.player)
+
+    def nbytes(self):
+        """Approximate size of the columns themselves (interner tables not included)."""
+        return sum(col.itemsize * len(col) for col in (self.player, self.game, self.vote, self.submission, self.voted_at))
+
+    def latest_submissions(self, users=()):
+        """Latest submission per interned player: the user row's 'submission' (when present,
+        else 1), raised to the highest submission among that player's votes."""
+        for u in users:
+            self.players.intern(u.get('id'))
+        latest = array('i', [1]) * len(self.players)
+        for u in users:
+            if 'submission' in u:
+                latest[self.players.codes[u.get('id')]] = _as_int(u.get('submission'))
+        if np is not None and len(self):
+            latest_np = np.frombuffer(latest, dtype=np.intc).copy()
+            np.maximum.at(latest_np, np.frombuffer(self.player, dtype=np.intc),
+                          np.frombuffer(self.submission, dtype=np.intc))
+            return array('i', latest_np.tobytes())
+        for p, sub in zip(self.player, self.submission):
+            if sub > latest[p]:
+                latest[p] = sub
+        return latest
+
+    def tally(self, latest):
+        """Voters of each counted (game, vote) for rows in each player's `latest` submission.
+        Returns {tally_key(game_code, vote_code): [player code, ...]} in storage order."""
+        if not len(self):
+            return {}
+        if np is not None:
+            return self._tally_numpy(latest)
+        return self._tally_arrays(latest)
+
+    def _tally_arrays(self, latest):
+        voters = {}
+        for p, g, code, sub in zip(self.player, self.game, self.vote, self.submission):
+            if code and sub == latest[p]:
+                key = g * KEY_STRIDE + code
+                bucket = voters.get(key)
+                if bucket is None:
+                    voters[key] = [p]
+                else:
+                    bucket.append(p)
+        return voters
+
+    def _tally_numpy(self, latest):
+        player = np.frombuffer(self.player, dtype=np.intc)
+        codes = np.frombuffer(self.vote, dtype=np.int8)
+        mask = (codes != Vote.OTHER) & (np.frombuffer(self.submission, dtype=np.intc)
+                                        == np.frombuffer(latest, dtype=np.intc)[player])
+        keys = np.frombuffer(self.game, dtype=np.intc)[mask].astype(np.int64) * KEY_STRIDE + codes[mask]
+        counts = np.bincount(keys, minlength=len(self.games) * KEY_STRIDE)
+        # A stable sort groups rows by key while keeping storage order within each group
+        grouped = player[mask][np.argsort(keys, kind='stable')]
+        ends = np.cumsum(counts)
+        return {int(key): grouped[ends[key] - counts[key]:ends[key]].tolist() for key in np.flatnonzero(counts)}